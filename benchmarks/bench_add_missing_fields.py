@@ -0,0 +1,83 @@
+"""
+Benchmark adding missing schema fields (see `curation.add_missing_fields`)
+
+Compares the columnar (reindex) `add_missing_fields` with the previous petl
+implementation (fromdataframe, addfields, cut and todf). The previous
+implementation iterates over every cell in python so it is only timed on the
+first --previous-rows rows (and extrapolated to --rows) and the values of both
+are compared on those rows.
+
+Usage: python benchmarks/bench_add_missing_fields.py [--rows 1000000] [--fields 500] [--previous-rows 100000]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import petl as etl
+
+from jdc_utils.transforms import add_missing_fields
+
+
+def add_missing_fields_petl(df, field_list, missing_value="Missing"):
+    """previous implementation"""
+    tbl = etl.fromdataframe(df)
+    fieldnames_in_data = tbl.fieldnames()
+    fields_to_add = []
+    for fieldname in field_list:
+        if fieldname not in fieldnames_in_data:
+            fields_to_add.append((fieldname, missing_value))
+
+    targetdf = tbl.addfields(fields_to_add).cut(field_list).todf()
+    return targetdf
+
+
+def make_data(nrows, nfields, seed=0):
+    """
+    data with 90% of the schema fields (in a different order) and
+    some fields not in the schema
+    """
+    rng = np.random.default_rng(seed)
+    field_list = [f"field_{i}" for i in range(nfields)]
+    in_data = rng.permutation(field_list)[: int(nfields * 0.9)].tolist()
+    choices = np.array(["Yes", "No", "Unknown"], dtype=object)
+    data = {}
+    for i, field in enumerate(in_data + ["not_in_schema_1", "not_in_schema_2"]):
+        if i % 2:
+            data[field] = rng.integers(0, 100, nrows)
+        else:
+            data[field] = choices[rng.integers(0, 3, nrows)]
+    return pd.DataFrame(data), field_list
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--fields", type=int, default=500)
+    parser.add_argument("--previous-rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    df, field_list = make_data(args.rows, args.fields)
+
+    start = time.perf_counter()
+    columnar = add_missing_fields(df, field_list)
+    print(f"columnar ({args.rows} rows): {time.perf_counter() - start:.2f}s")
+
+    subset = df.iloc[: args.previous_rows]
+    start = time.perf_counter()
+    previous = add_missing_fields_petl(subset, field_list)
+    seconds = time.perf_counter() - start
+    print(
+        f"petl (previous, {len(subset)} rows): {seconds:.2f}s "
+        f"(~{seconds * args.rows / len(subset):.0f}s for {args.rows} rows)"
+    )
+
+    # same values (the columnar version keeps dtypes rather than re-inferring them)
+    pd.testing.assert_frame_equal(
+        previous.astype(object), columnar.iloc[: len(subset)].astype(object)
+    )
+    print(f"identical values ({args.fields} fields)")
+
+
+if __name__ == "__main__":
+    main()
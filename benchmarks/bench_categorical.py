@@ -0,0 +1,133 @@
+"""
+Benchmark peak memory of generating a core measure resource with and without
+the categorical option of `CoreMeasures` (enum constrained string fields read in
+and kept as pandas Categoricals)
+
+Each run is a fresh interpreter reading the same csv (`_generate_resource` with
+renaming and adding missing fields) and reports the peak resident memory above
+the interpreter's resident memory before reading and the memory of the resulting
+DataFrame.
+By default, a synthetic baseline-like schema and csv (mostly enum fields with long
+labels) are generated. Use --data and --schema to benchmark a hub's baseline file.
+
+Usage: python benchmarks/bench_categorical.py [--rows 200000] [--data baseline.csv --schema baseline]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+run_script = """
+import json, resource, sys
+import pandas as pd
+from frictionless import Schema
+from jdc_utils.core_measures import CoreMeasures, schemas
+from jdc_utils.core_measures.schema_index import SchemaIndex
+
+data, schema, categorical = sys.argv[1], sys.argv[2], sys.argv[3] == "1"
+if schema.endswith(".json"):
+    schema = Schema(json.loads(open(schema).read()))
+    schema_index = SchemaIndex.from_schema(schema)
+else:
+    schema, schema_index = getattr(schemas, schema), schemas.index(schema)
+core_measures = CoreMeasures(
+    transform_steps=["add_new_names", "add_missing_fields"], categorical=categorical
+)
+def current_rss():
+    # (linux) falls back to the peak so far elsewhere
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+before = current_rss()
+resource_ = core_measures._generate_resource(
+    data, "baseline", schema, core_measures.transform_steps, schema_index=schema_index
+)
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+frame = pd.DataFrame(resource_.data).memory_usage(deep=True).sum()
+print(json.dumps({"peak": (peak - before) / 1024, "frame": frame / 1024**2}))
+"""
+
+labels = [
+    "Transgender man/trans man/female-to-male (FTM)",
+    "Transgender woman/trans woman/male-to-female (MTF)",
+    "Genderqueer/gender nonconforming/neither exclusively male nor female",
+    "Additional gender category (or other)",
+    "Legitimately skipped",
+    "Refused",
+    "Missing",
+]
+
+
+def make_data(tmpdir, nrows, nenums=150, nother=10, seed=0):
+    """synthetic baseline schema and csv (with original names to rename)"""
+    rng = np.random.default_rng(seed)
+    fields = [{"name": "jdc_person_id", "type": "string"}]
+    data = {"jdc_person_id": [f"P{i:08d}" for i in range(nrows)]}
+    for i in range(nenums):
+        enum = [f"{label} ({i})" for label in labels[:4]]
+        fields.append(
+            {
+                "name": f"enum_{i}",
+                "type": "string",
+                "constraints": {"enum": enum},
+                "custom": {"jcoin:original_name": f"hub_enum_{i}"},
+            }
+        )
+        choices = np.array(enum + labels[4:], dtype=object)
+        data[f"hub_enum_{i}"] = choices[rng.integers(0, len(choices), nrows)]
+    for i in range(nother):
+        fields.append({"name": f"text_{i}", "type": "string"})
+        data[f"text_{i}"] = rng.integers(0, 10**6, nrows).astype(str)
+    fields.append({"name": "not_in_data", "type": "string", "constraints": {"enum": ["a"]}})
+
+    schema = {"fields": fields, "missingValues": ["", "Missing"]}
+    schemapath = Path(tmpdir) / "schema.json"
+    datapath = Path(tmpdir) / "baseline.csv"
+    schemapath.write_text(json.dumps(schema))
+    pd.DataFrame(data).to_csv(datapath, index=False)
+    return str(datapath), str(schemapath)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--data", help="csv file (defaults to synthetic data)")
+    parser.add_argument("--schema", help="core measure schema name (eg baseline) or path to a json schema")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if args.data:
+            data, schema = args.data, args.schema or "baseline"
+        else:
+            data, schema = make_data(tmpdir, args.rows)
+
+        results = {}
+        for label, categorical in [("object", "0"), ("categorical", "1")]:
+            output = subprocess.run(
+                [sys.executable, "-c", run_script, data, schema, categorical],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results[label] = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{label}: peak {results[label]['peak']:.0f} MiB, "
+                f"DataFrame {results[label]['frame']:.0f} MiB"
+            )
+
+    print(
+        f"peak memory {results['object']['peak'] / results['categorical']['peak']:.1f}x lower, "
+        f"DataFrame {results['object']['frame'] / results['categorical']['frame']:.1f}x smaller"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark collapsing check-all-that-apply fields (see `curation.collapse_checkall`)
+
+Compares the single boolean mask `collapse_checkall` (and `collapse_checkall_groups`
+for several groups at once) with the previous implementation (boolean frame,
+idxmax and several where/sum passes per call).
+
+Usage: python benchmarks/bench_collapse_checkall.py [--rows 1000000]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from jdc_utils.transforms import collapse_checkall, collapse_checkall_groups
+
+
+def collapse_checkall_previous(
+    df,
+    resulting_column_name,
+    columns=None,
+    columns_to_labels=None,
+    checked="Checked",
+    multi_checked="Multiple checked",
+    none_checked="None checked",
+    fillna=False,
+    labels=None,
+    inplace=True,
+):
+    """previous implementation"""
+    if columns_to_labels and not columns and not labels:
+        columns = columns_to_labels.keys()
+        labels = columns_to_labels.values()
+
+    if df.columns.isin(columns).sum() < len(columns):
+        return None
+
+    bcols = df[columns] == checked
+    var = (
+        bcols.idxmax(axis=1)
+        .where(bcols.sum(axis=1) == 1, multi_checked)
+        .where(bcols.sum(axis=1) > 0, none_checked)
+    )
+
+    var = var.where(
+        (df[columns].notnull().sum(axis=1) == len(columns)) | (var == multi_checked),
+        None,
+    )
+
+    if labels:
+        var.replace(dict(zip(columns, labels)), inplace=True)
+
+    if fillna:
+        var.fillna(fillna, inplace=True)
+
+    if inplace:
+        df[resulting_column_name] = var
+    else:
+        return var
+
+
+def make_groups():
+    group_options = {
+        "race": ["white", "black", "AIAN", "asian", "hawaiian_OPI", "other"],
+        "substance_use": ["opioids", "stimulants", "alcohol", "cannabis", "other"],
+        "services": ["moud", "counseling", "housing", "employment"],
+    }
+    return {
+        name: {
+            "columns_to_labels": {f"{name}_{option}": option for option in options},
+            "checked": "Yes",
+            "multi_checked": "Multiple",
+            "none_checked": "None",
+            "fillna": "Missing",
+        }
+        for name, options in group_options.items()
+    }
+
+
+def make_data(nrows, groups, seed=0):
+    rng = np.random.default_rng(seed)
+    choices = np.array(["Yes", "No", None], dtype=object)
+    columns = [c for params in groups.values() for c in params["columns_to_labels"]]
+    return pd.DataFrame(
+        {c: choices[rng.choice(3, nrows, p=[0.2, 0.79, 0.01])] for c in columns}
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    groups = make_groups()
+    df = make_data(args.rows, groups)
+
+    results = {}
+    for name, fxn in [
+        ("previous", collapse_checkall_previous),
+        ("boolean mask", collapse_checkall),
+    ]:
+        start = time.perf_counter()
+        results[name] = pd.DataFrame(
+            {
+                group: fxn(df, group, **params, inplace=False)
+                for group, params in groups.items()
+            }
+        )
+        print(f"{name} ({len(groups)} calls): {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    results["groups"] = collapse_checkall_groups(df, groups, inplace=False)
+    print(f"collapse_checkall_groups (1 call): {time.perf_counter() - start:.2f}s")
+
+    previous = results.pop("previous")
+    for result in results.values():
+        pd.testing.assert_frame_equal(previous, result)
+    print(f"identical output ({args.rows} rows x {len(groups)} groups)")
+
+
+if __name__ == "__main__":
+    main()
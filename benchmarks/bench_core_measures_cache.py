@@ -0,0 +1,56 @@
+"""
+Benchmark cold vs warm loading of the core measure schemas and encodings
+
+cold: empty cache directory (downloads everything from JCOIN-Core-Measures)
+warm: populated cache directory (served from disk)
+
+Each run is a fresh interpreter so this includes the import time of jdc_utils.
+
+Usage: python benchmarks/bench_core_measures_cache.py [--repeat 5] [--ref main]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+load_all = (
+    "from jdc_utils.core_measures import encodings, schemas;"
+    "[schemas.load(name) for name in schemas.paths];"
+    "[encodings.load(name) for name in encodings.paths]"
+)
+
+
+def time_import(cache_dir, ref):
+    env = dict(os.environ, JDC_UTILS_CACHE_DIR=cache_dir, JDC_CORE_MEASURES_REF=ref)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", load_all], env=env, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--ref", default="main")
+    args = parser.parse_args()
+
+    cold = []
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cold.append(time_import(cache_dir, args.ref))
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        time_import(cache_dir, args.ref)  # populate
+        warm = [time_import(cache_dir, args.ref) for _ in range(args.repeat)]
+
+    for label, times in [("cold", cold), ("warm", warm)]:
+        print(
+            f"{label}: median {statistics.median(times):.3f}s "
+            f"(min {min(times):.3f}s, max {max(times):.3f}s, n={len(times)})"
+        )
+
+
+if __name__ == "__main__":
+    main()
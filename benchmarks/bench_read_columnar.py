@@ -0,0 +1,87 @@
+"""
+Benchmark reading a written resource (see `CoreMeasures(columnar_format=...)`)
+
+Compares reading a resource's csv typed by its schema (`packaging.resource_to_frame`
+-- the pandas C parser -- and `columnar.typed_frame`) with reading its typed Parquet
+and Arrow IPC copies (`columnar.read_columnar_file`) on a baseline-like frame, with
+and without the enum columns read as pandas Categoricals, and checks the DataFrames
+are identical. Needs pyarrow.
+
+Usage: python benchmarks/bench_read_columnar.py [--rows 1000000] [--columns 30]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from frictionless import Resource
+
+from jdc_utils.utils.columnar import read_columnar_file, typed_frame
+from jdc_utils.utils.packaging import resource_to_frame, write_columnar_frame, write_csv_frame
+
+
+def make_frame(nrows, ncolumns, seed=0):
+    """ids, enum strings (with missing values) and integers as strings"""
+    rng = np.random.default_rng(seed)
+    choices = np.array(["Yes", "No", "Missing"], dtype=object)
+    data = {"jdc_person_id": np.char.add("p", np.arange(nrows).astype(str)).astype(object)}
+    for i in range(ncolumns - 1):
+        if i % 3:
+            data[f"field_{i}"] = choices[rng.integers(0, 3, nrows)]
+        else:
+            data[f"field_{i}"] = rng.integers(0, 100, nrows).astype(str).astype(object)
+    return pd.DataFrame(data)
+
+
+def make_schema(df):
+    """integer fields for the integer columns and string fields for the others"""
+    fields = [{"name": "jdc_person_id", "type": "string"}]
+    for i, name in enumerate(df.columns[1:]):
+        fields.append({"name": name, "type": "string" if i % 3 else "integer"})
+    return {"fields": fields, "missingValues": ["", "Missing"]}
+
+
+def read_csv_typed(resource, schema, categorical_columns):
+    return typed_frame(resource_to_frame(resource), schema, categorical_columns)
+
+
+def timed(read, *args):
+    start = time.perf_counter()
+    df = read(*args)
+    return time.perf_counter() - start, df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--columns", type=int, default=30)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.columns)
+    schema = make_schema(df)
+    categorical = [name for i, name in enumerate(df.columns[1:]) if i % 3]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        csvpath = Path(tmpdir, "baseline.csv")
+        write_csv_frame(df, csvpath)
+        for suffix in [".parquet", ".arrow"]:
+            write_columnar_frame(df, schema, Path(tmpdir, f"baseline{suffix}"))
+        sizes = {path.name: path.stat().st_size / 1e6 for path in Path(tmpdir).iterdir()}
+        print(", ".join(f"{name} {size:.1f}MB" for name, size in sorted(sizes.items())))
+
+        for categorical_columns in [None, categorical]:
+            label = "typed, categorical" if categorical_columns else "typed"
+            resource = Resource(path=str(csvpath))
+            previous, expected = timed(read_csv_typed, resource, schema, categorical_columns)
+            print(f"csv ({label}): {previous:.2f}s")
+            for suffix in [".parquet", ".arrow"]:
+                path = Path(tmpdir, f"baseline{suffix}")
+                seconds, read = timed(read_columnar_file, path, None, categorical_columns)
+                print(f"{suffix[1:]} ({label}): {seconds:.2f}s ({previous / seconds:.1f}x)")
+                pd.testing.assert_frame_equal(read, expected)
+        print("identical DataFrames")
+
+
+if __name__ == "__main__":
+    main()
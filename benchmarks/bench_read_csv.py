@@ -0,0 +1,76 @@
+"""
+Benchmark loading a csv resource (see `packaging.resource_to_frame`)
+
+Compares the pandas C parser (`_read_csv_frame`) with the previous petl
+implementation (`Resource(path=...).to_petl().todf()`) on a timepoints-like csv.
+The previous implementation iterates over every row in python so it is only
+timed on a csv with the first --previous-rows rows (and extrapolated to --rows)
+and the values of both are compared on that csv.
+
+Usage: python benchmarks/bench_read_csv.py [--rows 2000000] [--columns 30] [--previous-rows 200000]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from frictionless import Resource
+
+from jdc_utils.utils.packaging import resource_to_frame
+
+
+def make_csv(path, nrows, ncolumns, seed=0):
+    """ids, dates, enum strings (with empty values) and numbers"""
+    rng = np.random.default_rng(seed)
+    choices = np.array(["Yes", "No", "Unknown", ""], dtype=object)
+    data = {
+        "participant_id": np.char.add(
+            "p", rng.integers(0, nrows // 4 + 1, nrows).astype(str)
+        ),
+        "visit_date": (
+            pd.Timestamp("2021-01-01")
+            + pd.to_timedelta(rng.integers(0, 700, nrows), "D")
+        ).strftime("%Y-%m-%d"),
+    }
+    for i in range(ncolumns - 2):
+        if i % 3:
+            data[f"field_{i}"] = choices[rng.integers(0, 4, nrows)]
+        else:
+            data[f"field_{i}"] = rng.integers(0, 100, nrows)
+    pd.DataFrame(data).to_csv(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--columns", type=int, default=30)
+    parser.add_argument("--previous-rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "timepoints.csv"
+        subset_path = Path(tmpdir) / "timepoints-subset.csv"
+        make_csv(path, args.rows, args.columns)
+        make_csv(subset_path, min(args.previous_rows, args.rows), args.columns)
+
+        start = time.perf_counter()
+        df = resource_to_frame(Resource(path=str(path)))
+        print(f"pandas C parser ({len(df)} rows): {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        previous = Resource(path=str(subset_path)).to_petl().todf()
+        seconds = time.perf_counter() - start
+        print(
+            f"petl (previous, {len(previous)} rows): {seconds:.2f}s "
+            f"(~{seconds * args.rows / len(previous):.0f}s for {args.rows} rows)"
+        )
+
+        df = resource_to_frame(Resource(path=str(subset_path)))
+        pd.testing.assert_frame_equal(previous, df)
+        print(f"identical DataFrame ({args.columns} columns)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark renaming and recoding hub dictionary variables (see `curation.rename_and_change_values`)
+
+Compares the batched `rename_and_change_values` (renames and fillna/replace
+operations worked out up front, string columns replaced on their unique values
+and one rename) with the previous implementation (inplace fillna/replace
+and a full-frame rename for each variable).
+
+Usage: python benchmarks/bench_rename_and_change_values.py [--rows 200000] [--variables 300]
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from jdc_utils.transforms import rename_and_change_values
+
+
+def rename_and_change_values_previous(df, name_and_values):
+    """previous implementation"""
+    for current_name, new_name_and_values in name_and_values.items():
+        # added fillna as it could mean something different for each variable
+        if current_name in df.columns:
+            if "fillna" in new_name_and_values.keys():
+                df[current_name].fillna(new_name_and_values["fillna"], inplace=True)
+            if "values" in new_name_and_values.keys():
+                df[current_name].replace(new_name_and_values["values"], inplace=True)
+            if "name" in new_name_and_values.keys():
+                df.rename(
+                    columns={current_name: new_name_and_values["name"]}, inplace=True
+                )
+
+
+def make_data(nrows, nvariables, seed=0):
+    """
+    hub data with coded string, integer and missing values and a
+    name_and_values mapping renaming and recoding each variable
+    """
+    rng = np.random.default_rng(seed)
+    codes = np.array(["0", "1", "2", "8", "9"], dtype=object)
+    data = {}
+    name_and_values = {}
+    for i in range(nvariables):
+        name = f"hub_var_{i}"
+        if i % 3 == 0:
+            data[name] = rng.integers(0, 5, nrows)
+            name_and_values[name] = {"name": f"var_{i}", "values": {8: -8, 9: -9}}
+        elif i % 3 == 1:
+            data[name] = codes[rng.integers(0, 5, nrows)]
+            name_and_values[name] = {
+                "name": f"var_{i}",
+                "values": {"0": "No", "1": "Yes", "2": "Unknown", "8": "Refused"},
+            }
+        else:
+            values = codes[rng.integers(0, 5, nrows)]
+            values[rng.random(nrows) < 0.05] = None
+            data[name] = values
+            name_and_values[name] = {
+                "name": f"var_{i}",
+                "fillna": "Missing",
+                "values": {"0": "No", "1": "Yes"},
+            }
+    return pd.DataFrame(data), name_and_values
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--variables", type=int, default=300)
+    args = parser.parse_args()
+
+    df, name_and_values = make_data(args.rows, args.variables)
+
+    results = {}
+    for name, fxn in [
+        ("previous", rename_and_change_values_previous),
+        ("batched", rename_and_change_values),
+    ]:
+        results[name] = df.copy()
+        start = time.perf_counter()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", pd.errors.PerformanceWarning)
+            fxn(results[name], name_and_values)
+        print(f"{name}: {time.perf_counter() - start:.2f}s")
+
+    pd.testing.assert_frame_equal(results["previous"], results["batched"])
+    print(f"identical output ({args.rows} rows x {args.variables} variables)")
+
+
+if __name__ == "__main__":
+    main()
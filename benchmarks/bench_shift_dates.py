@@ -0,0 +1,75 @@
+"""
+Benchmark shifting date columns by day offsets (see `deidentify.shift_dates`)
+
+Compares the vectorized `_shift_dates_by_offsets` with the previous
+implementation (per column `pd.to_datetime`, merging the offsets onto the
+DataFrame as in dataforge's `tools.shift_dates` and per column `strftime`).
+
+Usage: python benchmarks/bench_shift_dates.py [--rows 1000000] [--date-columns 10] [--ids 100000]
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import jdc_utils.transforms
+
+deidentify = sys.modules["jdc_utils.transforms.deidentify"]
+
+
+def shift_dates_merge(df, offsets, id_column, date_columns):
+    """previous implementation"""
+    df_new = df.merge(offsets, how="left", left_on=id_column, right_index=True)
+    shift = pd.to_timedelta(df_new.pop(offsets.name).astype("float64"), unit="days")
+    for col in date_columns:
+        shifted = pd.to_datetime(df_new[col], errors="coerce") + shift
+        df_new["shifted_" + col] = shifted.dt.strftime("%Y%m%d")
+    return df_new.reset_index(drop=True)
+
+
+def make_data(nrows, ndates, nids, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = pd.Series([f"C{i:07d}" for i in range(nids)])
+    dates = pd.date_range("2019-01-01", "2023-12-31").strftime("%m/%d/%Y").to_numpy()
+    df = pd.DataFrame({"jdc_person_id": ids.sample(nrows, replace=True, random_state=seed).values})
+    date_columns = [f"date_{i}" for i in range(ndates)]
+    for col in date_columns:
+        values = dates[rng.integers(0, len(dates), nrows)].astype(object)
+        values[rng.random(nrows) < 0.1] = np.nan
+        df[col] = values
+    offsets = pd.Series(
+        rng.integers(-182, 184, nids),
+        index=pd.Index(ids, name="jdc_person_id"),
+        dtype="Int64",
+        name="days_for_shift_date",
+    )
+    return df, offsets, date_columns
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--date-columns", type=int, default=10)
+    parser.add_argument("--ids", type=int, default=100_000)
+    args = parser.parse_args()
+
+    df, offsets, date_columns = make_data(args.rows, args.date_columns, args.ids)
+
+    results = {}
+    for name, fxn in [
+        ("merge (previous)", shift_dates_merge),
+        ("vectorized", deidentify._shift_dates_by_offsets),
+    ]:
+        start = time.perf_counter()
+        results[name] = fxn(df.copy(), offsets, "jdc_person_id", date_columns)
+        print(f"{name}: {time.perf_counter() - start:.2f}s")
+
+    previous, vectorized = results.values()
+    pd.testing.assert_frame_equal(previous, vectorized)
+    print(f"same shifted dates ({args.rows} rows x {args.date_columns} date columns)")
+
+
+if __name__ == "__main__":
+    main()
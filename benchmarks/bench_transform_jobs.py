@@ -0,0 +1,82 @@
+"""
+Benchmark transforming a batch of data files (see `jdc-utils transform --jobs`)
+
+Transforms --files site csv files of --rows rows each with a rename/replace
+transform file one at a time and with a process pool of each number of --jobs,
+and checks the outputs are identical.
+
+Usage: python benchmarks/bench_transform_jobs.py [--files 40] [--rows 100000] [--jobs 2 4]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from jdc_utils.transforms.batch import transform_files
+
+transformfile_text = """
+rename_columns:
+  from_name_to_name:
+    record_id: participant_id
+replace_all_values:
+  from_value_to_value:
+    "1": "Yes"
+    "0": "No"
+to_lowercase_names: null
+"""
+
+
+def make_files(tmpdir, nfiles, nrows, ncolumns=30, seed=0):
+    rng = np.random.default_rng(seed)
+    file_paths = []
+    for i in range(nfiles):
+        data = {"record_id": np.arange(nrows)}
+        for j in range(ncolumns):
+            data[f"Field_{j}"] = rng.choice(["1", "0", "", "Unknown"], nrows)
+        path = Path(tmpdir) / f"site{i}.csv"
+        pd.DataFrame(data).to_csv(path, index=False)
+        file_paths.append(str(path))
+    transformfile = Path(tmpdir) / "transforms.yaml"
+    transformfile.write_text(transformfile_text)
+    return transformfile, file_paths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        transformfile, file_paths = make_files(tmpdir, args.files, args.rows)
+        outputs = {}
+        for jobs in [1] + args.jobs:
+            outdir = Path(tmpdir) / f"out-{jobs}"
+            start = time.perf_counter()
+            for file_path, targetpath, error in transform_files(
+                transformfile, file_paths, outdir=outdir, jobs=jobs
+            ):
+                if error:
+                    raise error
+            seconds = time.perf_counter() - start
+            if jobs == 1:
+                sequential = seconds
+            print(
+                f"jobs={jobs} ({args.files} files): {seconds:.2f}s "
+                f"({sequential / seconds:.1f}x)"
+            )
+            outputs[jobs] = {
+                path.name: path.read_bytes() for path in outdir.glob("*-transformed.csv")
+            }
+
+        for jobs in args.jobs:
+            assert outputs[jobs] == outputs[1]
+        print("identical output files")
+
+
+if __name__ == "__main__":
+    main()
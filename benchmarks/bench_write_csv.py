@@ -0,0 +1,79 @@
+"""
+Benchmark writing the csv of a resource's frame (see `CoreMeasures.write`)
+
+Compares the previous writer (the frictionless pandas parser's rows written by
+petl -- `Resource(data=df, format="pandas").to_petl().tocsv`) with serializing
+the frame a column at a time (`packaging.write_csv_frame`) on baseline-like
+(one row per participant) and timepoints-like (several visits per participant,
+with dates) frames, and checks the csv files are byte-identical.
+
+Usage: python benchmarks/bench_write_csv.py [--rows 1000000] [--columns 30]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from frictionless import Resource
+
+from jdc_utils.utils.packaging import write_csv_frame
+
+
+def make_frames(nrows, ncolumns, seed=0):
+    """baseline and timepoints frames of ids, enum categoricals, strings and numbers"""
+    rng = np.random.default_rng(seed)
+    choices = ["Yes", "No", "Missing"]
+    baseline = {"jdc_person_id": np.char.add("p", np.arange(nrows).astype(str)).astype(object)}
+    for i in range(ncolumns - 1):
+        name = f"field_{i}"
+        if i % 3 == 0:
+            baseline[name] = pd.Categorical(rng.choice(choices, nrows), categories=choices)
+        elif i % 3 == 1:
+            baseline[name] = rng.integers(0, 100, nrows).astype(str).astype(object)
+        else:
+            baseline[name] = np.where(rng.random(nrows) < 0.1, np.nan, rng.random(nrows) * 100)
+    baseline = pd.DataFrame(baseline)
+
+    visits = 4
+    timepoints = {
+        "jdc_person_id": np.repeat(baseline["jdc_person_id"].to_numpy()[: nrows // visits], visits),
+        "visit_type": np.tile(["Baseline", "3 month", "6 month", "12 month"], nrows // visits).astype(object),
+        "visit_date": pd.Timestamp("2021-01-01") + pd.to_timedelta(rng.integers(0, 365, nrows // visits * visits), "D"),
+    }
+    for i in range(ncolumns - 3):
+        timepoints[f"field_{i}"] = rng.choice(choices + [None], len(timepoints["visit_type"])).astype(object)
+    return {"baseline": baseline, "timepoints": pd.DataFrame(timepoints)}
+
+
+def write_petl(df, path):
+    Resource(data=df, format="pandas").to_petl().tocsv(str(path), encoding="utf-8")
+
+
+def timed(write, df, path):
+    start = time.perf_counter()
+    write(df, path)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--columns", type=int, default=30)
+    args = parser.parse_args()
+
+    frames = make_frames(args.rows, args.columns)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name, df in frames.items():
+            expected, path = Path(tmpdir, f"{name}-petl.csv"), Path(tmpdir, f"{name}.csv")
+            previous = timed(write_petl, df, expected)
+            seconds = timed(write_csv_frame, df, path)
+            print(f"{name} ({len(df)} rows): to_petl().tocsv (previous) {previous:.2f}s")
+            print(f"{name} ({len(df)} rows): write_csv_frame {seconds:.2f}s ({previous / seconds:.1f}x)")
+            assert path.read_bytes() == expected.read_bytes()
+        print("identical csv files")
+
+
+if __name__ == "__main__":
+    main()
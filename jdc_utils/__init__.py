@@ -1,20 +1,60 @@
-import confuse
-
-# frictionless plugins
-from dataforge.frictionless import (
-    frictionless_dataforgespss,
-    frictionless_dataforgestata,
-)
-
-# general modules
-from . import submission, transforms
-
-# project specific builder classes
-from .core_measures import CoreMeasures
-
-# read config file import
-config = confuse.Configuration("jdc-utils", __name__)
-try:
-    config.set_file("config.yaml")
-except:
-    pass
+"""
+Utilities for preparing and submitting data to the JDC
+
+NOTE: subpackages (eg `transforms`, `submission`), `CoreMeasures` and the
+`config` are loaded on first access (see `__getattr__`) so that importing
+jdc_utils (eg for the CLI) does not pull in pandas, frictionless, gen3 etc.
+"""
+import importlib
+
+# general modules and project specific builder classes
+_submodules = ["core_measures", "submission", "transforms", "utils"]
+_attributes = {"CoreMeasures": "core_measures"}
+
+_plugins_registered = False
+
+
+def register_plugins():
+    """
+    registers the dataforge SPSS/Stata frictionless plugins
+    (only needed when reading or writing .sav/.dta files)
+    """
+    global _plugins_registered
+    if not _plugins_registered:
+        from dataforge.frictionless import (
+            frictionless_dataforgespss,
+            frictionless_dataforgestata,
+        )
+
+        _plugins_registered = True
+
+
+def _load_config():
+    import confuse
+
+    # read config file import
+    config = confuse.Configuration("jdc-utils", __name__)
+    try:
+        config.set_file("config.yaml")
+    except:
+        pass
+    return config
+
+
+def __getattr__(name):
+    if name in _submodules:
+        value = importlib.import_module(f".{name}", __name__)
+    elif name in _attributes:
+        module = importlib.import_module(f".{_attributes[name]}", __name__)
+        value = getattr(module, name)
+    elif name == "config":
+        value = _load_config()
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + _submodules + list(_attributes) + ["config"])
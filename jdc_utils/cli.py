@@ -1,12 +1,13 @@
-"""CLI for JDC utilities"""
+"""CLI for JDC utilities
+
+NOTE: modules depending on pandas, frictionless etc are imported
+within each command so `jdc-utils --help` etc start quickly.
+"""
+import glob
 import os
 from pathlib import Path
 
 import click
-import confuse
-from jdc_utils.submission import CoreMeasures
-from jdc_utils.transforms import read_df, run_transformfile
-from jdc_utils.transforms.deidentify import init_version_history_all
 
 from jdc_utils import config
 
@@ -27,6 +28,70 @@ def cli():
 @click.option("--outdir", default="tmp/core-measures")
 @click.option("--validate-only", is_flag=True, default=False)
 @click.option("--deidentify-only", is_flag=True, default=False)
+@click.option(
+    "--core-measures-ref",
+    default=None,
+    help="Branch or commit of JCOIN-Core-Measures to pin the schemas and encodings to",
+)
+@click.option(
+    "--mapping-backend",
+    type=click.Choice(["git", "sqlite"]),
+    default="git",
+    help="Where id and date offset mappings are looked up (sqlite: indexed local store of the history repos)",
+)
+@click.option(
+    "--chunksize",
+    type=int,
+    default=None,
+    help="With --deidentify-only, read and deidentify csv files in chunks of this many rows (for files larger than memory)",
+)
+@click.option(
+    "--categorical",
+    is_flag=True,
+    default=False,
+    help="Read in and keep enum constrained core measure fields as pandas Categoricals (lowers memory use)",
+)
+@click.option(
+    "--missing-mode",
+    type=click.Choice(["fill", "schema"]),
+    default="fill",
+    help="fill: fill all missing values with 'Missing' up front; schema: keep numeric/date dtypes and only write 'Missing' to the output files",
+)
+@click.option(
+    "--read-workers",
+    type=int,
+    default=None,
+    help="Number of processes reading SPSS/Stata (.sav/.dta) input files in chunks",
+)
+@click.option(
+    "--checkpoint-dir",
+    default=None,
+    help="Checkpoint the output of each stage in this directory (eg tmp/checkpoints) so a rerun resumes from the first stage whose inputs changed (needs pyarrow)",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    default=False,
+    help="Rerun all stages (rather than resuming from their checkpoints)",
+)
+@click.option(
+    "--write-workers",
+    type=int,
+    default=None,
+    help="Number of workers writing the csv and SPSS/Stata files of the resources concurrently",
+)
+@click.option(
+    "--write-executor",
+    type=click.Choice(["thread", "process"]),
+    default="thread",
+    help="Whether the --write-workers are threads or processes",
+)
+@click.option(
+    "--columnar-format",
+    type=click.Choice(["parquet", "arrow"]),
+    default=None,
+    help="Also write a Parquet or Arrow IPC copy of each resource typed by its schema (read by read_package(typed=True) -- needs pyarrow)",
+)
 def run(
     history_path,
     filepath,
@@ -36,6 +101,17 @@ def run(
     outdir,
     validate_only,
     deidentify_only,
+    core_measures_ref,
+    mapping_backend,
+    chunksize,
+    categorical,
+    missing_mode,
+    read_workers,
+    checkpoint_dir,
+    force,
+    write_workers,
+    write_executor,
+    columnar_format,
 ):
     # CHECK: if running deidentify need these params
     if not validate_only or deidentify_only:
@@ -49,8 +125,13 @@ def run(
         assert filepath
         assert outdir
 
+    from jdc_utils.core_measures import CoreMeasures, cache
+
     date_columns = list(date_columns)
 
+    if core_measures_ref:
+        cache.pin(core_measures_ref)
+
     core_measures = CoreMeasures(
         filepath=filepath,
         id_file=id_file,
@@ -58,17 +139,30 @@ def run(
         date_columns=date_columns,
         outdir=outdir,
         history_path=history_path,
+        mapping_backend=mapping_backend,
+        categorical=categorical,
+        missing_mode=missing_mode,
+        read_workers=read_workers,
+        checkpoint_dir=checkpoint_dir,
+        resume=not force,
+        write_workers=write_workers,
+        write_executor=write_executor,
+        columnar_format=columnar_format,
     )
     # 1. running entire pipeline
     if not validate_only and not deidentify_only:
         core_measures.deidentify()
         core_measures.write()
     # 2. deidentified but not in package
+    elif deidentify_only and chunksize:
+        core_measures.deidentify_to_csv("tmp/deidentified", chunksize=chunksize)
     elif deidentify_only:
         Path("tmp/deidentified").mkdir(exist_ok=True, parents=True)
         core_measures.deidentify()
         for resource in core_measures.package.resources:
-            resource.write(f"tmp/deidentified/{resource.name}.csv")
+            core_measures.materialize_missing(resource).write(
+                f"tmp/deidentified/{resource.name}.csv"
+            )
     # 3. already deidentified -- just need to package and validate
     elif validate_only:
         core_measures.write()
@@ -117,6 +211,8 @@ or avoid work later and add future dateset (eg timepoints) date columns.
 @click.option("--id-column", prompt=id_column_prompt)
 @click.option("--date-columns", prompt=date_columns_prompt)
 def init(history_path, filepath, id_file, id_column, date_columns):
+    from jdc_utils.transforms.deidentify import init_version_history_all
+
     # create version control history
     if Path(history_path).exists():
         click.echo(f"{history_path} already exists so skipping")
@@ -165,11 +261,26 @@ def init(history_path, filepath, id_file, id_column, date_columns):
     required=True,
 )
 @click.option("--transform-file", help="Path to the given transform file")
-def transform(transform_file, file_paths):
+@click.option(
+    "--jobs",
+    type=int,
+    default=None,
+    help="Number of processes transforming files in parallel (default: one file at a time)",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    default=False,
+    help="Transform all files (including files unchanged since they were last transformed)",
+)
+def transform(transform_file, file_paths, jobs, force):
     # read in and run transforms -- right now currently using pandas -- may want to migrate to petl
     # for consistency with validation as it uses petl to read in and type conversions may be different.
     # alternatively, we could use the pandas plugin for frictionless but it is experimental.
     # click.echo("STARTING")
+    from jdc_utils.transforms.batch import transform_files
+
+    all_file_paths = []
     for file_path in file_paths:
         # glob.glob allows support for both wildcards (*) and actual file paths
         file_path_with_glob_regexs = glob.glob(
@@ -178,14 +289,39 @@ def transform(transform_file, file_paths):
 
         print(f"Applying {transform_file} to:")
         print(",".join(file_path_with_glob_regexs))
+        all_file_paths.extend(file_path_with_glob_regexs)
+
+    failed = []
+    for file_path, targetpath, error in transform_files(
+        transform_file, all_file_paths, outdir="tmp/jdc", jobs=jobs, force=force
+    ):
+        if error:
+            failed.append(file_path)
+            click.echo(f"ERROR: transforming {file_path} failed: {error!r}", err=True)
+        else:
+            click.echo(f"Transformed file saved to {targetpath}")
+
+    if failed:
+        raise click.ClickException(
+            f"{len(failed)} file(s) failed to transform: {', '.join(failed)}"
+        )
+
+
+@click.command(
+    "sync-core-measures",
+    help="Downloads (or revalidates) the core measure schemas and encodings into the local cache.",
+)
+@click.option(
+    "--ref",
+    default=None,
+    help="Branch or commit of JCOIN-Core-Measures (defaults to JDC_CORE_MEASURES_REF or main)",
+)
+def sync_core_measures(ref):
+    from jdc_utils.core_measures import cache, encodings, schemas
 
-        for file_path_glob in file_path_with_glob_regexs:
-            sourcedf = read_df(file_path_glob)
-            targetdf = run_transformfile(df, transform_file)
-            Path("tmp/jdc").mkdir(exist_ok=True, parents=True)
-            targetpath = f"tmp/jdc/{Path(file_path).stem}-transformed.csv"
-            targetdf.to_csv(targetpath, index=False)
-            click.echo(f"Transformed file saved to {targetdf}")
+    schemas.refresh(ref)
+    encodings.refresh(ref)
+    click.echo(f"Core measure schemas and encodings cached in {cache.get_cache_dir()}")
 
 
 # deidentification commands
@@ -193,6 +329,8 @@ cli.add_command(run, name="run")
 cli.add_command(init, name="init")
 # pipeline
 cli.add_command(transform, name="transform")
+# core measure schemas and encodings
+cli.add_command(sync_core_measures, name="sync-core-measures")
 
 if __name__ == "__main__":
     cli()
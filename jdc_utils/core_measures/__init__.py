@@ -1,2 +1,10 @@
 """ ETL workflow builder for core measures """
-from .core_measures import CoreMeasures
+
+
+def __getattr__(name):
+    # loaded on first access so the schema cache etc can be imported on their own
+    if name == "CoreMeasures":
+        from .core_measures import CoreMeasures
+
+        return CoreMeasures
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
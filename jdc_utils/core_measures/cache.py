@@ -0,0 +1,163 @@
+"""
+Local, versioned cache of the JCOIN Core Measures schemas and encodings
+
+Files from the JCOIN-Core-Measures repository are stored by the sha256 of their
+contents (cache_dir/objects) and each branch or commit (ie "ref") has a manifest
+(cache_dir/refs/<ref>.json) mapping the repository path to the stored object
+along with the ETag and Last-Modified headers from the download.
+
+Once a file has been cached for a ref it is always served from disk. The remote
+is only contacted again when revalidation is asked for (`revalidate=True`), in which
+case a conditional request is made with If-None-Match/If-Modified-Since.
+
+Environment variables
+---------------------
+JDC_UTILS_CACHE_DIR: directory of the cache (default: ~/.cache/jdc-utils)
+JDC_CORE_MEASURES_REF: branch or commit of JCOIN-Core-Measures to use (default: main)
+JDC_UTILS_OFFLINE: if set (eg to 1), never access the network and
+    only serve files already in the cache (eg for air-gapped machines
+    with a cache directory copied over from a connected machine)
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from urllib.parse import quote
+
+import requests
+import yaml
+
+repo_url = "https://raw.githubusercontent.com/jcoin-maarc/JCOIN-Core-Measures"
+pinned_ref = os.environ.get("JDC_CORE_MEASURES_REF", "main")
+
+
+def pin(new_ref):
+    """
+    pin the branch or commit of JCOIN-Core-Measures
+    used for all subsequent schema and encoding loads
+    """
+    global pinned_ref
+    pinned_ref = new_ref
+
+
+def get_cache_dir():
+    cache_dir = os.environ.get("JDC_UTILS_CACHE_DIR")
+    if cache_dir:
+        return Path(cache_dir)
+    else:
+        return Path.home() / ".cache" / "jdc-utils"
+
+
+def is_offline():
+    return os.environ.get("JDC_UTILS_OFFLINE", "").lower() not in ("", "0", "false", "no")
+
+
+def _manifest_path(ref):
+    # quote so branch names with slashes map to one file
+    return get_cache_dir() / "refs" / (quote(ref, safe="") + ".json")
+
+
+def _object_path(digest):
+    return get_cache_dir() / "objects" / digest[:2] / digest
+
+
+def _read_manifest(ref):
+    manifest_path = _manifest_path(ref)
+    if manifest_path.is_file():
+        return json.loads(manifest_path.read_text())
+    else:
+        return {}
+
+
+def _write_atomic(path, content):
+    """write to a temporary file and then replace so readers never see partial files"""
+    path.parent.mkdir(exist_ok=True, parents=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(content)
+    os.replace(tmp_path, path)
+
+
+def _store(ref, path, url, response):
+    content = response.content
+    digest = hashlib.sha256(content).hexdigest()
+    object_path = _object_path(digest)
+    if not object_path.is_file():
+        _write_atomic(object_path, content)
+
+    # re-read in case another process added entries in the meantime
+    manifest = _read_manifest(ref)
+    manifest[path] = {
+        "url": url,
+        "sha256": digest,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    _write_atomic(
+        _manifest_path(ref), json.dumps(manifest, indent=2, sort_keys=True).encode()
+    )
+    return content
+
+
+def fetch(path, ref=None, revalidate=False):
+    """
+    get the contents (bytes) of a file in the JCOIN-Core-Measures repository
+    from the local cache, downloading it only if not yet cached for the
+    given ref or if revalidation is asked for.
+
+    Parameters
+    ----------
+    path: str
+        Path of the file relative to the repository root (eg schemas/table-schema-baseline.json)
+    ref: Optional[str]
+        Branch or commit (defaults to the pinned ref)
+    revalidate: bool
+        If True, check the remote for a newer version of a cached file
+        (ignored when offline)
+    """
+    ref = ref or pinned_ref
+    entry = _read_manifest(ref).get(path)
+    object_path = _object_path(entry["sha256"]) if entry else None
+    is_cached = bool(object_path and object_path.is_file())
+
+    if is_cached and (not revalidate or is_offline()):
+        return object_path.read_bytes()
+    elif is_offline():
+        raise FileNotFoundError(
+            f"{path} (ref {ref}) is not in the cache at {get_cache_dir()} "
+            "and JDC_UTILS_OFFLINE is set"
+        )
+
+    url = f"{repo_url}/{ref}/{path}"
+    headers = {}
+    if is_cached:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    try:
+        response = requests.get(url, headers=headers, timeout=30)
+        if is_cached and response.status_code == 304:
+            return object_path.read_bytes()
+        response.raise_for_status()
+    except requests.RequestException as e:
+        if is_cached:
+            print(f"WARNING: could not revalidate {path} ({e}) so using cached version")
+            return object_path.read_bytes()
+        raise
+
+    return _store(ref, path, url, response)
+
+
+def get_digest(path, ref=None):
+    """sha256 of the cached contents of a file (None if not cached for the ref)"""
+    entry = _read_manifest(ref or pinned_ref).get(path)
+    return entry["sha256"] if entry else None
+
+
+def load_json(path, ref=None, revalidate=False):
+    return json.loads(fetch(path, ref=ref, revalidate=revalidate))
+
+
+def load_yaml(path, ref=None, revalidate=False):
+    return yaml.safe_load(fetch(path, ref=ref, revalidate=revalidate))
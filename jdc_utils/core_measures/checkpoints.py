@@ -0,0 +1,132 @@
+"""
+Stage checkpoints of a core measures run (see `CoreMeasures(checkpoint_dir=...)`)
+
+The stages of `jdc-utils run` are:
+
+- deidentify: reading, transforming and deidentifying the source files
+    (see `CoreMeasures.deidentify`)
+- csv: writing the csv files, schemas and validation report (see `CoreMeasures.write`)
+- export: writing the SPSS/Stata files (see `CoreMeasures.write`)
+
+Each stage is keyed by the sha256 of everything it depends on (eg the contents of
+the source files, the CoreMeasures options and the schemas for deidentify or the
+resource data for csv). Once a stage completes, its key is recorded in
+checkpoint_dir/<stage>/checkpoint.json along with its output (the resource
+DataFrames for deidentify and the sha256 of each file written for csv and export)
+so a rerun with the same key loads (or keeps) the stage's output rather than
+redoing it, ie the run resumes from the first stage whose inputs changed.
+
+DataFrames are stored as Parquet files along with their `frame_digest`: a frame
+Parquet can't store (eg an object column of numbers and strings) isn't
+checkpointed and a frame that doesn't read back as it was saved isn't loaded,
+so either way the stage is rerun rather than resumed with different data.
+
+NOTE: checkpoints are only written when a checkpoint_dir is given (see
+`CoreMeasures`) and need pyarrow (`pip install pyarrow`)
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from jdc_utils.transforms.batch import file_digest
+from jdc_utils.utils.columnar import import_pyarrow
+
+
+def digest(*parts):
+    """sha256 of json serializable parts (eg options, schema descriptors and other digests)"""
+    content = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def frame_digest(df):
+    """sha256 of a DataFrame's values, index, column names and dtypes"""
+    values = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    columns = [[str(name), str(dtype)] for name, dtype in df.dtypes.items()]
+    return digest(hashlib.sha256(values.tobytes()).hexdigest(), columns)
+
+
+class Checkpoints:
+    """
+    Checkpoints of stages in a directory (see module docstring)
+
+    Parameters
+    ----------
+    directory: str
+        Directory of the checkpoints (eg tmp/checkpoints)
+    resume: bool
+        If False, stages are never loaded from their checkpoints (but checkpoints
+        are still saved, eg to rerun all stages)
+    """
+
+    def __init__(self, directory="tmp/checkpoints", resume=True):
+        import_pyarrow()
+        self.directory = Path(directory).resolve()
+        self.resume = resume
+
+    def _frame_path(self, stage, name):
+        return self.directory / stage / f"{name}.parquet"
+
+    def _record_path(self, stage):
+        return self.directory / stage / "checkpoint.json"
+
+    def load(self, stage, key):
+        """
+        the checkpoint record of a stage if it was completed with the same key
+        and its files haven't changed since (otherwise None)
+        """
+        record_path = self._record_path(stage)
+        if not self.resume or not record_path.is_file():
+            return None
+        record = json.loads(record_path.read_text())
+        if record["key"] != key:
+            return None
+        for path, sha256 in record["files"].items():
+            if not Path(path).is_file() or file_digest(path) != sha256:
+                return None
+        for name in record["frames"]:
+            if not self._frame_path(stage, name).is_file():
+                return None
+        print(f"Resuming from the {stage} checkpoint (inputs unchanged)")
+        return record
+
+    def load_frames(self, stage, record):
+        """
+        resource name -> DataFrame saved with a stage (None if any DataFrame
+        doesn't read back as it was saved)
+        """
+        frames = {}
+        for name, sha256 in record["frames"].items():
+            df = pd.read_parquet(self._frame_path(stage, name))
+            if frame_digest(df) != sha256:
+                print(f"{name} of the {stage} checkpoint differs from the saved frame")
+                return None
+            frames[name] = df
+        return frames
+
+    def save(self, stage, key, frames=None, files=None):
+        """
+        records a completed stage with its DataFrames (resource name -> DataFrame)
+        and the files it wrote (the record is written last so an interrupted save
+        is never loaded)
+        """
+        stage_dir = self.directory / stage
+        stage_dir.mkdir(exist_ok=True, parents=True)
+        self._record_path(stage).unlink(missing_ok=True)
+        for name, df in (frames or {}).items():
+            try:
+                df.to_parquet(self._frame_path(stage, name))
+            except (TypeError, ValueError) as e:
+                # (eg an object column of mixed types)
+                print(f"Not checkpointing the {stage} stage ({name} can't be stored as Parquet: {e})")
+                return
+        record = {
+            "key": key,
+            "frames": {name: frame_digest(df) for name, df in (frames or {}).items()},
+            "files": {str(Path(path).resolve()): file_digest(path) for path in files or []},
+        }
+        partialpath = stage_dir / "checkpoint.json.partial"
+        partialpath.write_text(json.dumps(record, indent=2))
+        os.replace(partialpath, self._record_path(stage))
@@ -1,34 +1,61 @@
 """
 Generate,validate, and submit a core measure data package
 """
+import contextlib
 import copy
 import datetime
 import os
 import re
 import time
 from collections import abc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from functools import reduce
 from pathlib import Path
 
 import dataforge.frictionless
 import pandas as pd
 
-# frictionless plugins
-from dataforge.frictionless import encode_table
-
 # frictionless
-from frictionless import Package, Resource, transform, validate
+from frictionless import Package, Report, Resource, Schema, transform, validate
 
 # general functions
+from jdc_utils import register_plugins
 from jdc_utils.submission import submit_package_to_jdc
-from jdc_utils.transforms import add_missing_fields, deidentify, to_new_names
+from jdc_utils.transforms import add_missing_fields, to_new_names
+from jdc_utils.transforms.batch import file_digest
+
+# NOTE: jdc_utils.transforms.deidentify resolves to the submodule rather than the function
+from jdc_utils.transforms.deidentify import DeidentificationSession, deidentify, history_heads
 
 # general utilities
+from jdc_utils.utils import columnar
 from jdc_utils.utils.gen3 import map_to_sheepdog
-from jdc_utils.utils.packaging import read_package, zip_package
+from jdc_utils.utils.packaging import (
+    default_formats,
+    read_package,
+    read_resource_paths,
+    resource_to_frame,
+    write_columnar_frame,
+    write_csv_frame,
+    zip_package,
+)
 
 # core measure modules
 from . import encodings, schemas, sheepdog, derived_measures
+from .checkpoints import Checkpoints, digest, frame_digest
+from .export import export_tasks, run_in_turn
+from .schema_index import SchemaIndex
+
+# core measure resource name -> schema (see `schemas`)
+core_measure_schemas = {
+    "baseline": "baseline",
+    "timepoints": "timepoints",
+    "staff-baseline": "staff_baseline",
+    "staff-timepoints": "staff_timepoints",
+}
+
+# write_executor -> pool the resources are written in (see `CoreMeasures.write`)
+write_executors = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
 
 
 class CoreMeasures:
@@ -58,6 +85,45 @@ class CoreMeasures:
             "replace_ids",
             "shift_dates",
         ],
+    mapping_backend: str
+        Where id and date offset mappings are looked up and added ("git" or "sqlite"
+        -- see `jdc_utils.transforms.mapping_backends`)
+    categorical: bool
+        If True, enum constrained string fields are read in and kept as pandas
+        Categoricals (with the schema's enum values as categories -- see
+        `_to_categorical`) rather than columns of repeated strings
+    missing_mode: str
+        How missing values are filled:
+        "fill" -- all missing values are filled with "Missing" when a resource is added
+        "schema" -- numeric, boolean and datetime columns keep their dtypes (with missing
+        values as NA) and the schema's missing value token (see `_missing_token`) is only
+        written when the data is serialized (eg csv, SPSS and Stata files -- see
+        `_fill_native_missing`). Other (string) columns are filled when a resource is added.
+    read_workers: Optional[int]
+        Number of processes reading SPSS/Stata (.sav/.dta) input files in chunks
+        (see `jdc_utils.utils.statfiles.read_stat_file` -- read in one process if None)
+    checkpoint_dir: Optional[str]
+        Directory (eg tmp/checkpoints) to checkpoint the output of each stage of
+        `deidentify` and `write` in so reruns resume from the first stage whose
+        inputs changed (see `checkpoints` -- no checkpoints if None; needs pyarrow)
+    resume: bool
+        If False, all stages are rerun (and checkpointed) even if their checkpoint
+        is up to date
+    write_workers: Optional[int]
+        Number of workers writing the csv files and then the SPSS/Stata files of
+        the resources concurrently in `write` (written in turn if None)
+    write_executor: str
+        "thread" to write in a thread pool or "process" to write in a process pool
+        (the package descriptor is assembled in the resource order either way).
+        Threads write each file of a resource as its own task. In a process pool,
+        each resource's frame is copied to the process writing it, so all the
+        SPSS/Stata (and columnar) files of a resource are written by one task
+        and its frame is copied once rather than once per file.
+    columnar_format: Optional[str]
+        "parquet" or "arrow" to also write a Parquet (.parquet) or Arrow IPC (.arrow)
+        copy of each resource's csv typed by its schema (with the schema in the file
+        metadata -- see `jdc_utils.utils.columnar`) that `read_package(typed=True)`
+        reads instead of the csv (needs pyarrow -- no copies if None)
     """
 
     def __init__(
@@ -74,12 +140,22 @@ class CoreMeasures:
             "replace_ids",
             "shift_dates",
         ],
+        mapping_backend="git",
+        categorical=False,
+        missing_mode="fill",
+        read_workers=None,
+        checkpoint_dir=None,
+        resume=True,
+        write_workers=None,
+        write_executor="thread",
+        columnar_format=None,
         **kwargs
     ):
         # resolve paths just in case directories change
         # note, check that this is a directory in case the input
         # is something else like a url that is valid input to Package
         # NOTE: should all be pathlike
+        self.filepath = _resolve_if_path(filepath)
         self.id_file = _resolve_if_path(id_file)
         self.id_column = id_column
         self.history_path = _resolve_if_path(history_path)
@@ -87,32 +163,58 @@ class CoreMeasures:
         self.outdir = _resolve_if_path(outdir)
         self.basedir = pwd = os.getcwd()
         self.transform_steps = transform_steps
+        self.mapping_backend = mapping_backend
+        self.categorical = categorical
+        if missing_mode not in ["fill", "schema"]:
+            raise Exception(f"missing_mode needs to be 'fill' or 'schema' (not {missing_mode})")
+        self.missing_mode = missing_mode
+        self.read_workers = read_workers
+        self.checkpoints = Checkpoints(checkpoint_dir, resume) if checkpoint_dir else None
+        if write_executor not in write_executors:
+            raise Exception(
+                f"write_executor needs to be 'thread' or 'process' (not {write_executor})"
+            )
+        self.write_workers = write_workers
+        self.write_executor = write_executor
+        if columnar_format not in [None, *columnar.formats]:
+            raise Exception(
+                f"columnar_format needs to be 'parquet' or 'arrow' (not {columnar_format})"
+            )
+        if columnar_format:
+            columnar.import_pyarrow()
+        self.columnar_format = columnar_format
         self.package = Package()
         self.sheepdog_package = Package()
 
         self.schemas = schemas
+        self.session = None  # see deidentification_session
+
+        # SPSS/Stata frictionless plugins for reading and writing .sav/.dta files
+        register_plugins()
 
     # user facing functions to build core measure data package, writing the package, and submitting to JDC
     def add_baseline(self, df_or_path):
         name = "baseline"
         schema = self.schemas.baseline
+        schema_index = self.schemas.index("baseline")
         steps = self.transform_steps
-        resource = self._generate_resource(df_or_path, name, schema, steps)
+        resource = self._generate_resource(
+            df_or_path, name, schema, steps, schema_index=schema_index
+        )
 
         # derived measures
-        resource.data = (
-            pd.DataFrame(resource.data)
-            .pipe(derived_measures.combine_race)
-            .pipe(derived_measures.map_gender_id_condensed)
-
-        )
+        df = self._add_derived_measures(name, pd.DataFrame(resource.data))
+        resource.data = self._to_categorical(df, schema_index)
         self.package.add_resource(resource)
 
     def add_timepoints(self, df_or_path):
         name = "timepoints"
         schema = self.schemas.timepoints
+        schema_index = self.schemas.index("timepoints")
         steps = self.transform_steps
-        resource = self._generate_resource(df_or_path, name, schema, steps)
+        resource = self._generate_resource(
+            df_or_path, name, schema, steps, schema_index=schema_index
+        )
         # derived measures
         #resource.data = derived_measures.promis.compute_scores(resource)
         self.package.add_resource(resource)
@@ -120,29 +222,171 @@ class CoreMeasures:
     def add_staff_baseline(self, df_or_path):
         name = "staff-baseline"
         schema = self.schemas.staff_baseline
+        schema_index = self.schemas.index("staff_baseline")
         steps = self.transform_steps
-        resource = self._generate_resource(df_or_path, name, schema, steps)
-        resource.data = (
-            pd.DataFrame(resource.data)
-            .pipe(derived_measures.combine_race)
-            .pipe(derived_measures.map_gender_id_condensed)
-
+        resource = self._generate_resource(
+            df_or_path, name, schema, steps, schema_index=schema_index
         )
+        df = self._add_derived_measures(name, pd.DataFrame(resource.data))
+        resource.data = self._to_categorical(df, schema_index)
         self.package.add_resource(resource)
 
     def add_staff_timepoints(self, df_or_path):
         name = "staff-timepoints"
         schema = self.schemas.staff_timepoints
+        schema_index = self.schemas.index("staff_timepoints")
         steps = self.transform_steps
-        resource = self._generate_resource(df_or_path, name, schema, steps)
+        resource = self._generate_resource(
+            df_or_path, name, schema, steps, schema_index=schema_index
+        )
         self.package.add_resource(resource)
 
+    @contextlib.contextmanager
+    def deidentification_session(self):
+        """
+        Deidentifies all resources added within the session (e.g., with `add_baseline`)
+        with one pull and one commit/push of the id and date offset mapping histories
+        (see `DeidentificationSession`). If adding any resource fails, none of the new
+        mappings are committed and the resources added within the session are removed
+        from the package.
+
+        Example
+        --------
+        with core_measures.deidentification_session():
+            core_measures.add_baseline("baseline.csv")
+            core_measures.add_timepoints("timepoints.csv")
+        """
+        resource_names = list(self.package.resource_names)
+        self.session = DeidentificationSession(
+            self.history_path, id_file=self.id_file, backend=self.mapping_backend
+        )
+        try:
+            with self.session:
+                yield self.session
+        except Exception as e:
+            for name in self.package.resource_names:
+                if name not in resource_names:
+                    self.package.remove_resource(name)
+            raise e
+        finally:
+            self.session = None
+
+    def deidentify(self, filepath=None):
+        """
+        adds all core measure resources in filepath (e.g., a directory containing
+        baseline.csv and timepoints.csv -- defaults to the filepath used to initiate
+        the object) to the package within one deidentification session
+
+        With checkpoints (see `checkpoint_dir`), the resources are loaded from the
+        checkpoint instead if the source files, options, schemas and mapping
+        histories haven't changed.
+        """
+        key = None
+        if self.checkpoints:
+            key = self._deidentify_key(filepath or self.filepath)
+            record = self.checkpoints.load("deidentify", key)
+            frames = record and self.checkpoints.load_frames("deidentify", record)
+            if frames is not None:
+                for name, df in frames.items():
+                    schema = getattr(self.schemas, core_measure_schemas[name])
+                    self.package.add_resource(
+                        Resource(name=name, data=df, schema=schema, format="pandas")
+                    )
+                return self
+
+        categorical_columns = None
+        if self.categorical:
+            categorical_columns = {
+                name: _categorical_columns(self.schemas.index(schema_name))
+                for name, schema_name in core_measure_schemas.items()
+            }
+        columns = {
+            name: self._columns_to_read(self.schemas.index(schema_name), self.transform_steps)
+            for name, schema_name in core_measure_schemas.items()
+        }
+        source_package = read_package(
+            filepath or self.filepath,
+            categorical_columns=categorical_columns,
+            columns=columns,
+            max_workers=self.read_workers,
+        )
+        add_resource = {
+            "baseline": self.add_baseline,
+            "timepoints": self.add_timepoints,
+            "staff-baseline": self.add_staff_baseline,
+            "staff-timepoints": self.add_staff_timepoints,
+        }
+        resource_names = list(self.package.resource_names)
+        with self.deidentification_session():
+            for resource in source_package.resources:
+                if resource.name in add_resource:
+                    add_resource[resource.name](pd.DataFrame(resource.data))
+                else:
+                    print(f"{resource.name} is not a core measure resource so skipping")
+
+        if self.checkpoints:
+            frames = {
+                name: pd.DataFrame(self.package.get_resource(name).data)
+                for name in self.package.resource_names
+                if name not in resource_names
+            }
+            # (keyed by the mapping histories including the mappings added here)
+            key = self._deidentify_key(filepath or self.filepath)
+            self.checkpoints.save("deidentify", key, frames=frames)
+        return self
+
+    def deidentify_to_csv(self, outdir="tmp/deidentified", filepath=None, chunksize=100000):
+        """
+        streaming version of `deidentify` for files larger than memory: each core measure
+        csv in filepath is read in chunks of chunksize rows and each chunk is transformed
+        (including `replace_ids` and `shift_dates`) and appended to outdir/<resource name>.csv.
+        All chunks are deidentified within one deidentification session (so new ids and date
+        offsets are added to the mapping histories at once) and the output files are only
+        written once the mappings are committed. Resources that aren't csv files are read
+        in whole. Date values are parsed without a format inferred from the chunk (see
+        `deidentify._parse_dates`) so the shifted dates don't depend on chunksize.
+
+        NOTE: resources are not added to the package
+        """
+        resource_paths = read_resource_paths(filepath or self.filepath)
+        outdir = Path(outdir)
+        outdir.mkdir(exist_ok=True, parents=True)
+        outpaths = {}
+        try:
+            with self.deidentification_session():
+                for name, path in resource_paths.items():
+                    if name not in core_measure_schemas:
+                        print(f"{name} is not a core measure resource so skipping")
+                        continue
+
+                    schema = getattr(self.schemas, core_measure_schemas[name])
+                    schema_index = self.schemas.index(core_measure_schemas[name])
+                    outpaths[name] = outdir / f"{name}.csv.partial"
+                    columns = self._columns_to_read(schema_index, self.transform_steps)
+                    chunks = _read_chunks(path, chunksize, columns, self.read_workers)
+                    for i, df in enumerate(chunks):
+                        df = self._transform(df, schema, self.transform_steps, schema_index)
+                        df = self._add_derived_measures(name, df)
+                        if self.missing_mode == "schema":
+                            df = _fill_native_missing(df, schema_index)
+                        df.to_csv(
+                            outpaths[name], mode="a" if i else "w", header=not i, index=False
+                        )
+        except Exception as e:
+            for outpath in outpaths.values():
+                outpath.unlink(missing_ok=True)
+            raise e
+
+        for outpath in outpaths.values():
+            os.replace(outpath, outpath.with_suffix(""))
+        return self
+
     # NOTE: below are temporary and will change if DD becomes more like frictionelss
     # core measure data model
     def convert_baseline_to_sheepdog(self):
         baseline_df = pd.concat(
             [
-                self.package.get_resource(name).to_pandas().assign(name=name)
+                self._resource_to_pandas(name).assign(name=name)
                 for name in ["baseline", "staff-baseline"]
                 if name in self.package.resource_names
             ]
@@ -158,8 +402,8 @@ class CoreMeasures:
 
     def convert_timepoints_to_sheepdog(self):
         assert self.package.get_resource("baseline")
-        baseline_df = self.package.get_resource("baseline").to_pandas()
-        timepoints_df = self.package.get_resource("timepoints").to_pandas()
+        baseline_df = self._resource_to_pandas("baseline")
+        timepoints_df = self._resource_to_pandas("timepoints")
 
         # get list of people not in baseline but in timepoints
         # TODO: add
@@ -191,6 +435,10 @@ class CoreMeasures:
         writes package to core measure format
         NOTE: use kwargs to pass in all package (ie hub)
         specific package properties (title,name,desc etc)
+
+        With checkpoints (see `checkpoint_dir`), the csv files (and validation report)
+        and the SPSS/Stata files are only written again if the resources (or encodings)
+        changed since they were last written to outdir.
         """
         if outdir:
             self.outdir = outdir
@@ -203,80 +451,80 @@ class CoreMeasures:
         Path("schemas").mkdir(exist_ok=True)
         Path("data").mkdir(exist_ok=True)
 
+        csv_record = export_record = None
+        if self.checkpoints:
+            csv_key = self._write_key()
+            csv_record = self.checkpoints.load("csv", csv_key)
+
         # write csv datasets and validation report
+        csv_files = ["report.json", "report-summary.txt"]
+        csv_tasks = []
         for resource in self.package["resources"]:
             csvpath = f"data/{resource['name']}.csv"
             schemapath = f"schemas/{resource['name']}.json"
 
-            resource.schema.to_json(schemapath)
-            resource.to_petl().tocsv(csvpath)
+            if not csv_record:
+                df = pd.DataFrame(self.materialize_missing(resource).data)
+                csv_tasks.append((_write_csv, df, resource.schema.to_dict(), csvpath, schemapath))
+            csv_files.extend([csvpath, schemapath])
 
             self.written_package.add_resource(
                 Resource(name=resource["name"], path=csvpath, schema=schemapath)
             )
+        self._run_tasks(csv_tasks)
 
         self.written_package.to_json(f"data-package.json")
-        self.written_package_report = validate("data-package.json")
-        self.written_package_report.to_json("report.json")
-        Path("report-summary.txt").write_text(self.written_package_report.to_summary())
+        if csv_record:
+            self.written_package_report = Report("report.json")
+        else:
+            self.written_package_report = validate("data-package.json")
+            self.written_package_report.to_json("report.json")
+            Path("report-summary.txt").write_text(self.written_package_report.to_summary())
+            if self.checkpoints:
+                self.checkpoints.save("csv", csv_key, files=csv_files)
 
         # write SPSS/Stata files if valid package
         if not self.written_package_report["valid"]:
             print("WARNING: package not valid, see the report-summary.txt file")
 
         
-        ## copy package so trgt pckgs not added to iterator
-        sourcepackage = self.written_package.to_copy()
-        for source in sourcepackage["resources"]:
-            source_path = Path(source["path"])
-
-            target_spss_path = f"data/{source['name']}.sav"
-            target_stata_path = f"data/{source['name']}.dta"
-            # target_spss_schemapath = f"schemas/{source['name']}-sav.json"
-            # target_stata_schemapath = f"schemas/{source['name']}-dta.json"
-
-            # TODO: test to see if instantiating new Resource is needed (may not be given the iterator is now copied)
-            target_spss = Resource(
-                path=str(source.path), schema=dict(source.schema)
-            )
-            target_spss = target_spss.transform(
-                steps=[
-                    encode_table(
-                        encodings=encodings.fields,
-                        reservecodes=encodings.reserve["spss"],
-                    )
-                ]
-            )
-            # TODO: test to see if instantiating new Resource is needed (may not be given the iterator is now copied)
-            target_stata = Resource(
-                path=str(source.path), schema=dict(source.schema)
+        if self.checkpoints:
+            export_key = digest(
+                "export", csv_key, encodings.fields, encodings.reserve, self.columnar_format
             )
-            target_stata = target_stata.transform(
-                steps=[
-                    encode_table(
+            export_record = self.checkpoints.load("export", export_key)
+
+        # (written from the resources in memory -- see `export`)
+        export_files = []
+        exports = []
+        for resource in self.package["resources"]:
+            resource_exports = []
+            target_spss_path = f"data/{resource['name']}.sav"
+            target_stata_path = f"data/{resource['name']}.dta"
+            # target_spss_schemapath = f"schemas/{resource['name']}-sav.json"
+            # target_stata_schemapath = f"schemas/{resource['name']}-dta.json"
+
+            if not export_record:
+                materialized = self.materialize_missing(resource)
+                resource_exports.extend(
+                    export_tasks(
+                        materialized,
+                        {"sav": target_spss_path, "dta": target_stata_path},
                         encodings=encodings.fields,
-                        reservecodes=encodings.reserve["stata"],
+                        reserve=encodings.reserve,
                     )
-                ]
-            )
-
-            target_spss.infer()
-            target_stata.infer()
-
-            target_spss.write(target_spss_path)
-            target_stata.write(target_stata_path)
-            # target_spss.schema.to_json(target_spss_schemapath)
-            # target_stata.schema.to_json(target_stata_schemapath)
+                )
+            export_files.extend([target_spss_path, target_stata_path])
 
             target_resource_spss = Resource(
-                name=f"{source['name']}-sav",
+                name=f"{resource['name']}-sav",
                 title="SPSS (.sav) dataset",
                 description="This is an annotated SPSS dataset. To see the schema with the value labels (encoding) and variable labels (title), see `schemas/<tablename>-sav.json`",
                 path=target_spss_path,
                 # schema=target_spss_schemapath #No validation/read stream yet (need to add to dataforge)
             )
             target_resource_stata = Resource(
-                name=f"{source['name']}-dta",
+                name=f"{resource['name']}-dta",
                 title="Stata (.dta) dataset",
                 description="This is an annotated Stata dataset. To see the schema with the value labels (encoding) and variable labels (title), see `schemas/<tablename>-sav.json`",
                 path=target_stata_path,
@@ -285,6 +533,32 @@ class CoreMeasures:
             self.written_package.add_resource(target_resource_spss)
             self.written_package.add_resource(target_resource_stata)
 
+            if self.columnar_format:
+                suffix = columnar.formats[self.columnar_format]
+                target_columnar_path = f"data/{resource['name']}{suffix}"
+                if not export_record:
+                    df = pd.DataFrame(materialized.data)
+                    resource_exports.append(
+                        (write_columnar_frame, df, resource.schema.to_dict(), target_columnar_path)
+                    )
+                export_files.append(target_columnar_path)
+                # (listed on the csv resource rather than as a resource of its
+                # own so frictionless doesn't read or validate it)
+                self.written_package.get_resource(resource["name"])[columnar.descriptor_key] = {
+                    self.columnar_format: target_columnar_path
+                }
+
+            if self.write_executor == "process" and resource_exports:
+                # (one task per resource so its frame is pickled once -- see `write_executor`)
+                exports.append((run_in_turn, resource_exports))
+            else:
+                exports.extend(resource_exports)
+
+        self._run_tasks(exports)
+
+        if self.checkpoints and not export_record:
+            self.checkpoints.save("export", export_key, files=export_files)
+
         self.written_package.to_json("data-package.json")
         
         os.chdir(self.basedir)
@@ -419,16 +693,12 @@ class CoreMeasures:
         )
 
     @staticmethod
-    def __add_new_names(df, schema):
-        fields = schema["fields"]
-        mappings = {field.get("custom").get("jcoin:original_name"): field["name"] for field in fields 
-            if field.get("custom",{}).get("jcoin:original_name")}
-        return to_new_names(df=df, mappings=mappings)
+    def __add_new_names(df, schema_index):
+        return to_new_names(df=df, mappings=schema_index.original_names)
 
     @staticmethod
-    def __add_missing_fields(df, schema):
-        field_list = [field["name"] for field in schema["fields"]]
-        return add_missing_fields(df, field_list, missing_value="Missing")
+    def __add_missing_fields(df, schema_index):
+        return add_missing_fields(df, schema_index.field_names, missing_value="Missing")
 
     # below are internal functions to be called by the user facing methods add_<resource name>() and submit()
     def _generate_resource(
@@ -442,21 +712,55 @@ class CoreMeasures:
             "replace_ids",
             "shift_dates",
         ],
+        schema_index=None,
     ):
         if isinstance(df_or_path, pd.DataFrame):
             df = df_or_path
         elif isinstance(df_or_path, (str, os.PathLike)):
-            df = Resource(path=str(df_or_path)).to_petl().todf()
+            categorical_columns = None
+            if self.categorical:
+                categorical_columns = _categorical_columns(
+                    schema_index or SchemaIndex.from_schema(schema)
+                )
+            df = resource_to_frame(
+                Resource(path=str(df_or_path)),
+                categorical_columns=categorical_columns,
+                columns=self._columns_to_read(
+                    schema_index or SchemaIndex.from_schema(schema), transform_steps
+                ),
+                max_workers=self.read_workers,
+            )
+
+        newdf = self._transform(df, schema, transform_steps, schema_index)
+        # make resource
+        resource = Resource(name=name, data=newdf, schema=schema, format="pandas")
+        return resource
+
+    def _transform(self, df, schema, transform_steps, schema_index=None):
+        """applies the transform steps (see `_generate_resource`) to a DataFrame"""
+        if not schema_index:
+            schema_index = SchemaIndex.from_schema(schema)
 
         deidentify_fxns = (
             []
         )  # have dependencies so are bundled together in its own wrapper function
         fxns = {}  # NOTE: dicts are ordered now in python
+        to_categorical = (self._to_categorical, {"schema_index": schema_index})
+        if self.categorical and not (
+            {"add_new_names", "sync_new_names"} & set(transform_steps)
+        ):
+            fxns["to_categorical"] = to_categorical
         for trans in transform_steps:
             if trans == "add_new_names" or trans == "sync_new_names":
-                fxns[trans] = (self.__add_new_names, {"schema": schema})
+                fxns[trans] = (self.__add_new_names, {"schema_index": schema_index})
+                if self.categorical:
+                    # as soon as fields have their schema names
+                    fxns["to_categorical"] = to_categorical
             elif trans == "add_missing_fields":
-                fxns[trans] = (self.__add_missing_fields, {"schema": schema})
+                fxns[trans] = (
+                    self.__add_missing_fields,
+                    {"schema_index": schema_index},
+                )
             elif trans == "replace_ids" or trans == "shift_dates":
                 deidentify_fxns.append(trans)
                 fxns["deidentify"] = None
@@ -469,15 +773,304 @@ class CoreMeasures:
                 "history_path": self.history_path,
                 "date_columns": self.date_columns,
                 "fxns": deidentify_fxns,
+                "session": self.session,
+                "backend": self.mapping_backend,
             }
             fxns["deidentify"] = (deidentify, deidentify_params)
 
         # chain through selected functions
         newdf = reduce(lambda _df, fxn: fxn[0](_df, **fxn[-1]), fxns.values(), df)
-        newdf.fillna("Missing",inplace=True)
-        # make resource
-        resource = Resource(name=name, data=newdf, schema=schema, format="pandas")
-        return resource
+        # (fields added since, eg by add_missing_fields)
+        newdf = self._to_categorical(newdf, schema_index)
+        if self.missing_mode == "schema":
+            newdf = _fill_missing_by_type(newdf, schema_index)
+        else:
+            newdf.fillna("Missing",inplace=True)
+        return newdf
+
+    def _options(self):
+        """options affecting the resources added (for checkpoint keys)"""
+        return {
+            "id_file": file_digest(self.id_file)
+            if self.id_file and Path(self.id_file).is_file()
+            else self.id_file,
+            "id_column": self.id_column,
+            "history_path": self.history_path,
+            "date_columns": self.date_columns,
+            "transform_steps": self.transform_steps,
+            "mapping_backend": self.mapping_backend,
+            "categorical": self.categorical,
+            "missing_mode": self.missing_mode,
+        }
+
+    def _deidentify_key(self, filepath):
+        """
+        key of the deidentify stage (see `checkpoints`): the contents of the source
+        files, the options, the schemas (ie their compiled indexes) and, if
+        deidentifying, the state of the mapping histories (see `history_heads`)
+        """
+        sources = {
+            name: file_digest(path) if Path(path).is_file() else path
+            for name, path in read_resource_paths(filepath).items()
+        }
+        schema_indexes = {
+            name: self.schemas.index(schema_name).to_dict()
+            for name, schema_name in core_measure_schemas.items()
+        }
+        deidentify_steps = {"replace_ids", "shift_dates"}.intersection(self.transform_steps)
+        heads = (
+            history_heads(self.history_path)
+            if deidentify_steps and self.history_path
+            else None
+        )
+        return digest("deidentify", sources, self._options(), schema_indexes, heads)
+
+    def _write_key(self):
+        """
+        key of the csv stage of `write` (see `checkpoints`): the output directory,
+        the missing mode and the data and schema of each resource
+        """
+        resources = {
+            resource.name: [frame_digest(pd.DataFrame(resource.data)), dict(resource.schema)]
+            for resource in self.package.resources
+        }
+        return digest("csv", os.getcwd(), self.missing_mode, resources)
+
+    def _run_tasks(self, tasks):
+        """
+        runs each task (a function and its arguments) in the write executor (see
+        `write_workers`) or in turn without one (raising the first exception once
+        all tasks are done)
+        """
+        if not self.write_workers or self.write_workers == 1 or len(tasks) < 2:
+            return [func(*args) for func, *args in tasks]
+        executor_kwargs = {}
+        if self.write_executor == "process":
+            # (the SPSS/Stata plugins are registered on import)
+            executor_kwargs["initializer"] = register_plugins
+        Executor = write_executors[self.write_executor]
+        with Executor(max_workers=self.write_workers, **executor_kwargs) as executor:
+            futures = [executor.submit(*task) for task in tasks]
+        return [future.result() for future in futures]
+
+    def _columns_to_read(self, schema_index, transform_steps):
+        """
+        source columns needed by the transform steps (see `_source_columns`) or None
+        (ie all columns) if the steps don't cut columns not in the schema (ie without
+        add_missing_fields)
+        """
+        if "add_missing_fields" not in transform_steps:
+            return None
+        return _source_columns(schema_index, self.id_column, self.date_columns)
+
+    def _to_categorical(self, df, schema_index):
+        """see `_to_categorical` (returns df as is if not categorical)"""
+        if self.categorical:
+            df = _to_categorical(df, schema_index, missing_value="Missing")
+        return df
+
+    def _resource_to_pandas(self, name):
+        """logical representation of a resource in the package (see `Resource.to_pandas`)"""
+        df = self.materialize_missing(self.package.get_resource(name)).to_pandas()
+        return self._to_categorical(df, self.schemas.index(core_measure_schemas[name]))
+
+    def materialize_missing(self, resource):
+        """
+        resource (in the package) with missing values filled for serialization
+        (only needed with missing_mode="schema" -- see `_fill_native_missing`)
+        """
+        if self.missing_mode != "schema":
+            return resource
+        if resource.name in core_measure_schemas:
+            schema_index = self.schemas.index(core_measure_schemas[resource.name])
+        else:
+            schema_index = SchemaIndex.from_schema(resource.schema)
+        df = _fill_native_missing(pd.DataFrame(resource.data), schema_index)
+        return Resource(name=resource.name, data=df, schema=resource.schema, format="pandas")
+
+    @staticmethod
+    def _add_derived_measures(name, df):
+        if name in ["baseline", "staff-baseline"]:
+            df = df.pipe(derived_measures.combine_race).pipe(
+                derived_measures.map_gender_id_condensed
+            )
+        return df
+
+
+def _write_csv(df, schema, csvpath, schemapath):
+    """writes the csv and schema of a resource's frame (see `CoreMeasures.write`)"""
+    Schema(schema).to_json(schemapath)
+    write_csv_frame(df, csvpath, schema)
+
+
+def _categorical_columns(schema_index):
+    """
+    enum constrained string fields (see `SchemaIndex.categorical_fields`) and
+    their original names (ie the columns to read in as pandas Categoricals)
+    """
+    fields = schema_index.categorical_fields()
+    field_set = set(fields)
+    return set(fields) | {
+        original for original, name in schema_index.original_names.items() if name in field_set
+    }
+
+
+def _source_columns(schema_index, id_column=None, date_columns=None):
+    """
+    columns of a source file that end up in a resource: the schema fields, their
+    original names (see `to_new_names`) and the id and date columns used for
+    deidentification (all other columns are removed by `add_missing_fields`)
+    """
+    if isinstance(date_columns, str):
+        date_columns = [date_columns]
+    return (
+        set(schema_index.field_names)
+        | set(schema_index.original_names)
+        | ({id_column} if id_column else set())
+        | set(date_columns or [])
+    )
+
+
+def _to_categorical(df, schema_index, missing_value="Missing"):
+    """
+    converts enum constrained string fields to pandas Categoricals with the enum values
+    and missing value tokens as categories (see `SchemaIndex.categories`). Any other
+    values (eg invalid values for the validation report) are added as extra categories
+    so no values are lost. missing_value is also added to any other Categoricals so
+    missing values can be filled.
+    """
+    fields = set(schema_index.categorical_fields())
+    duplicated = set(df.columns[df.columns.duplicated()])
+    converted = {}
+    for i, name in enumerate(df.columns):
+        if name in duplicated:
+            continue
+        values = df.iloc[:, i]
+        is_categorical = isinstance(values.dtype, pd.CategoricalDtype)
+        if name in fields:
+            categories = schema_index.categories(name, missing_value)
+            known = set(categories)
+            observed = values.cat.categories if is_categorical else values.dropna().unique()
+            categories += [value for value in observed if value not in known]
+        elif is_categorical and missing_value not in values.cat.categories:
+            categories = list(values.cat.categories) + [missing_value]
+        else:
+            continue
+
+        if not is_categorical:
+            converted[i] = pd.Series(
+                pd.Categorical(values, categories=categories), index=df.index, name=name
+            )
+        elif list(values.cat.categories) != categories:
+            converted[i] = values.cat.set_categories(categories)
+
+    return _replace_columns(df, converted)
+
+
+def _replace_columns(df, converted):
+    """
+    df with the columns at the given positions replaced (as one new frame rather
+    than setting columns one by one which copies the other columns each time)
+    """
+    if not converted:
+        return df
+    return pd.concat(
+        [converted.get(i, df.iloc[:, i]) for i in range(len(df.columns))],
+        axis=1,
+        copy=False,
+    )
+
+
+def _missing_token(schema_index):
+    """
+    the value written for missing values with missing_mode="schema" ("Missing"
+    or else the first non-empty missing value of the schema)
+    """
+    tokens = [value for value in schema_index.missing_values if value]
+    if not tokens or "Missing" in tokens:
+        return "Missing"
+    return tokens[0]
+
+
+def _is_native(values):
+    """numeric, boolean or datetime (ie not object, string or categorical) dtype"""
+    return (
+        pd.api.types.is_numeric_dtype(values.dtype)
+        or pd.api.types.is_bool_dtype(values.dtype)
+        or pd.api.types.is_datetime64_any_dtype(values.dtype)
+    ) and not isinstance(values.dtype, pd.CategoricalDtype)
+
+
+def _fill_missing_by_type(df, schema_index):
+    """
+    fills missing values of object, string and categorical columns (see `_missing_token`)
+    and keeps the dtypes of numeric, boolean and datetime columns with missing values as NA
+    (integer fields read in as floats as they have missing values are converted to Int64)
+    """
+    missing_value = _missing_token(schema_index)
+    converted = {}
+    for i, name in enumerate(df.columns):
+        values = df.iloc[:, i]
+        if not _is_native(values):
+            if values.hasnans:
+                if isinstance(values.dtype, pd.CategoricalDtype):
+                    if missing_value not in values.cat.categories:
+                        values = values.cat.add_categories([missing_value])
+                converted[i] = values.fillna(missing_value)
+        elif (
+            schema_index.types.get(name) in ["integer", "year"]
+            and pd.api.types.is_float_dtype(values.dtype)
+            and (values.dropna() % 1 == 0).all()
+        ):
+            converted[i] = values.astype("Int64")
+    return _replace_columns(df, converted)
+
+
+def _fill_native_missing(df, schema_index):
+    """
+    converts numeric, boolean and datetime columns with missing values (see
+    `_fill_missing_by_type`) to objects with the missing value token (see `_missing_token`)
+    and formats datetime columns with their field's format for serialization
+    """
+    missing_value = _missing_token(schema_index)
+    converted = {}
+    for i, name in enumerate(df.columns):
+        values = df.iloc[:, i]
+        if not _is_native(values):
+            continue
+        if pd.api.types.is_datetime64_any_dtype(values.dtype):
+            field_type = schema_index.types.get(name, "datetime")
+            date_format = schema_index.formats.get(name, "default")
+            if not date_format.startswith("%"):
+                date_format = default_formats.get(field_type, default_formats["datetime"])
+            converted[i] = values.dt.strftime(date_format).fillna(missing_value)
+        elif values.hasnans:
+            converted[i] = values.astype(object).where(values.notna(), missing_value)
+    return _replace_columns(df, converted)
+
+
+def _read_chunks(path, chunksize, columns=None, max_workers=None):
+    """
+    reads a csv in chunks of chunksize rows (as strings so values are
+    written back out as read) or any other file in whole (see `resource_to_frame`).
+    If columns is given, only the columns in columns are read.
+    """
+    if Path(path).suffix.lower() == ".csv":
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = None
+        if columns is not None and header.isin(columns).any():
+            usecols = lambda name: name in columns
+        return pd.read_csv(
+            path,
+            chunksize=chunksize,
+            dtype=str,
+            keep_default_na=False,
+            na_values=[""],
+            usecols=usecols,
+        )
+    else:
+        resource = Resource(path=str(path))
+        return [resource_to_frame(resource, columns=columns, max_workers=max_workers)]
 
 
 def _resolve_if_path(var):
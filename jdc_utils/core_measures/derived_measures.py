@@ -44,7 +44,8 @@ def map_gender_id_condensed(df):
     """
 
     df = pd.DataFrame(df)
-    gender_id_condensed = df["gender_id"].replace(
+    # as objects as categorical gender fields (see `CoreMeasures`) have different categories
+    gender_id_condensed = df["gender_id"].astype(object).replace(
         {
             "Transgender man/trans man/female-to-male (FTM)":"Transgender",
             "Transgender woman/trans woman/male-to-female (MTF)":"Transgender",
@@ -53,7 +54,11 @@ def map_gender_id_condensed(df):
         }
     )
 
-    df.gender_id_condensed.where(lambda s:s!="Missing",gender_id_condensed,inplace=True)
+    df["gender_id_condensed"] = (
+        df["gender_id_condensed"]
+        .astype(object)
+        .where(lambda s: s != "Missing", gender_id_condensed)
+    )
 
     return df
 
@@ -1,9 +1,39 @@
-"""Latest version of SPSS/Stata encodings (value labels)"""
+"""Latest version of SPSS/Stata encodings (value labels)
 
-import requests
-import yaml
+`fields` (encodings.yaml) and `reserve` (reserve_codes.yaml) are loaded
+on first access from the local core measures cache (see `cache`).
+"""
+from . import cache
 
-branch = "main"
-url = f"https://raw.githubusercontent.com/jcoin-maarc/JCOIN-Core-Measures/{branch}/encodings/"
-fields = yaml.safe_load(requests.get(url + "encodings.yaml").content)
-reserve = yaml.safe_load(requests.get(url + "reserve_codes.yaml").content)
+paths = {
+    "fields": "encodings/encodings.yaml",
+    "reserve": "encodings/reserve_codes.yaml",
+}
+
+_loaded = {}
+
+
+def load(name, ref=None, revalidate=False):
+    """load the encodings of the given name (see `paths`) for a branch or commit"""
+    ref = ref or cache.pinned_ref
+    if revalidate or (name, ref) not in _loaded:
+        _loaded[(name, ref)] = cache.load_yaml(
+            paths[name], ref=ref, revalidate=revalidate
+        )
+    return _loaded[(name, ref)]
+
+
+def refresh(ref=None):
+    """revalidate all cached encodings against the remote"""
+    for name in paths:
+        load(name, ref=ref, revalidate=True)
+
+
+def __getattr__(name):
+    if name in paths:
+        return load(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(paths))
@@ -0,0 +1,145 @@
+"""
+SPSS/Stata exports of core measure resources (see `CoreMeasures.write`)
+
+Each field of a resource is factorized once into a code table of its distinct
+values shared by both formats. For each format, only the distinct values are
+encoded and then taken back to the rows: value labels of encoded fields (see
+`encodings.fields`) are mapped to the field's codes, reserve labels (eg Missing)
+of encoded and numeric fields to the SPSS or Stata reserve codes (see
+`encodings.reserve`) and all other values are read as their schema type (as
+when reading the csv with its schema). The schema of each export (with the
+codes and labels as its encoding) is derived from the resource's schema so both
+files are written straight from the in-memory frame (rather than reading back
+and encoding the csv once per format and inferring its schema).
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+from frictionless import Resource, Schema
+
+# file format -> reserve codes (see `encodings.reserve`)
+formats = {"sav": "spss", "dta": "stata"}
+
+# non-encoded field types whose reserve labels are given the reserve codes
+numeric_types = ["integer", "number"]
+
+
+def code_table(df, schema):
+    """field -> (row codes, distinct values) of each schema field's column"""
+    return {
+        field["name"]: pd.factorize(df[field["name"]].astype(object))
+        for field in schema["fields"]
+        if field["name"] in df.columns
+    }
+
+
+def _code_type(reservecodes):
+    """
+    schema type of fields with reserve codes (Stata's extended missing
+    values, eg .a, are strings so are only kept by `any` fields)
+    """
+    if any(isinstance(code, str) for code in reservecodes):
+        return "any"
+    return "integer"
+
+
+def _encode_values(field, uniques, labels, reserve):
+    """the distinct values of a field with their codes or read as the field's type"""
+    has_reserve = bool(labels) or field.type in numeric_types
+    values = []
+    for value in uniques:
+        if value in labels:
+            values.append(labels[value])
+        elif has_reserve and value in reserve:
+            values.append(reserve[value])
+        elif labels:
+            # (other values of encoded fields have no code so are missing)
+            values.append(None)
+        else:
+            values.append(field.read_cell(value)[0])
+    return values
+
+
+def encode_frame(df, table, schema, encodings, reservecodes):
+    """
+    the frame with each field in the code table (see `code_table`) encoded for
+    an export: the value labels of encoded fields replaced by their codes, the
+    reserve labels of encoded and numeric fields by the reserve codes and all
+    other values read as the field's schema type (invalid values are missing)
+    """
+    reserve = {label: code for code, label in reservecodes.items()}
+    fields = {field.name: field for field in Schema(copy.deepcopy(dict(schema))).fields}
+    columns = {}
+    for name, (codes, uniques) in table.items():
+        labels = {label: code for code, label in encodings.get(name, {}).items()}
+        values = _encode_values(fields[name], uniques, labels, reserve)
+        # (missing values have a code of -1 ie the appended missing value)
+        missing = np.nan if fields[name].type == "number" else None
+        values = [missing if value is None else value for value in values]
+        values = np.array(values + [missing], dtype=object)
+        columns[name] = pd.Series(values[codes], index=df.index, dtype=object)
+    return df.assign(**columns)
+
+
+def export_schema(schema, encodings, reservecodes):
+    """
+    schema descriptor of an export with the codes and labels of each
+    encoded field and the reserve codes of each numeric field
+    """
+    code_type = _code_type(reservecodes)
+    descriptor = copy.deepcopy(dict(schema))
+    for field in descriptor["fields"]:
+        if field["name"] in encodings:
+            field["type"] = code_type
+            field["encoding"] = {**encodings[field["name"]], **reservecodes}
+        elif field.get("type") in numeric_types:
+            if code_type == "any":
+                field["type"] = code_type
+            field["encoding"] = dict(reservecodes)
+        else:
+            continue
+        # (constraints are on the labels and values rather than the codes)
+        field.pop("constraints", None)
+    return descriptor
+
+
+def write_export(df, schema, table, path, encodings, reservecodes):
+    """
+    writes one SPSS/Stata export (see `formats`) of a resource's frame with the
+    code table of its fields (see `code_table`)
+    """
+    Resource(
+        data=encode_frame(df, table, schema, encodings, reservecodes),
+        schema=export_schema(schema, encodings, reservecodes),
+        format="pandas",
+    ).write(path)
+
+
+def export_tasks(resource, paths, encodings, reserve):
+    """
+    (function, *arguments) of writing each SPSS/Stata export of a resource (with
+    its data in memory) to each file format's path (eg {"sav": "data/baseline.sav",
+    "dta": "data/baseline.dta"}) sharing one code table
+    """
+    df = pd.DataFrame(resource.data)
+    schema = resource.schema.to_dict()
+    table = code_table(df, schema)
+    return [
+        (write_export, df, schema, table, path, encodings, reserve[formats[file_format]])
+        for file_format, path in paths.items()
+    ]
+
+
+def run_in_turn(tasks):
+    """
+    runs each task (a function and its arguments) in turn (eg as one task of a
+    process pool so a frame shared by the tasks is pickled once rather than once
+    per task)
+    """
+    return [func(*args) for func, *args in tasks]
+
+
+def write_exports(resource, paths, encodings, reserve):
+    """writes the SPSS/Stata exports of a resource (see `export_tasks`)"""
+    run_in_turn(export_tasks(resource, paths, encodings, reserve))
@@ -0,0 +1,134 @@
+"""
+Compiled index of a core measure table schema
+
+Rather than walking `schema["fields"]` (and each field's custom properties)
+every time a resource is added, the properties needed for field lookups are
+compiled once per schema version into a `SchemaIndex`. Indexes of the cached
+schemas are stored as json in the core measures cache (see `cache`), keyed by
+the sha256 of the schema file, so repeat runs skip schema parsing entirely.
+"""
+import json
+
+from . import cache
+
+# bump when the index contents change so indexes already on disk are rebuilt
+index_version = 1
+
+
+class SchemaIndex:
+    """
+    Lookups compiled from a frictionless table schema (or schema descriptor)
+
+    Parameters
+    ----------
+    field_names: list
+        Field names in schema order
+    types: dict
+        field name -> frictionless type
+    formats: dict
+        field name -> format (only fields with a format)
+    enums: dict
+        field name -> list of enum values (only enum constrained fields)
+    original_names: dict
+        `jcoin:original_name` -> field name
+    missing_values: list
+        Missing value tokens of the schema (ie `missingValues`)
+    primary_key: list
+        Primary key field names
+    """
+
+    def __init__(
+        self,
+        field_names,
+        types,
+        formats,
+        enums,
+        original_names,
+        missing_values,
+        primary_key,
+    ):
+        self.field_names = list(field_names)
+        self.types = dict(types)
+        self.formats = dict(formats)
+        self.enums = dict(enums)
+        self.original_names = dict(original_names)
+        self.missing_values = list(missing_values)
+        self.primary_key = list(primary_key)
+
+        self.field_set = frozenset(self.field_names)
+        self.enum_sets = {name: frozenset(values) for name, values in self.enums.items()}
+
+    @classmethod
+    def from_schema(cls, schema):
+        fields = schema["fields"]
+        primary_key = schema.get("primaryKey", [])
+        if isinstance(primary_key, str):
+            primary_key = [primary_key]
+
+        return cls(
+            field_names=[field["name"] for field in fields],
+            types={field["name"]: field.get("type", "any") for field in fields},
+            formats={
+                field["name"]: field["format"] for field in fields if field.get("format")
+            },
+            enums={
+                field["name"]: list(field["constraints"]["enum"])
+                for field in fields
+                if field.get("constraints", {}).get("enum")
+            },
+            original_names={
+                field.get("custom").get("jcoin:original_name"): field["name"]
+                for field in fields
+                if field.get("custom", {}).get("jcoin:original_name")
+            },
+            missing_values=schema.get("missingValues", [""]),
+            primary_key=primary_key,
+        )
+
+    def to_dict(self):
+        return {
+            "field_names": self.field_names,
+            "types": self.types,
+            "formats": self.formats,
+            "enums": self.enums,
+            "original_names": self.original_names,
+            "missing_values": self.missing_values,
+            "primary_key": self.primary_key,
+        }
+
+    @classmethod
+    def from_dict(cls, index):
+        return cls(**index)
+
+    def fields_of_type(self, *types):
+        """field names (in schema order) of the given type(s)"""
+        return [name for name in self.field_names if self.types[name] in types]
+
+    def categorical_fields(self):
+        """string fields (in schema order) constrained to an enum"""
+        return [name for name in self.fields_of_type("string") if name in self.enums]
+
+    def categories(self, name, missing_value="Missing"):
+        """enum values of a field followed by the missing value tokens"""
+        tokens = [value for value in self.missing_values if value] + [missing_value]
+        return list(dict.fromkeys(self.enums[name] + tokens))
+
+
+def _index_path(digest):
+    return cache.get_cache_dir() / "indexes" / f"{digest}-v{index_version}.json"
+
+
+def load_index(path, ref=None):
+    """
+    get the index for a schema file in the JCOIN-Core-Measures repository
+    (see `cache.fetch`), compiling and storing it on disk if not yet done
+    for this version of the schema.
+    """
+    digest = cache.get_digest(path, ref=ref)
+    if digest and _index_path(digest).is_file():
+        return SchemaIndex.from_dict(json.loads(_index_path(digest).read_text()))
+
+    schema_index = SchemaIndex.from_schema(cache.load_json(path, ref=ref))
+    digest = cache.get_digest(path, ref=ref)
+    cache._write_atomic(_index_path(digest), json.dumps(schema_index.to_dict()).encode())
+    return schema_index
@@ -1,9 +1,56 @@
-"""Easy access to latest versions of JCOIN schema"""
+"""Easy access to latest versions of JCOIN schema
+
+Schemas are loaded on first access (eg `schemas.baseline`) from the local
+core measures cache (see `cache`) so they are only downloaded the first time
+a given branch/commit is used. `index` gives the compiled field lookups
+(see `schema_index`) for a schema.
+"""
 from frictionless import Schema
 
-branch = "main"
-schemadir = f"https://raw.githubusercontent.com/jcoin-maarc/JCOIN-Core-Measures/{branch}/schemas/"
-baseline = Schema(schemadir + "table-schema-baseline.json")
-timepoints = Schema(schemadir + "table-schema-time-points.json")
-staff_baseline = Schema(schemadir + "table-schema-staff-baseline.json")
-staff_timepoints = Schema(schemadir + "table-schema-staff-time-points.json")
+from . import cache
+from .schema_index import load_index
+
+paths = {
+    "baseline": "schemas/table-schema-baseline.json",
+    "timepoints": "schemas/table-schema-time-points.json",
+    "staff_baseline": "schemas/table-schema-staff-baseline.json",
+    "staff_timepoints": "schemas/table-schema-staff-time-points.json",
+}
+
+_loaded = {}
+_indexes = {}
+
+
+def load(name, ref=None, revalidate=False):
+    """load the schema of the given name (see `paths`) for a branch or commit"""
+    ref = ref or cache.pinned_ref
+    if revalidate or (name, ref) not in _loaded:
+        descriptor = cache.load_json(paths[name], ref=ref, revalidate=revalidate)
+        _loaded[(name, ref)] = Schema(descriptor)
+    return _loaded[(name, ref)]
+
+
+def index(name, ref=None):
+    """compiled `SchemaIndex` of the schema of the given name (see `paths`)"""
+    ref = ref or cache.pinned_ref
+    if (name, ref) not in _indexes:
+        _indexes[(name, ref)] = load_index(paths[name], ref=ref)
+    return _indexes[(name, ref)]
+
+
+def refresh(ref=None):
+    """revalidate all cached schemas against the remote"""
+    ref = ref or cache.pinned_ref
+    for name in paths:
+        load(name, ref=ref, revalidate=True)
+        _indexes.pop((name, ref), None)
+
+
+def __getattr__(name):
+    if name in paths:
+        return load(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(paths))
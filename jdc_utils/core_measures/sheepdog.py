@@ -42,6 +42,21 @@ recode_map = {
 }
 
 
+def _recode(values, mapping, fillna=None):
+    """
+    replaces (and fills missing) values as objects so pandas Categoricals
+    (see the categorical option of `CoreMeasures`) can be recoded to new
+    values (and are returned as Categoricals)
+    """
+    is_categorical = isinstance(values.dtype, pd.CategoricalDtype)
+    if is_categorical:
+        values = values.astype(object)
+    values = values.replace(mapping)
+    if fillna is not None:
+        values = values.fillna(fillna)
+    return values.astype("category") if is_categorical else values
+
+
 def _choose_gender_field(df):
     # NOTE: all the physical representations of missing values
     # eg., Missing, Legitiamately skipped etc have been converted
@@ -53,7 +68,7 @@ def _choose_gender_field(df):
     if select_condensed_col:
         return df["gender_id_condensed"]
     else:
-        return df["gender_id"].replace(recode_map["gender_id"])
+        return _recode(df["gender_id"], recode_map["gender_id"])
 
 
 def to_participant_node(baseline_df):
@@ -85,10 +100,10 @@ def to_demographic_node(baseline_df):
             "participants.submitter_id": submitter_id,
             "submitter_id": submitter_id,
             "gender": _choose_gender_field(baseline_df),
-            "hispanic": (
-                baseline_df["hispanic_latino"]
-                .replace(recode_map["hispanic_latino"])
-                .fillna("Not reported")
+            "hispanic": _recode(
+                baseline_df["hispanic_latino"],
+                recode_map["hispanic_latino"],
+                fillna="Not reported",
             ),
             "race": collapse_checkall(baseline_df, **race_map),
         }
@@ -1,11 +1,10 @@
+from frictionless import Resource
+from jdc_utils import register_plugins
+
 # backwards compatability
 from .curation import *
 from .deidentify import *
-
-
-def read_transformfile(transformfile):
-    with open(transformfile) as file:
-        return yaml.safe_load(file)
+from .plans import TransformPlan, compile_transformfile, read_transformfile
 
 
 def run_transformfile(df, transformfile):
@@ -20,15 +19,16 @@ def run_transformfile(df, transformfile):
 
     If kwargs, then need to register a function
     calling the dictionary as keyword args in TransformDf class.
+
+    The transform file is compiled (validated and with adjacent rename/replace
+    steps fused) once and the compiled plan is reused for each DataFrame
+    transformed with the same file (see `plans`).
     """
-    transform_mappings = OrderedDict(read_transformfile(transformfile))
+    return compile_transformfile(transformfile).run(df)
 
-    for fxn_name, params in transform_mappings.items():
-        if fxn_name in ["replace_ids", "shift_dates"]:
-            print(fxn_name)
-            df = getattr(df, fxn_name)(**params)
-            print(df.columns)
-        else:
-            getattr(df, fxn_name)(**params)
 
-    return df
+def read_df(filepath):
+    """reads a data file (e.g., csv, xlsx, sav or dta) into a DataFrame"""
+    # SPSS/Stata frictionless plugins for .sav/.dta files
+    register_plugins()
+    return Resource(path=str(filepath)).to_petl().todf()
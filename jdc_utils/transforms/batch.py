@@ -0,0 +1,173 @@
+"""
+Transforming a batch of data files with one transform file (see `jdc-utils transform`)
+
+Each data file is read (see `read_df`), run through the compiled plan of the
+transform file (see `plans`) and written to outdir/<file stem>-transformed.csv.
+With more than one job, files are transformed in a process pool where each
+worker compiles the transform file once. Outputs are written to a partial file
+and moved into place once complete so an output file is never left half
+written, and results are reported (as they complete) by the parent process only.
+
+A manifest in outdir records the sha256 of each transformed data file and of the
+transform file so files that haven't changed since they were last transformed are
+skipped on the next run (see `transform_files`).
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from .plans import compile_transformfile
+
+# (in outdir -- see `read_manifest`)
+manifest_name = "manifest.json"
+_worker_transformfile = None
+
+
+def target_path(file_path, outdir="tmp/jdc"):
+    return Path(outdir) / f"{Path(file_path).stem}-transformed.csv"
+
+
+def _init_worker(transformfile):
+    global _worker_transformfile
+    _worker_transformfile = transformfile
+    compile_transformfile(transformfile)
+
+
+def transform_file(file_path, transformfile, targetpath):
+    """reads, transforms and writes one data file (returns the target path)"""
+    # NOTE: imported here as read_df is defined in the package __init__
+    from . import read_df
+
+    targetdf = compile_transformfile(transformfile).run(read_df(file_path))
+    partialpath = Path(f"{targetpath}.partial")
+    try:
+        targetdf.to_csv(partialpath, index=False)
+    except Exception as e:
+        partialpath.unlink(missing_ok=True)
+        raise e
+    os.replace(partialpath, targetpath)
+    return targetpath
+
+
+def _transform_file_in_worker(file_path, targetpath):
+    try:
+        return transform_file(file_path, _worker_transformfile, targetpath)
+    except Exception as e:
+        # (some exceptions, eg frictionless', can't be unpickled in the parent process)
+        raise Exception(f"{type(e).__name__}: {e}") from None
+
+
+def file_digest(path):
+    """sha256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(outdir):
+    """
+    data file path -> sha256 of the data file and transform file and the target
+    path of each file last transformed into outdir (see `transform_files`)
+    """
+    manifest_path = Path(outdir) / manifest_name
+    if manifest_path.is_file():
+        return json.loads(manifest_path.read_text())
+    return {}
+
+
+def write_manifest(outdir, manifest):
+    """writes the manifest (replacing the previous one once completely written)"""
+    manifest_path = Path(outdir) / manifest_name
+    partialpath = Path(f"{manifest_path}.partial")
+    partialpath.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    os.replace(partialpath, manifest_path)
+
+
+def transform_files(
+    transformfile, file_paths, outdir="tmp/jdc", jobs=None, force=False
+):
+    """
+    transforms each data file in file_paths with transformfile (see module docstring)
+    and yields (file path, target path, None) for each file as it completes or
+    (file path, None, exception) if it failed (the other files are still transformed).
+
+    With jobs of None or 1, files are transformed one at a time in this process.
+    Otherwise, files are transformed in a process pool of jobs workers.
+
+    If several files have the same target path (ie the same file stem), only the
+    last one is transformed (as it would overwrite the others).
+
+    Files whose contents (and the transform file's contents) are the same as when
+    they were last transformed into outdir (see `read_manifest`) and whose target
+    file still exists are skipped unless force is True. The manifest is updated as
+    each file completes so files transformed before a failure are still skipped
+    in the next run.
+    """
+    targets = {}
+    for file_path in file_paths:
+        targetpath = target_path(file_path, outdir)
+        if targetpath in targets:
+            print(
+                f"WARNING: skipping {targets[targetpath]} as {file_path} "
+                f"is also written to {targetpath}"
+            )
+        targets[targetpath] = file_path
+
+    # validated (and compiled) once for all files
+    compile_transformfile(transformfile)
+    Path(outdir).mkdir(exist_ok=True, parents=True)
+
+    manifest = read_manifest(outdir)
+    transformfile_sha256 = file_digest(transformfile)
+    entries = {}
+    for targetpath, file_path in list(targets.items()):
+        key = str(Path(file_path).resolve())
+        entries[targetpath] = {
+            "sha256": file_digest(file_path) if Path(file_path).is_file() else None,
+            "transformfile_sha256": transformfile_sha256,
+            "target": str(targetpath),
+        }
+        unchanged = manifest.get(key) == entries[targetpath] and targetpath.is_file()
+        if unchanged and not force:
+            print(f"Skipping {file_path} (unchanged since transformed to {targetpath})")
+            del targets[targetpath]
+
+    def update_manifest(file_path, targetpath, error):
+        key = str(Path(file_path).resolve())
+        if error:
+            manifest.pop(key, None)
+        else:
+            manifest[key] = entries[targetpath]
+        write_manifest(outdir, manifest)
+
+    if not jobs or jobs == 1:
+        for targetpath, file_path in targets.items():
+            try:
+                transform_file(file_path, transformfile, targetpath)
+            except Exception as e:
+                update_manifest(file_path, targetpath, e)
+                yield file_path, None, e
+                continue
+            update_manifest(file_path, targetpath, None)
+            yield file_path, targetpath, None
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(str(transformfile),)
+    ) as executor:
+        futures = {
+            executor.submit(_transform_file_in_worker, file_path, targetpath): (
+                file_path,
+                targetpath,
+            )
+            for targetpath, file_path in targets.items()
+        }
+        for future in as_completed(futures):
+            file_path, targetpath = futures[future]
+            error = future.exception()
+            update_manifest(file_path, targetpath, error)
+            yield file_path, None if error else targetpath, error
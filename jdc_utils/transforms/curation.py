@@ -1,10 +1,11 @@
+import math
 import re
 from collections import OrderedDict
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import pandas_flavor as pf
-import petl as etl
 
 
 # Note: alternative to using pandas-flavor is making a child class of pd.DataFrame
@@ -26,6 +27,65 @@ def to_quarter(df, from_date_name_to_quarter_name, inplace=True):
     # return quarters
 
 
+def _missing_and_checked(values, checked):
+    """missing and checked masks of a 2d object array"""
+    try:
+        # (NaN and NaT are not equal to themselves)
+        return (values == None) | (values != values), values == checked
+    except TypeError:
+        # values that can't be compared (e.g., pd.NA) so compare unique values
+        codes, uniques = pd.factorize(values.ravel())
+        is_checked = np.array([value == checked for value in uniques] + [False], dtype=bool)
+        return (codes == -1).reshape(values.shape), is_checked[codes].reshape(values.shape)
+
+
+def _collapse_checked(
+    is_missing,
+    is_checked,
+    labels,
+    multi_checked="Multiple checked",
+    none_checked="None checked",
+    fillna=False,
+):
+    """
+    collapses the missing and checked masks (see `_missing_and_checked`) of
+    check-all-that-apply values (one column per option) into one label per row
+
+    - one option checked: the option's label
+    - more than one option checked: multi_checked
+    - no options checked: none_checked (or None/fillna if any option is missing)
+
+    labels is a dict of option (column) name: label
+    """
+    n_checked = is_checked.sum(axis=1)
+    is_complete = ~is_missing.any(axis=1)
+
+    # codes into the choices: the (first) checked option, multi_checked or none_checked
+    codes = np.where(n_checked == 1, is_checked.argmax(axis=1), len(labels))
+    codes = np.where(n_checked > 0, codes, len(labels) + 1)
+    choices = list(labels) + [multi_checked, none_checked]
+
+    # rows with missing options are missing (unless multiple options are checked)
+    is_multi_checked = np.array([choice == multi_checked for choice in choices])
+    codes = np.where(is_complete | is_multi_checked[codes], codes, len(choices))
+
+    # labels replace option names anywhere in the result (as with Series.replace)
+    labelled_choices = np.empty(len(choices) + 1, dtype=object)
+    labelled_choices[:] = [labels.get(choice, choice) for choice in choices] + [
+        fillna if fillna else None
+    ]
+    return labelled_choices[codes]
+
+
+def _checkall_labels(columns=None, columns_to_labels=None, labels=None):
+    """option (column) name: label for each check-all-that-apply field"""
+    # added option to make a columns to labels dict to make easier to see mappings
+    if columns_to_labels and not columns and not labels:
+        columns = columns_to_labels.keys()
+        labels = columns_to_labels.values()
+    return dict(zip(columns, labels if labels else columns))
+
+
 @pf.register_dataframe_method
 def collapse_checkall(
     df,
@@ -40,39 +100,87 @@ def collapse_checkall(
     inplace=True,
 ):
     """Collapse multiple check-all-that-apply fields into one"""
+    labels = _checkall_labels(columns, columns_to_labels, labels)
 
-    # added option to make a columns to labels dict to make easier to see mappings
-    if columns_to_labels and not columns and not labels:
-        columns = columns_to_labels.keys()
-        labels = columns_to_labels.values()
-
-    if df.columns.isin(columns).sum() < len(columns):
+    if df.columns.isin(list(labels)).sum() < len(labels):
         return None
 
-    bcols = df[columns] == checked
-    var = (
-        bcols.idxmax(axis=1)
-        .where(bcols.sum(axis=1) == 1, multi_checked)
-        .where(bcols.sum(axis=1) > 0, none_checked)
+    is_missing, is_checked = _missing_and_checked(
+        df[list(labels)].to_numpy(dtype=object), checked
     )
-
-    var = var.where(
-        (df[columns].notnull().sum(axis=1) == len(columns)) | (var == multi_checked),
-        None,
+    var = pd.Series(
+        _collapse_checked(
+            is_missing,
+            is_checked,
+            labels,
+            multi_checked=multi_checked,
+            none_checked=none_checked,
+            fillna=fillna,
+        ),
+        index=df.index,
+        dtype=object,
     )
 
-    if labels:
-        var.replace(dict(zip(columns, labels)), inplace=True)
-
-    if fillna:
-        var.fillna(fillna, inplace=True)
-
     if inplace:
         df[resulting_column_name] = var
     else:
         return var
 
 
+@pf.register_dataframe_method
+def collapse_checkall_groups(df, groups, inplace=True):
+    """
+    Collapse several groups of check-all-that-apply fields (e.g., race,
+    substance use and services) in one call
+
+    Parameters
+    ----------
+    groups: dict
+        resulting column name: `collapse_checkall` parameters (columns,
+        columns_to_labels, labels, checked, multi_checked, none_checked and fillna)
+        for each group. Groups with fields not in df are skipped.
+
+    Returns a DataFrame of the collapsed fields if inplace is False
+    """
+    group_labels = {}
+    for name, params in groups.items():
+        labels = _checkall_labels(
+            params.get("columns"), params.get("columns_to_labels"), params.get("labels")
+        )
+        if df.columns.isin(list(labels)).sum() == len(labels):
+            group_labels[name] = labels
+
+    # all fields compared once (for each checked value) and then sliced for each group
+    all_columns = list(dict.fromkeys(c for labels in group_labels.values() for c in labels))
+    values = df[all_columns].to_numpy(dtype=object)
+    positions = {column: i for i, column in enumerate(all_columns)}
+    is_checked = {}
+
+    collapsed = {}
+    for name, labels in group_labels.items():
+        params = {
+            key: value
+            for key, value in groups[name].items()
+            if key in ["multi_checked", "none_checked", "fillna"]
+        }
+        checked = groups[name].get("checked", "Checked")
+        if checked not in is_checked:
+            is_missing, is_checked[checked] = _missing_and_checked(values, checked)
+        group_positions = [positions[column] for column in labels]
+        collapsed[name] = _collapse_checked(
+            is_missing[:, group_positions],
+            is_checked[checked][:, group_positions],
+            labels,
+            **params,
+        )
+
+    if inplace:
+        for name, var in collapsed.items():
+            df[name] = pd.Series(var, index=df.index, dtype=object)
+    else:
+        return pd.DataFrame(collapsed, index=df.index, dtype=object)
+
+
 @pf.register_dataframe_method
 def replace_all_values(df, from_value_to_value, inplace=True):
     df.replace(from_value_to_value, inplace=inplace)
@@ -101,9 +209,172 @@ def combine_columns(df, new_name, cols):
         df[new_name] += df[c].astype(str)
 
 
+def _recode_values(series, op, arg):
+    """
+    fillna or replace values of a column (string columns without missing values
+    are replaced on their unique values which are then mapped back with the codes)
+    """
+    # (inplace as fillna/replace can infer a different dtype when returning a copy)
+    if op == "fillna":
+        series = series.copy()
+        series.fillna(arg, inplace=True)
+        return series
+    if (
+        isinstance(arg, dict)
+        and series.dtype == object
+        and pd.api.types.infer_dtype(series, skipna=False) == "string"
+    ):
+        codes, uniques = pd.factorize(series)
+        uniques = pd.Series(uniques, dtype=object)
+        uniques.replace(arg, inplace=True)
+        recoded = uniques.take(codes)
+        recoded.index = series.index
+        recoded.name = series.name
+        return recoded
+    series = series.copy()
+    series.replace(arg, inplace=True)
+    return series
+
+
+def _is_scalar(value):
+    """hashable, non-missing scalar (ie can be looked up in a dict as pandas would match it)"""
+    if isinstance(value, float) and math.isnan(value):
+        return False
+    return isinstance(value, (str, int, float, bool))
+
+
+def _is_value_mapping(mapping):
+    return isinstance(mapping, dict) and all(
+        _is_scalar(key) and _is_scalar(value) for key, value in mapping.items()
+    )
+
+
+def _can_compose(first):
+    """
+    replacing with first doesn't change the type of any value (which
+    could change the column's dtype before replacing with second)
+    """
+    return all(type(key) == type(value) for key, value in first.items())
+
+
+def _compose(first, second):
+    """one mapping with the same result as replacing with first and then second"""
+    composed = {key: second.get(value, value) for key, value in first.items()}
+    for key, value in second.items():
+        if key not in first:
+            composed[key] = value
+    return composed
+
+
+class _ColumnOps:
+    """
+    fillna/replace operations for each (original) column of a DataFrame and
+    its renames, worked out by column name before any column is changed (see
+    `rename_and_change_values` and `plans.FusedStep`). Consecutive replace
+    mappings of a column are composed into one where possible.
+    """
+
+    def __init__(self, columns):
+        self.names = {column: column for column in columns}  # original -> current
+        self.originals = dict(self.names)  # current -> original
+        self.ops = {}
+
+    def rename(self, mapping):
+        """renames current columns at once (False if resulting in duplicate column names)"""
+        renamed = {self.originals[old]: new for old, new in mapping.items() if old in self.originals}
+        for original in renamed:
+            del self.originals[self.names[original]]
+        for original, new in renamed.items():
+            if new in self.originals:
+                return False
+            self.originals[new] = original
+            self.names[original] = new
+        return True
+
+    def add(self, name, op, arg):
+        """adds a fillna or replace operation on a current column (if a column)"""
+        if name not in self.originals:
+            return
+        col_ops = self.ops.setdefault(self.originals[name], [])
+        if (
+            op == "replace"
+            and col_ops
+            and col_ops[-1][0] == "replace"
+            and _is_value_mapping(col_ops[-1][1])
+            and _is_value_mapping(arg)
+            and _can_compose(col_ops[-1][1])
+        ):
+            col_ops[-1] = ("replace", _compose(col_ops[-1][1], arg))
+        else:
+            col_ops.append((op, arg))
+
+    def add_name_and_values(self, name_and_values):
+        """
+        adds the operations and renames of `rename_and_change_values` in the order
+        it applies them (False if a rename results in duplicate column names)
+        """
+        for name, new_name_and_values in name_and_values.items():
+            if name not in self.originals:
+                continue
+            if "fillna" in new_name_and_values:
+                self.add(name, "fillna", new_name_and_values["fillna"])
+            if "values" in new_name_and_values:
+                self.add(name, "replace", new_name_and_values["values"])
+            if "name" in new_name_and_values:
+                if not self.rename({name: new_name_and_values["name"]}):
+                    return False
+        return True
+
+    def renames(self):
+        return {old: new for old, new in self.names.items() if old != new}
+
+
+def _resolve_name_and_values(columns, name_and_values):
+    """
+    fillna/replace operations for each (original) column and the renames
+    in the order `rename_and_change_values` applies them (None if a rename
+    results in duplicate column names or columns are already duplicated)
+    """
+    if columns.has_duplicates:
+        return None
+
+    column_ops = _ColumnOps(columns)
+    if not column_ops.add_name_and_values(name_and_values):
+        return None
+    return column_ops.ops, column_ops.renames()
+
+
 @pf.register_dataframe_method
 def rename_and_change_values(df: pd.DataFrame, name_and_values: dict):
-    """Rename vars and/or replace values"""
+    """
+    Rename vars and/or replace values
+
+    The renames and fillna/replace operations are worked out up front (so
+    later entries can refer to earlier new names) and then each changed
+    column is recoded and set once and all columns renamed with a single rename.
+    """
+    resolved = _resolve_name_and_values(df.columns, name_and_values)
+    if resolved is None:
+        _rename_and_change_values_by_column(df, name_and_values)
+        return
+
+    ops, renames = resolved
+    for column, col_ops in ops.items():
+        series = df[column]
+        for op, arg in col_ops:
+            series = _recode_values(series, op, arg)
+        if isinstance(series.dtype, np.dtype) and series.dtype == df[column].dtype:
+            # set inplace (assigning a new column copies the rest of its block)
+            df.loc[:, column] = series.to_numpy()
+        else:
+            df[column] = series
+
+    if renames:
+        df.rename(columns=renames, inplace=True)
+
+
+def _rename_and_change_values_by_column(df, name_and_values):
+    """rename vars and/or replace values one column at a time"""
     for current_name, new_name_and_values in name_and_values.items():
         # added fillna as it could mean something different for each variable
         if current_name in df.columns:
@@ -164,12 +435,17 @@ def to_new_names(df, mappings, old_and_new_names=False):
 
 @pf.register_dataframe_method
 def add_missing_fields(df, field_list, missing_value="Missing"):
-    tbl = etl.fromdataframe(df)
-    fieldnames_in_data = tbl.fieldnames()
-    fields_to_add = []
-    for fieldname in field_list:
-        if fieldname not in fieldnames_in_data:
-            fields_to_add.append((fieldname, missing_value))
-
-    targetdf = tbl.addfields(fields_to_add).cut(field_list).todf()
+    """
+    selects the fields in field_list (in that order) adding any fields
+    not in df filled with missing_value (existing fields keep their dtypes)
+
+    Returns a new DataFrame with a default index
+    """
+    field_list = list(field_list)
+    # (first of any duplicate fields as with petl's cut)
+    if df.columns.has_duplicates:
+        df = df.loc[:, ~df.columns.duplicated()]
+
+    targetdf = df.reindex(columns=field_list, fill_value=missing_value)
+    targetdf.reset_index(drop=True, inplace=True)
     return targetdf
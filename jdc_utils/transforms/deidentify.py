@@ -15,41 +15,49 @@ import git
 import numpy as np
 import pandas as pd
 import pandas_flavor as pf
-from dataforge import ids, tools
 
+from .mapping_backends import _to_str, mapping_backends
+from .mapping_store import MappingStore
+
+# (in the order the history repos are pushed -- see `mapping_backends`)
 versioned_filenames = {
     "shift_dates": "days_for_shift_date.csv",
     "replace_ids": "jdc_person_id.csv",
 }
 
 
-def _combine_mappings(mapfilepath):
+def _combine_mappings(mapfilepath=None):
     """
-    join version controlled files into one
+    upserts the rows newly added to the version controlled files
+    into the combined mapping store (see `MappingStore`) and, if
+    a mapfilepath is given, exports all mappings joined into one csv
     for convenience and accessibility
 
     NOTE: this is an internal fxn for use with
     functions using versioned controlled files
     (ie must be in a directory with tmp/git/<version control repo>)
     """
+    with MappingStore() as store:
+        store.update()
+        if mapfilepath:
+            store.export_csv(mapfilepath)
 
-    files = Path(".").glob("tmp/git/*/*.csv")
-    dfs = [pd.read_csv(f) for f in files]
 
-    id_column = list(
-        reduce(
-            lambda dfx, dfy: set(dfx.columns.tolist()).intersection(
-                dfy.columns.tolist()
-            ),
-            dfs,
-        )
-    )
-    merge = lambda dfx, dfy: dfx.merge(dfy, on=id_column, how="outer")
-    return reduce(merge, dfs).to_csv(mapfilepath, index=False)
+def _combined_mapfilepath(history_path):
+    history_path = Path(history_path)
+    return history_path.parent / (history_path.name + ".csv")
+
+
+def export_mappings(history_path):
+    """
+    writes the combined mappings (eg local ids, jdc ids and days for shift date)
+    to a csv beside the history_path directory (ie <history_path>.csv)
+    """
+    _combine_mappings(_combined_mapfilepath(history_path))
 
 
 @pf.register_dataframe_method
-def replace_ids(df, id_file, id_column, history_path):
+def replace_ids(df, id_file, id_column, history_path, export_csv=True, backend="git"):
     """
     (pulls in the most up-to-date mappings stored in id_history_path).
     The id_history_path pulls in the most up to date id mappings. It is stored
@@ -69,31 +77,32 @@ def replace_ids(df, id_file, id_column, history_path):
     - The name of the new id column is determined by the column name in id_file.
 
     - See the [dataforge function documentation](https://gitlab.com/phs-rcg/data-forge/-/blob/main/src/dataforge/ids.py) for more general details
-        on the replace id function used in this implementation.
+        on the replace id function this implementation follows.
+
+    - Only the newly added mappings are added to the combined mapping store. Set export_csv=False to
+        skip rewriting the combined mappings csv (see `export_mappings`).
+
+    - Previous mappings are looked up in the given mapping backend ("git" to read the mapping
+        file into memory or "sqlite" for an indexed local store -- see `mapping_backends`).
 
 
     """
-    history_path = Path(history_path)
-    id_map_file = versioned_filenames["replace_ids"]
-    id_history_path = history_path.joinpath(id_map_file).with_suffix(".git")
-
-    df_new = ids.replace_ids(
-        df=df,
-        id_file=id_file,
-        map_file=id_map_file,
-        column=id_column,
-        map_url=id_history_path.as_posix(),
+    session = DeidentificationSession(
+        history_path, id_file=id_file, backend=backend, export_csv=export_csv
     )
-    _combine_mappings(history_path.parent / (history_path.name + ".csv"))
+    with session:
+        df_new = session.replace_ids(df, id_column)
     return df_new
 
 
 @pf.register_dataframe_method
-def shift_dates(df, id_column, date_columns, history_path, seed=None):
+def shift_dates(
+    df, id_column, date_columns, history_path, seed=None, export_csv=True, backend="git"
+):
     """
     This wrapper function combines dataforge's offset and shift_dates function:
     1. Gets day offsets (one offset per individual
-    specified by id from random number of days between -162 and  163);
+    specified by id from a random number of days between -182 and 183);
     2. generates new offsets for new ids without day offsets, adds these
     to a file storing these id <> day offset mappings and pushes them to
     a repository storing the history of these date shifts in a shared location
@@ -108,49 +117,296 @@ def shift_dates(df, id_column, date_columns, history_path, seed=None):
         the most recent version.
 
     - See the [dataforge function documentation](https://gitlab.com/phs-rcg/data-forge/-/blob/main/src/dataforge/tools.py) for more general details
-        on the shift_dates and date_offset functions used in this implementation.
+        on the shift_dates and date_offset functions this implementation follows.
+
+    - Only the newly added mappings are added to the combined mapping store. Set export_csv=False to
+        skip rewriting the combined mappings csv (see `export_mappings`).
+
+    - Previous mappings are looked up in the given mapping backend ("git" to read the mapping
+        file into memory or "sqlite" for an indexed local store -- see `mapping_backends`).
 
 
     """
-    history_path = Path(history_path)
-    ids = df[id_column]
-    offsets_map_file = versioned_filenames["shift_dates"]
-    offsets_history_path = history_path.joinpath(offsets_map_file).with_suffix(".git")
-    date_columns = copy.deepcopy(date_columns)
-    offsets = tools.date_offset(
-        key=ids,
-        offset_file=offsets_map_file,
-        name=offsets_history_path.stem,
-        offset_url=offsets_history_path.as_posix(),
-        seed=seed,
+    session = DeidentificationSession(history_path, backend=backend, export_csv=export_csv)
+    with session:
+        df_new = session.shift_dates(df, id_column, date_columns, seed=seed)
+    return df_new
+
+
+def _parse_dates(values):
+    """
+    parses a column of date values (eg strings) into datetime64 by parsing each
+    unique value once (as `pd.to_datetime(column, errors="coerce")` would, with
+    unparseable values as NaT). Values not parsed along with the others (eg in
+    another format than the first value) are parsed on their own.
+    """
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques, dtype=object)
+    parsed = pd.to_datetime(uniques, errors="coerce")
+    unparsed = parsed.isna() & uniques.notna()
+    if unparsed.any():
+        parsed = parsed.astype(object)
+        parsed[unparsed] = [pd.to_datetime(value, errors="coerce") for value in uniques[unparsed]]
+        parsed = pd.to_datetime(parsed)
+    dates = np.append(parsed.to_numpy("datetime64[ns]"), np.datetime64("NaT", "ns"))
+    return dates[codes]
+
+
+def _format_dates(dates, date_format):
+    """formats datetime64 values (NaT as NaN) by formatting each unique date once"""
+    codes, uniques = pd.factorize(dates)
+    formatted = np.append(
+        pd.DatetimeIndex(uniques).strftime(date_format).to_numpy(object), np.nan
     )
+    return formatted[codes]
+
 
+def _shift_dates_by_offsets(df, offsets, id_column, date_columns, date_format="%Y%m%d"):
+    """
+    shifts the date columns by the day offsets (indexed by id) into
+    shifted_<date column> columns (as with dataforge's `shift_dates`)
+    formatted as in schema
+
+    Each date column is parsed on its own (see `_parse_dates`) and offsets are
+    looked up by their position in the (hashed) offset index rather than
+    merged onto the DataFrame. Returns a new DataFrame with a default index (as with
+    the previous merge-based implementation).
+    """
     if isinstance(date_columns, str):
         date_columns = [date_columns]
-    elif isinstance(date_columns,tuple):
-        date_columns = list(date_columns)
 
+    date_columns_in_df = []
     for col in date_columns:
         if not col in list(df):
             print(f"{col} not in dataframe so removing from the date column list")
-            date_columns.remove(col)
         else:
-            df[col] = pd.to_datetime(df[col], errors="coerce")
+            date_columns_in_df.append(col)
 
-    # shift the dates with saved offsets
-    df_new = tools.shift_dates(
-        df=df, shift=offsets, date_cols=date_columns, merge_on=id_column
-    )
+    df_new = df.reset_index(drop=True)
+    if not date_columns_in_df:
+        return df_new
 
-    # change to format specified in schema
-    for col in date_columns:
-        df_new[col] = df_new[col].dt.strftime("%Y%m%d")
+    # day offsets of each row (NaN if id has no offset)
+    positions = offsets.index.get_indexer(df_new[id_column])
+    days = np.append(offsets.to_numpy(dtype="float64", na_value=np.nan), np.nan)
+    days = days[positions]
+    is_missing = np.isnan(days)
+    shift = np.where(is_missing, 0, days).astype("timedelta64[D]").astype("timedelta64[ns]")
+    shift[is_missing] = np.timedelta64("NaT")
+
+    for col in date_columns_in_df:
+        dates = _parse_dates(df_new[col].to_numpy(dtype=object))
+        df_new["shifted_" + col] = _format_dates(dates + shift, date_format)
 
-    # update mappings file
-    _combine_mappings(history_path.parent / (history_path.name + ".csv"))
     return df_new
 
 
+class DeidentificationSession:
+    """
+    Opens the id and date offset mapping histories (git bare repos in history_path) once,
+    deidentifies any number of DataFrames (eg every resource in a core measure package)
+    with the mappings looked up in the given mapping backend and then commits all newly
+    added mappings at once. If anything fails within the session, none of the new
+    mappings are committed.
+
+    Ids and offsets are assigned in the same way (and in the same order) as with
+    dataforge's `replace_ids` and `date_offset` functions called on each DataFrame in turn.
+
+    Example
+    --------
+    with DeidentificationSession(history_path, id_file) as session:
+        baseline = session.deidentify(baseline, "record_id", ["visit_date"])
+        timepoints = session.deidentify(timepoints, "record_id", ["visit_date"])
+
+    Parameters
+    ----------
+    history_path: str
+        Directory containing the version control history of mapping files
+        (see `init_version_history_all`)
+    id_file: Optional[str]
+        The generated ids (needed for `replace_ids`)
+    repo_dir: str
+        Directory for the local clones of the history repos
+    backend: Union[str, MappingBackend]
+        Where mappings are looked up and added: "git" (mapping files read into memory)
+        or "sqlite" (indexed local store of the history repos -- see
+        `mapping_backends`) or a MappingBackend instance
+    export_csv: bool
+        Whether to rewrite the combined mappings csv on commit (see `export_mappings`)
+    """
+
+    def __init__(
+        self,
+        history_path,
+        id_file=None,
+        repo_dir="tmp/git",
+        backend="git",
+        export_csv=True,
+    ):
+        self.history_path = Path(history_path)
+        self.id_file = id_file
+        self.repo_dir = Path(repo_dir)
+        if isinstance(backend, str):
+            if backend not in mapping_backends:
+                raise Exception(
+                    f"Mapping backend must be one of {list(mapping_backends)} not {backend}"
+                )
+            backend = mapping_backends[backend](
+                self.history_path, versioned_filenames, repo_dir=self.repo_dir
+            )
+        self.backend = backend
+        self.export_csv = export_csv
+        self.is_open = False
+        self._ids = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            self.rollback()
+        else:
+            self.commit()
+
+    def open(self):
+        """clone (or pull) each history repo and open the mapping backend"""
+        self.backend.open()
+        self.is_open = True
+        self._ids = None
+        return self
+
+    def _id_pool(self):
+        """
+        the jdc ids in id_file by their string value and those not yet assigned.
+        Read in once per session (e.g., rather than for each chunk of a large file)
+        as ids are only assigned through the session while it is open.
+        """
+        if self._ids is None:
+            try:
+                ids = pd.read_csv(self.id_file)
+            except pd.errors.EmptyDataError:
+                raise Exception(f"id_file {self.id_file} is empty (needs a column of jdc ids)")
+            new_name = ids.columns[0]
+            jdc_ids = pd.Series(ids[new_name].values, index=_to_str(ids[new_name]).values)
+            self._ids = {
+                "name": new_name,
+                "jdc_ids": jdc_ids[~jdc_ids.index.duplicated()],
+                "available": ids.loc[
+                    ~self.backend.is_assigned("replace_ids", ids[new_name]), new_name
+                ],
+            }
+        return self._ids
+
+    def replace_ids(self, df, id_column):
+        """replaces the ids in id_column (a column or index level) with mapped jdc ids"""
+        assert self.is_open, "Session needs to be opened first"
+        id_pool = self._id_pool()
+        new_name = id_pool["name"]
+
+        is_index = id_column in df.index.names
+        if is_index:
+            old_ids = df.index.get_level_values(id_column).to_series(index=df.index)
+        elif id_column in df.columns:
+            old_ids = df[id_column]
+        else:
+            raise Exception("Column {} not found in dataframe".format(id_column))
+
+        # unique ids (in order of appearance) and their previously mapped jdc ids
+        keys = old_ids.drop_duplicates().dropna()
+        new_ids = self.backend.lookup("replace_ids", keys)
+
+        is_new = new_ids.isna().values
+        need_ids = keys[is_new]
+        available_ids = id_pool["available"]
+        if len(need_ids) > len(available_ids):
+            raise Exception(
+                f"Too few new IDs: {len(need_ids)} ids need a jdc id but only "
+                f"{len(available_ids)} unassigned ids are left in {self.id_file}"
+            )
+
+        assigned_ids = available_ids.iloc[: len(need_ids)].values
+        id_pool["available"] = available_ids.iloc[len(need_ids) :]
+        new_map = pd.DataFrame({id_column: need_ids.values, new_name: assigned_ids})
+        self.backend.add("replace_ids", new_map.sort_values(by=id_column))
+
+        # back to the jdc ids as read from the id file (eg integers)
+        jdc_ids = id_pool["jdc_ids"]
+        positions = jdc_ids.index.get_indexer(new_ids)
+        # (the trailing None stands in for -1, ie ids not in the id file, which are kept)
+        as_read = np.append(jdc_ids.to_numpy(dtype=object), None)[positions]
+        new_ids = new_ids.where(positions == -1, pd.Series(as_read))
+        new_ids[is_new] = assigned_ids
+        new_ids = old_ids.map(pd.Series(new_ids.values, index=keys.values))
+
+        df_new = df.copy()
+        if is_index:
+            index = df_new.index.to_frame()
+            index[id_column] = new_ids.values
+            df_new.index = pd.MultiIndex.from_frame(index).rename(
+                [new_name if name == id_column else name for name in index.columns]
+            )
+            if df_new.index.nlevels == 1:
+                df_new.index = df_new.index.get_level_values(0)
+        else:
+            df_new[id_column] = new_ids.values
+            df_new.rename(columns={id_column: new_name}, inplace=True)
+        return df_new
+
+    def date_offsets(self, key, seed=None, min_days=-182, max_days=183):
+        """day offsets (indexed by id) for each id in key (see dataforge's `date_offset`)"""
+        assert self.is_open, "Session needs to be opened first"
+        name = Path(versioned_filenames["shift_dates"]).stem
+        keys = pd.Series(key).drop_duplicates().dropna()
+        rng = np.random.default_rng(seed=seed)
+
+        offsets = pd.to_numeric(self.backend.lookup("shift_dates", keys)).astype("Int64")
+        is_new = offsets.isna().values
+        # one draw per unique id (as in dataforge) but only used for new ids
+        new_offsets = rng.integers(low=min_days, high=max_days + 1, size=len(keys))
+        offsets[is_new] = new_offsets[is_new]
+
+        new_map = pd.DataFrame({keys.name: keys.values[is_new], name: new_offsets[is_new]})
+        self.backend.add("shift_dates", new_map.sort_values(by=keys.name))
+        return pd.Series(offsets.values, index=keys.values, name=name)
+
+    def shift_dates(self, df, id_column, date_columns, seed=None):
+        """shifts the date columns by the (new or previously assigned) day offsets of each id"""
+        offsets = self.date_offsets(df[id_column], seed=seed)
+        return _shift_dates_by_offsets(df, offsets, id_column, date_columns)
+
+    def deidentify(self, df, id_column, date_columns, fxns=["replace_ids", "shift_dates"]):
+        if "replace_ids" in fxns:
+            df = self.replace_ids(df, id_column)
+            id_column = self._id_pool()["name"]
+        if "shift_dates" in fxns:
+            df = self.shift_dates(df, id_column, date_columns)
+        return df
+
+    def commit(self, export_csv=None):
+        """
+        adds all new mappings to the mapping backend (which pushes them
+        to the history repos once per repo -- see `mapping_backends`)
+        """
+        try:
+            self.backend.commit()
+        except Exception as e:
+            self.rollback()
+            raise e
+
+        self.is_open = False
+        if export_csv is None:
+            export_csv = self.export_csv
+        _combine_mappings(
+            _combined_mapfilepath(self.history_path) if export_csv else None
+        )
+
+    def rollback(self):
+        """discards all mappings added in this session"""
+        self.backend.rollback()
+        self.is_open = False
+        self._ids = None
+
+
 def deidentify(
     df,
     id_file,
@@ -158,25 +414,29 @@ def deidentify(
     history_path,
     date_columns,
     fxns=["replace_ids", "shift_dates"],
+    export_csv=True,
+    session=None,
+    backend="git",
 ):
-    """wrapper function for all deidentification steps"""
-    if "replace_ids" in fxns:
-        df = replace_ids(
-            df,
-            id_file=id_file,
-            id_column=id_column,
-            history_path=history_path,
-        )
-    if "shift_dates" in fxns:
-        if "replace_ids" in fxns:
-            id_column = pd.read_csv(id_file).squeeze().name
+    """
+    wrapper function for all deidentification steps
 
-        df = shift_dates(
-            df,
-            id_column=id_column,
-            date_columns=date_columns,
-            history_path=history_path,
-        )
+    All steps run within one `DeidentificationSession` so the mapping histories
+    are only pulled and pushed once (and the combined mappings csv is only
+    written once if export_csv is True -- see `export_mappings`).
+    If an open session is given (eg to deidentify several resources at once),
+    the new mappings are committed when that session is committed.
+    """
+    if session:
+        return session.deidentify(df, id_column, date_columns, fxns=fxns)
+
+    session = DeidentificationSession(history_path, id_file=id_file, backend=backend).open()
+    try:
+        df = session.deidentify(df, id_column, date_columns, fxns=fxns)
+    except Exception as e:
+        session.rollback()
+        raise e
+    session.commit(export_csv=export_csv)
     return df
 
 
@@ -207,3 +467,19 @@ def init_version_history_all(history_path, overwrite=False,**kwargs):
     for fxn, file_name in versioned_filenames.items():
         file_history_path = Path(history_path).joinpath(file_name).with_suffix(".git")
         _ = init_version_history(file_history_path, overwrite=overwrite)
+
+
+def history_heads(history_path):
+    """
+    HEAD commit of each mapping history repo in history_path (None if the
+    repo doesn't exist or has no commits yet), ie the state of the mappings
+    """
+    heads = {}
+    for file_name in versioned_filenames.values():
+        file_history_path = Path(history_path).joinpath(file_name).with_suffix(".git")
+        heads[file_name] = None
+        if file_history_path.exists():
+            with git.Repo(file_history_path) as repo:
+                if repo.head.is_valid():
+                    heads[file_name] = repo.head.commit.hexsha
+    return heads
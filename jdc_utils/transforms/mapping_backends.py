@@ -0,0 +1,309 @@
+"""
+Backends storing the deidentification mappings (ie local id -> jdc id and
+id -> days for shift date) used by `DeidentificationSession`
+
+Both backends keep the history of each mapping file in its git bare repo
+(history_path/<name>.git, cloned into tmp/git/<name>) and differ in how the
+mappings are looked up:
+
+- GitMappingBackend ("git"): reads the whole mapping files from the local clones
+    into memory (hashed on the id column) each time it is opened and pushes all
+    new mappings when committed.
+- SqliteMappingBackend ("sqlite"): looks up mappings in an indexed SQLite store
+    (see `MappingStore`) which is only updated with the rows appended to the mapping
+    files since the last run, so lookups don't depend on the size of the mapping
+    files. New mappings are pushed to the git history repos on every commit (as
+    with the git backend) before they are added to the store, so the store only
+    holds mappings already in the shared history and can be rebuilt from the
+    history repos (eg if tmp/ is removed).
+
+Each history repo is pushed on its own (git can't push several repos at once)
+in the order of file_names, so the date offsets (keyed by jdc id) are pushed
+before the ids (see `deidentify.versioned_filenames`) and every jdc id in the
+shared id history has its date offset in the shared offset history. If the ids
+push fails after the offsets were pushed, the offset history holds offsets of
+jdc ids not yet assigned: the session is rolled back (so no shifted dates are
+written) and those ids get the pushed offsets when they are assigned again
+(eg on a rerun).
+
+All ids are compared as strings so (eg) ids read as integers
+match ids previously stored in the mapping files.
+"""
+from pathlib import Path
+
+import git
+import numpy as np
+import pandas as pd
+
+from .mapping_store import MappingStore, _quote
+
+
+def _to_str(values):
+    """ids as strings (with integer-valued floats, eg from missing values, as integers)"""
+    values = pd.Series(values)
+    if pd.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+        values = values.astype("Int64")
+    return values.astype(str).where(values.notna(), None)
+
+
+def _undo_commit(repo):
+    """undoes the last commit of a repo (back to an empty repo if it's the first commit)"""
+    if repo.head.commit.parents:
+        repo.head.reset("HEAD~1", index=True, working_tree=True)
+    else:
+        repo.git.update_ref("-d", "HEAD")
+        repo.git.rm("-r", "--cached", "--quiet", ".")
+        repo.git.clean("-f", "-d")
+
+
+class MappingBackend:
+    """
+    Base class for mapping backends
+
+    Subclasses implement `_lookup`, `_is_assigned` and `commit`.
+
+    Parameters
+    ----------
+    history_path: str
+        Directory containing the version control history of mapping files
+    file_names: dict
+        Name of the mapping file for each deidentification function
+        (eg {"replace_ids": "jdc_person_id.csv"})
+    repo_dir: str
+        Directory for the local clones of the history repos
+    """
+
+    def __init__(self, history_path, file_names, repo_dir="tmp/git"):
+        self.history_path = Path(history_path)
+        self.file_names = file_names
+        self.repo_dir = Path(repo_dir)
+        self.repos = {}
+        self.new_mappings = {}
+        # new keys -> values and new values (as strings) for hashed lookups
+        self.new_values = {}
+        self.new_assigned = {}
+
+    def open(self):
+        """clone (or pull) each history repo"""
+        for fxn, file_name in self.file_names.items():
+            url = self.history_path.joinpath(file_name).with_suffix(".git").as_posix()
+            repo_path = self.repo_dir / Path(file_name).stem
+            if repo_path.exists():
+                repo = git.Repo(repo_path)
+                assert repo.remotes.origin.url == url
+                assert not repo.is_dirty(untracked_files=True)
+                # pulling into an empty repo yields git error
+                if repo.references:
+                    repo.remotes.origin.pull()
+            else:
+                repo = git.Repo.clone_from(url, repo_path)
+
+            self.repos[fxn] = repo
+        self._reset_new_mappings()
+        return self
+
+    def _map_file(self, fxn):
+        return Path(self.repos[fxn].working_tree_dir) / self.file_names[fxn]
+
+    def lookup(self, fxn, keys):
+        """
+        values (as strings) mapped to each key (eg local id -> jdc id)
+        returned as a Series aligned with keys (None if not yet mapped)
+        """
+        keys = _to_str(keys).reset_index(drop=True)
+        values = pd.Series(self._lookup(fxn, keys), dtype=object)
+        if self.new_values[fxn]:
+            values = values.where(values.notna(), keys.map(self.new_values[fxn].get))
+        return values
+
+    def is_assigned(self, fxn, values):
+        """whether each value (eg jdc id) is already mapped to a key"""
+        values = _to_str(values).reset_index(drop=True)
+        is_assigned = np.asarray(self._is_assigned(fxn, values), dtype=bool)
+        if self.new_assigned[fxn]:
+            new_assigned = self.new_assigned[fxn]
+            is_assigned |= np.fromiter(
+                (value in new_assigned for value in values), dtype=bool, count=len(values)
+            )
+        return is_assigned
+
+    def add(self, fxn, mappings):
+        """add new mappings (DataFrame with key column(s) and value as last column)"""
+        if len(mappings):
+            self.new_mappings[fxn].append(mappings)
+            new_keys = _to_str(mappings.iloc[:, 0])
+            new_values = _to_str(mappings.iloc[:, -1])
+            self.new_values[fxn].update(zip(new_keys, new_values))
+            self.new_assigned[fxn].update(new_values)
+
+    def _push(self, new_mappings):
+        """
+        appends new mappings to the mapping files and commits and pushes each repo
+        (in the order of file_names -- see module docstring). If a push fails, the
+        local commits not yet pushed are undone and the error raised.
+        """
+        committed = []
+        try:
+            for fxn in self.file_names:
+                if fxn not in new_mappings:
+                    continue
+                repo = self.repos[fxn]
+                map_file = self._map_file(fxn)
+                add_header = not map_file.exists() or not map_file.stat().st_size
+                with open(map_file, "a", newline="") as f:
+                    new_mappings[fxn].to_csv(f, index=False, header=add_header)
+                repo.git.add("--all")
+                repo.index.commit("Commit by DeidentificationSession")
+                committed.append(repo)
+
+            for repo in list(committed):
+                repo.remotes.origin.push().raise_if_error()
+                committed.remove(repo)
+        except Exception as e:
+            # undo local commits not pushed to the history repos
+            for repo in committed:
+                _undo_commit(repo)
+            raise e
+
+    def _reset_new_mappings(self):
+        self.new_mappings = {fxn: [] for fxn in self.file_names}
+        self.new_values = {fxn: {} for fxn in self.file_names}
+        self.new_assigned = {fxn: set() for fxn in self.file_names}
+
+    def _pop_new_mappings(self):
+        new_mappings = {
+            fxn: pd.concat(mappings)
+            for fxn, mappings in self.new_mappings.items()
+            if mappings
+        }
+        self._reset_new_mappings()
+        return new_mappings
+
+    def rollback(self):
+        """discards all mappings added since opened"""
+        for repo in self.repos.values():
+            repo.git.reset("--hard")
+        self._reset_new_mappings()
+
+
+class GitMappingBackend(MappingBackend):
+    """reads the mapping files into memory (see module docstring)"""
+
+    def open(self):
+        super().open()
+        self.mappings = {}
+        for fxn in self.file_names:
+            try:
+                mappings = pd.read_csv(self._map_file(fxn), dtype=str)
+                mappings = mappings.drop_duplicates(mappings.columns[0], keep="last")
+                self.mappings[fxn] = pd.Series(
+                    mappings.iloc[:, -1].values, index=mappings.iloc[:, 0].values
+                )
+            except (FileNotFoundError, pd.errors.EmptyDataError):
+                self.mappings[fxn] = pd.Series(dtype=object)
+        return self
+
+    def _lookup(self, fxn, keys):
+        return keys.map(self.mappings[fxn]).values
+
+    def _is_assigned(self, fxn, values):
+        return values.isin(self.mappings[fxn].values).values
+
+    def commit(self):
+        self._push(self._pop_new_mappings())
+
+
+class SqliteMappingBackend(MappingBackend):
+    """
+    looks up mappings in an indexed SQLite store (see module docstring)
+
+    Additional parameters
+    ---------------------
+    path: str
+        Path to the SQLite database (see `MappingStore`)
+    """
+
+    def __init__(
+        self,
+        history_path,
+        file_names,
+        repo_dir="tmp/git",
+        path="tmp/mappings.sqlite",
+    ):
+        super().__init__(history_path, file_names, repo_dir=repo_dir)
+        self.path = path
+        self.store = None
+
+    def open(self):
+        super().open()
+        self.store = MappingStore(self.path, self.repo_dir).update()
+        self.connection = self.store.connection
+        with self.connection:
+            for fxn in self.file_names:
+                columns = self._columns(self._table(fxn))
+                if columns:
+                    self.connection.execute(
+                        f"create index if not exists {_quote(self._table(fxn) + '_value')} "
+                        f"on {_quote(self._table(fxn))} ({_quote(columns[-1])})"
+                    )
+        return self
+
+    def _table(self, fxn):
+        return Path(self.file_names[fxn]).stem
+
+    def _columns(self, table):
+        return [
+            row[1]
+            for row in self.connection.execute(f"pragma table_info({_quote(table)})")
+        ]
+
+    def _query(self, fxn, values, column):
+        """
+        positions of values found in the given column (0 for key, -1 for value)
+        of the stored mappings and the corresponding mapped values
+        """
+        self.connection.execute(
+            "create temp table if not exists _values (position integer primary key, value text)"
+        )
+        self.connection.execute("delete from _values")
+        self.connection.executemany(
+            "insert into _values values (?, ?)",
+            ((i, value) for i, value in enumerate(values) if pd.notna(value)),
+        )
+        table = self._table(fxn)
+        columns = self._columns(table)
+        if not columns:
+            return []
+        return self.connection.execute(
+            f"select _values.position, {_quote(table)}.{_quote(columns[-1])} "
+            f"from _values join {_quote(table)} "
+            f"on {_quote(table)}.{_quote(columns[column])} = _values.value"
+        ).fetchall()
+
+    def _lookup(self, fxn, keys):
+        values = np.full(len(keys), None, dtype=object)
+        for position, value in self._query(fxn, keys, 0):
+            values[position] = value
+        return values
+
+    def _is_assigned(self, fxn, values):
+        is_assigned = np.zeros(len(values), dtype=bool)
+        for position, _ in self._query(fxn, values, -1):
+            is_assigned[position] = True
+        return is_assigned
+
+    def commit(self):
+        """push the new mappings to the history repos and add them to the store"""
+        try:
+            self._push(self._pop_new_mappings())
+            self.store.update()
+        finally:
+            self.store.close()
+
+    def rollback(self):
+        super().rollback()
+        if self.store:
+            self.store.close()
+
+
+mapping_backends = {"git": GitMappingBackend, "sqlite": SqliteMappingBackend}
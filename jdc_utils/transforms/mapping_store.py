@@ -0,0 +1,176 @@
+"""
+Incrementally updated store of the combined deidentification mappings
+
+The version controlled mapping files (tmp/git/<name>/<name>.csv, see the
+deidentify functions) are only ever appended to, so rather than re-reading
+and merging every file after each deidentification step, the newly appended
+rows of each file are upserted into one table per mapping file in a local
+SQLite database (keyed on the id column(s), ie all but the last column).
+
+The legacy combined mapping csv (all mapping files outer joined on
+their common id column(s)) can be exported from the store on demand.
+"""
+import csv
+import hashlib
+import io
+import json
+import sqlite3
+from functools import reduce
+from pathlib import Path
+
+import pandas as pd
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _update_digest(digest, f, size, blocksize=1 << 20):
+    """updates digest with the next size bytes of an open (binary) file"""
+    while size > 0:
+        block = f.read(min(blocksize, size))
+        if not block:
+            break
+        digest.update(block)
+        size -= len(block)
+    return digest
+
+
+class MappingStore:
+    """
+    Parameters
+    ----------
+    path: str
+        Path to the SQLite database
+    repo_dir: str
+        Directory containing the local clones of the mapping history repos
+    """
+
+    def __init__(self, path="tmp/mappings.sqlite", repo_dir="tmp/git"):
+        self.path = Path(path)
+        self.repo_dir = Path(repo_dir)
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self.connection = sqlite3.connect(self.path)
+        # size (bytes) and sha256 of the part of each mapping file already in the store
+        columns = [row[1] for row in self.connection.execute("pragma table_info(_ingested)")]
+        if columns and "digest" not in columns:
+            # (store without digests so all files are ingested again)
+            self.connection.execute("drop table _ingested")
+        self.connection.execute(
+            "create table if not exists _ingested "
+            "(name text primary key, columns text, size integer, digest text)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    @property
+    def names(self):
+        return [
+            name
+            for (name,) in self.connection.execute(
+                "select name from _ingested order by name"
+            )
+        ]
+
+    def update(self):
+        """upsert rows added to the mapping files since the last update"""
+        files = sorted(self.repo_dir.glob("*/*.csv"))
+        for file in files:
+            self._ingest(file)
+
+        # mapping files no longer there (eg local clones removed)
+        with self.connection:
+            for name in set(self.names).difference(file.stem for file in files):
+                self.connection.execute(f"drop table if exists {_quote(name)}")
+                self.connection.execute("delete from _ingested where name = ?", (name,))
+        return self
+
+    def _ingest(self, file):
+        name = file.stem
+        with open(file, "rb") as f:
+            header = f.readline()
+            columns = next(csv.reader([header.decode()]), None)
+            if not columns:
+                return
+
+            ingested = self.connection.execute(
+                "select columns, size, digest from _ingested where name = ?", (name,)
+            ).fetchone()
+            is_appended = (
+                ingested
+                and json.loads(ingested[0]) == columns
+                and ingested[1] <= file.stat().st_size
+            )
+            if is_appended:
+                # only appended to if the ingested part is unchanged
+                f.seek(0)
+                digest = _update_digest(hashlib.sha256(), f, ingested[1])
+                is_appended = digest.hexdigest() == ingested[2]
+            if not is_appended:
+                digest = hashlib.sha256(header)
+                f.seek(len(header))
+            content = f.read()
+
+        # only complete rows (in case the file is being written to)
+        content = content[: content.rfind(b"\n") + 1]
+        if is_appended and not content:
+            return
+        size = (ingested[1] if is_appended else len(header)) + len(content)
+        digest.update(content)
+
+        with self.connection:
+            if not is_appended:
+                # new file or file was rewritten (eg history rolled back)
+                self._create_table(name, columns)
+
+            quoted = ",".join(_quote(c) for c in columns)
+            rows = csv.reader(io.StringIO(content.decode(), newline=""))
+            self.connection.executemany(
+                f"insert or replace into {_quote(name)} ({quoted}) "
+                f"values ({','.join('?' * len(columns))})",
+                (row for row in rows if row),
+            )
+            self.connection.execute(
+                "insert or replace into _ingested values (?, ?, ?, ?)",
+                (name, json.dumps(columns), size, digest.hexdigest()),
+            )
+
+    def _create_table(self, name, columns):
+        key = ",".join(_quote(c) for c in columns[:-1])
+        self.connection.execute(f"drop table if exists {_quote(name)}")
+        self.connection.execute(
+            f"create table {_quote(name)} "
+            f"({','.join(_quote(c) for c in columns)}, primary key ({key}))"
+        )
+
+    def to_frame(self, name):
+        """mappings of the given mapping file (eg jdc_person_id)"""
+        return pd.read_sql_query(
+            f"select * from {_quote(name)}", self.connection, dtype=str
+        )
+
+    def to_combined_frame(self):
+        """all mappings outer joined on their common id column(s)"""
+        dfs = [self.to_frame(name) for name in self.names]
+        if not dfs:
+            return pd.DataFrame()
+        id_column = list(
+            reduce(
+                lambda columns, df: columns.intersection(df.columns.tolist()),
+                dfs[1:],
+                set(dfs[0].columns.tolist()),
+            )
+        )
+        merge = lambda dfx, dfy: dfx.merge(dfy, on=id_column, how="outer")
+        return reduce(merge, dfs)
+
+    def export_csv(self, mapfilepath):
+        """write the legacy combined mapping csv"""
+        self.to_combined_frame().to_csv(mapfilepath, index=False)
@@ -0,0 +1,236 @@
+"""
+Compiled transform plans for transform (yaml) files (see `run_transformfile`)
+
+A transform file is compiled once into a `TransformPlan`:
+
+- each step name is resolved to a registered jdc_utils transform (see curation.py
+    and deidentify.py) or a native pandas DataFrame method and its parameters are
+    checked against the function's signature before any data is transformed.
+    Other step names (eg methods registered by other packages or accessors) are
+    looked up on the DataFrame when run (as `run_transformfile` always has).
+- adjacent rename/replace steps (see `fusable_steps`) are fused into one step which
+    works out the resulting fillna/replace operations (with consecutive replace
+    mappings composed into one) and renames for each column and then transforms
+    each column once with a single rename at the end rather than one full-frame
+    pass per step.
+
+Compiled plans are cached by the sha256 of the transform file's contents so the
+same plan is reused for every data file transformed with it.
+"""
+import hashlib
+import inspect
+from pathlib import Path
+
+import pandas as pd
+import yaml
+
+from . import curation
+from .curation import _ColumnOps, _is_scalar, _is_value_mapping
+from .deidentify import replace_ids, shift_dates
+
+fusable_steps = [
+    "rename_columns",
+    "replace_column_values",
+    "replace_all_values",
+    "rename_and_change_values",
+]
+# steps returning a new DataFrame rather than transforming inplace
+returning_steps = ["replace_ids", "shift_dates"]
+
+_plans = {}
+
+
+def read_transformfile(transformfile):
+    with open(transformfile) as file:
+        return yaml.safe_load(file)
+
+
+def get_step_function(fxn_name):
+    """
+    registered jdc_utils transform (see pandas_flavor) or
+    native pandas DataFrame method (None if neither -- the step is then
+    looked up on the DataFrame when run as in `run_transformfile`)
+    """
+    if fxn_name in returning_steps:
+        return {"replace_ids": replace_ids, "shift_dates": shift_dates}[fxn_name]
+
+    fxn = vars(curation).get(fxn_name)
+    if inspect.isfunction(fxn) and hasattr(pd.DataFrame, fxn_name):
+        return fxn
+
+    fxn = getattr(pd.DataFrame, fxn_name, None)
+    if inspect.isfunction(fxn) and not fxn_name.startswith("_"):
+        return fxn
+    return None
+
+
+class Step:
+    """
+    a transform step run as listed in the transform file (with fxn of None,
+    the step is looked up on the DataFrame when run -- see `get_step_function`)
+    """
+
+    def __init__(self, fxn_name, params, fxn, name="transform file"):
+        self.fxn_name = fxn_name
+        self.params = params
+        self.fxn = fxn
+        self.name = name
+
+    def run(self, df):
+        if self.fxn is None:
+            fxn = getattr(df, self.fxn_name, None)
+            if not callable(fxn):
+                raise Exception(
+                    f"{self.fxn_name} in {self.name} is not a jdc_utils transform or pandas DataFrame method"
+                )
+            fxn(**self.params)
+        elif self.fxn_name in returning_steps:
+            df = self.fxn(df, **self.params)
+        else:
+            self.fxn(df, **self.params)
+        return df
+
+
+class FusedStep:
+    """
+    adjacent rename/replace steps (see `fusable_steps`) run as one pass
+    over the columns they change. If the steps can't be fused for a given
+    DataFrame (e.g., renames resulting in duplicate column names or values
+    that aren't simple scalars), the steps are run one by one.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+
+    @property
+    def fxn_name(self):
+        return "+".join(step.fxn_name for step in self.steps)
+
+    def resolve(self, columns):
+        """
+        fillna/replace operations for each (original) column and the
+        renames (None if the steps can't be fused -- see `curation._ColumnOps`)
+        """
+        if columns.has_duplicates:
+            return None
+
+        column_ops = _ColumnOps(columns)
+        for step in self.steps:
+            params = step.params
+            if params.get("inplace", True) is False:
+                # returns a new DataFrame which run_transformfile ignores
+                continue
+
+            if step.fxn_name == "rename_columns":
+                if not column_ops.rename(params["from_name_to_name"]):
+                    return None
+            elif step.fxn_name == "replace_column_values":
+                mappings = params["within_column_from_value_to_value"]
+                if not all(_is_value_mapping(m) for m in mappings.values()):
+                    return None
+                for name, mapping in mappings.items():
+                    column_ops.add(name, "replace", mapping)
+            elif step.fxn_name == "replace_all_values":
+                mapping = params["from_value_to_value"]
+                if not _is_value_mapping(mapping):
+                    return None
+                for name in list(column_ops.originals):
+                    column_ops.add(name, "replace", mapping)
+            elif step.fxn_name == "rename_and_change_values":
+                # (the columns are replaced a few at a time as DataFrames which
+                # would read nested mappings as mappings by column)
+                name_and_values = params["name_and_values"].values()
+                if not all(
+                    _is_scalar(new_name_and_values.get("fillna", ""))
+                    and _is_value_mapping(new_name_and_values.get("values", {}))
+                    for new_name_and_values in name_and_values
+                ):
+                    return None
+                if not column_ops.add_name_and_values(params["name_and_values"]):
+                    return None
+
+        return column_ops.ops, column_ops.renames()
+
+    def run(self, df):
+        resolved = self.resolve(df.columns)
+        if resolved is None:
+            for step in self.steps:
+                df = step.run(df)
+            return df
+
+        ops, renames = resolved
+        # columns with the same operations are transformed together
+        groups = {}
+        for original, col_ops in ops.items():
+            groups.setdefault(repr(col_ops), (col_ops, []))[1].append(original)
+
+        for col_ops, columns in groups.values():
+            subdf = df[columns]
+            for op, arg in col_ops:
+                subdf = subdf.fillna(arg) if op == "fillna" else subdf.replace(arg)
+            df[columns] = subdf
+
+        if renames:
+            df.rename(columns=renames, inplace=True)
+        return df
+
+
+class TransformPlan:
+    """
+    compiled transform steps (see module docstring)
+
+    Parameters
+    ----------
+    transform_mappings: dict
+        function name: parameters for each step (as read from a transform file)
+    name: str
+        Name for error messages (eg the transform file path)
+    """
+
+    def __init__(self, transform_mappings, name="transform file"):
+        self.name = name
+        self.steps = []
+        group = []
+        for fxn_name, params in (transform_mappings or {}).items():
+            step = self._compile_step(fxn_name, params)
+            if fxn_name in fusable_steps:
+                group.append(step)
+                continue
+            self._add_group(group)
+            group = []
+            self.steps.append(step)
+        self._add_group(group)
+
+    def _compile_step(self, fxn_name, params):
+        fxn = get_step_function(fxn_name)
+        params = params if params is not None else {}
+        if not isinstance(params, dict):
+            raise Exception(
+                f"Parameters of {fxn_name} in {self.name} need to be a mapping of name: value"
+            )
+        if fxn:
+            try:
+                inspect.signature(fxn).bind(None, **params)
+            except TypeError as e:
+                raise Exception(f"Invalid parameters for {fxn_name} in {self.name}: {e}")
+        return Step(fxn_name, params, fxn, self.name)
+
+    def _add_group(self, group):
+        if len(group) > 1:
+            self.steps.append(FusedStep(group))
+        else:
+            self.steps.extend(group)
+
+    def run(self, df):
+        for step in self.steps:
+            df = step.run(df)
+        return df
+
+
+def compile_transformfile(transformfile):
+    """compiled plan of a transform file (cached by the file's sha256)"""
+    content = Path(transformfile).read_bytes()
+    digest = hashlib.sha256(content).hexdigest()
+    if digest not in _plans:
+        _plans[digest] = TransformPlan(yaml.safe_load(content), name=str(transformfile))
+    return _plans[digest]
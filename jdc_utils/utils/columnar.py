@@ -0,0 +1,200 @@
+"""
+Parquet (.parquet) and Arrow IPC (.arrow) copies of package resources
+
+A copy holds the columns of a resource typed by its frictionless schema (see
+`typed_table`) with the schema in the file metadata (see `read_columnar_schema`),
+so analysts get integers, numbers, booleans and dates rather than the csv
+strings. Only the columns read are loaded and the files are memory mapped
+(Arrow IPC files are written uncompressed so their columns are read without a copy).
+
+Copies aren't resources of their own in data-package.json (frictionless can't
+read or validate them) but are listed on their csv resource (see `descriptor_key`)
+and read by `packaging.read_package(typed=True)`.
+
+NOTE: pyarrow is an optional dependency (`pip install pyarrow`)
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from frictionless import Schema
+
+# format -> file suffix
+formats = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# property of a csv resource (in data-package.json) with the path of its copy
+# by format, eg {"parquet": "data/baseline.parquet"}
+descriptor_key = "columnarCopies"
+
+# file metadata key of the frictionless schema
+schema_key = b"frictionless_schema"
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError as e:
+        raise Exception(
+            "pyarrow package failed to import. Try installing with `pip install pyarrow`"
+        ) from e
+    return pyarrow
+
+
+def has_pyarrow():
+    try:
+        import_pyarrow()
+    except Exception:
+        return False
+    return True
+
+
+def is_columnar_file(path):
+    return Path(path).suffix.lower() in formats.values()
+
+
+def _is_parquet(path):
+    return Path(path).suffix.lower() == formats["parquet"]
+
+
+def _arrow_type(pa, field_type):
+    """arrow type of a frictionless field type (None if kept as strings)"""
+    return {
+        "integer": pa.int64(),
+        "year": pa.int64(),
+        "number": pa.float64(),
+        "boolean": pa.bool_(),
+        "date": pa.date32(),
+        "datetime": pa.timestamp("us"),
+    }.get(field_type)
+
+
+def _typed_array(pa, cells, field):
+    """
+    arrow array of a column of csv cells read as the field's type (with missing
+    values as nulls) or as strings if the field's type has no arrow type or any
+    (non-missing) cell isn't of the type (eg invalid values reported by validation)
+    """
+    codes, uniques = pd.factorize(np.asarray(cells, dtype=object))
+    # (missing cells, with a code of -1, take the null appended to the values)
+    indices = pa.array(np.where(codes == -1, len(uniques), codes))
+    if field is None:
+        return pa.array(list(uniques) + [None], type=pa.string()).take(indices)
+
+    missing_values = set(field.missing_values)
+    arrow_type = _arrow_type(pa, field.type)
+    values = []
+    for value in uniques:
+        if value in missing_values:
+            values.append(None)
+        elif arrow_type is None:
+            values.append(str(value))
+        else:
+            typed = field.read_cell(value)[0]
+            if typed is None:
+                return _typed_array(pa, cells, None)
+            values.append(float(typed) if field.type == "number" else typed)
+    return pa.array(values + [None], type=arrow_type or pa.string()).take(indices)
+
+
+def typed_table(labels, columns, schema):
+    """
+    arrow table of columns of csv cells (eg `packaging.csv_columns`) with the labels
+    as names, each read as the type of its field in the frictionless schema (a dict)
+    and the schema in the file metadata
+    """
+    pa = import_pyarrow()
+    fields = {field.name: field for field in Schema(schema).fields}
+    return pa.Table.from_arrays(
+        [_typed_array(pa, column, fields.get(label)) for label, column in zip(labels, columns)],
+        names=[str(label) for label in labels],
+        metadata={schema_key: json.dumps(schema).encode("utf-8")},
+    )
+
+
+def write_columnar_file(labels, columns, schema, path):
+    """writes columns of csv cells typed by the frictionless schema (see `typed_table`)"""
+    pa = import_pyarrow()
+    table = typed_table(labels, columns, schema)
+    if _is_parquet(path):
+        pa.parquet.write_table(table, str(path))
+    else:
+        pa.feather.write_feather(table, str(path), compression="uncompressed")
+
+
+def _read_schema(path):
+    """arrow schema (column names and metadata) of a file without reading its data"""
+    pa = import_pyarrow()
+    if _is_parquet(path):
+        return pa.parquet.read_schema(str(path), memory_map=True)
+    with pa.memory_map(str(path)) as source:
+        return pa.ipc.open_file(source).schema
+
+
+def read_columnar_schema(path):
+    """the frictionless schema (a dict) of a file (None if it has none)"""
+    schema = (_read_schema(path).metadata or {}).get(schema_key)
+    return json.loads(schema) if schema else None
+
+
+def table_to_frame(table, categorical_columns=None):
+    """
+    typed DataFrame of an arrow table (see `typed_table`) with nullable integer and
+    boolean columns, dates as datetime64 and string columns in categorical_columns
+    as pandas Categoricals (with sorted categories)
+    """
+    pa = import_pyarrow()
+    categorical = []
+    for index, name in enumerate(table.column_names):
+        column = table.column(index)
+        if name in (categorical_columns or []):
+            if pa.types.is_string(column.type):
+                table = table.set_column(index, name, column.dictionary_encode())
+                categorical.append(name)
+            elif pa.types.is_dictionary(column.type):
+                categorical.append(name)
+    types = {pa.int64(): pd.Int64Dtype(), pa.bool_(): pd.BooleanDtype()}
+    df = table.to_pandas(date_as_object=False, types_mapper=types.get)
+    for name in categorical:
+        df[name] = df[name].cat.reorder_categories(sorted(df[name].cat.categories))
+    return df
+
+
+def typed_frame(df, schema, categorical_columns=None):
+    """
+    a DataFrame of csv cells (eg read by `packaging.resource_to_frame`) typed
+    by the frictionless schema as read from a copy (see `read_columnar_file`)
+    """
+    columns = [df.iloc[:, index].astype(object).to_numpy() for index in range(df.shape[1])]
+    return table_to_frame(typed_table(list(df.columns), columns, schema), categorical_columns)
+
+
+def read_columnar_file(path, columns=None, categorical_columns=None):
+    """
+    reads a file into a typed DataFrame (see `table_to_frame`): string columns in
+    categorical_columns are read into pandas Categoricals and, if columns is given,
+    only the columns with a name in columns are read (all columns if none are in
+    the file)
+    """
+    pa = import_pyarrow()
+    arrow_schema = _read_schema(path)
+    names = arrow_schema.names
+    selected = [name for name in names if name in (columns or [])]
+    if not selected or len(selected) == len(names):
+        selected = None
+    categorical = [
+        name
+        for name in names
+        if name in (categorical_columns or [])
+        and pa.types.is_string(arrow_schema.field(name).type)
+    ]
+    if _is_parquet(path):
+        # (the dictionary pages of categorical columns are read as is)
+        table = pa.parquet.read_table(
+            str(path), columns=selected, memory_map=True, read_dictionary=categorical
+        )
+    else:
+        table = pa.feather.read_table(str(path), columns=selected, memory_map=True)
+    return table_to_frame(table, categorical)
@@ -1,8 +1,28 @@
+import csv
+import datetime
+import itertools
+import operator
 import os
 import shutil
 from pathlib import Path
 from zipfile import ZipFile
 
+import numpy as np
+import pandas as pd
+from frictionless import Package, Resource
+from jdc_utils import register_plugins
+
+from .columnar import descriptor_key as columnar_key
+from .columnar import formats as columnar_formats
+from .columnar import (
+    import_pyarrow,
+    is_columnar_file,
+    read_columnar_file,
+    typed_frame,
+    write_columnar_file,
+)
+from .statfiles import is_stat_file, read_stat_file
+
 
 # general utilities
 def copy_file(file_path, target_path):
@@ -34,17 +54,14 @@ def _write_to_zip(input_path, zip_object):
 
 
 # packaging
-def read_package(filepath):
+def _open_package(filepath):
     """
-    reads in file path which can either be a directory containing
-    a data package descriptor or resources (ie data files). This can
-    also include glob regular expressions (compatible with frictionless Package)
-    and converts all resource data to pandas dataframes
+    changes to the directory of filepath and opens its data package
+    (without reading in any data). Callers need to change back to the
+    original directory.
     """
-
     # NOTE for code below: frictionless security doesn't play well with particular paths
     # see: https://specs.frictionlessdata.io/data-resource/#data-location
-    pwd = os.getcwd()
     filename = Path(filepath).name
     os.chdir(Path(filepath).parent)
     if Path(filename).is_dir():
@@ -57,16 +74,280 @@ def read_package(filepath):
             package = Package("*")
     else:
         package = Package(filename)
+    return package
+
+
+def read_resource_paths(filepath):
+    """
+    reads in the same data package as `read_package` but only returns the
+    absolute path of each resource (by resource name) without reading in
+    any data (e.g., to read large files in chunks)
+    """
+    register_plugins()
+    pwd = os.getcwd()
+    try:
+        package = _open_package(filepath)
+        return {
+            resource.name: resource.fullpath
+            if resource.remote
+            else str(Path(resource.fullpath).resolve())
+            for resource in package.resources
+        }
+    finally:
+        os.chdir(pwd)
+
+
+# frictionless csv dialect properties -> pandas read_csv arguments
+# (the C parser accepts any line terminator)
+csv_dialect_options = {
+    "delimiter": "sep",
+    "quote_char": "quotechar",
+    "double_quote": "doublequote",
+    "escape_char": "escapechar",
+    "skip_initial_space": "skipinitialspace",
+}
+
+
+def _projection(labels, columns=None):
+    """
+    positions of the header labels in columns (None if all columns are
+    read, ie without columns or if none of the labels are in columns)
+    """
+    if columns is None:
+        return None
+    positions = [i for i, label in enumerate(labels) if label in columns]
+    if not positions or len(positions) == len(labels):
+        return None
+    return positions
+
+
+def _read_csv_frame(resource, categorical_columns=None, columns=None):
+    """
+    reads a local csv resource with the pandas C parser into the same
+    DataFrame as `resource.to_petl().todf()` (all values as strings with
+    the frictionless header labels as column names). Columns in
+    categorical_columns are read into pandas Categoricals and, if columns
+    is given, only the columns in columns are read (see `resource_to_frame`).
+
+    Returns None if the resource needs frictionless to be read (eg remote,
+    compressed or zipped files, a layout or dialect without a pandas
+    equivalent, a header spanning several lines or rows with more cells
+    than the header).
+
+    NOTE: missing cells of blank or short rows (invalid rows in frictionless
+    validation) are read as empty strings rather than None and rows with
+    more cells than the header are only caught when all columns are read
+    """
+    with resource:
+        dialect = resource.dialect
+        if (
+            resource.format != "csv"
+            or resource.scheme != "file"
+            or resource.compression
+            or resource.innerpath
+            or resource.layout
+            or dialect.comment_char is not None
+            or dialect.null_sequence is not None
+        ):
+            return None
+        labels = list(resource.header.labels)
+        if any("\n" in label or "\r" in label for label in labels):
+            return None  # (the header row is skipped as a single line)
+        options = {
+            option: getattr(dialect, name)
+            for name, option in csv_dialect_options.items()
+        }
+        encoding = resource.encoding
+        path = resource.fullpath
+
+    # positional names (frictionless labels can be empty or duplicated) plus,
+    # when reading all columns, one extra column to catch rows with more
+    # cells than the header (pandas can't select columns of a file with
+    # fewer cells than names)
+    usecols = _projection(labels, columns)
+    names = list(range(len(labels) if usecols else len(labels) + 1))
+    categorical = {
+        i for i, label in enumerate(labels) if label in (categorical_columns or [])
+    }
+    dtype = {i: "category" if i in categorical else str for i in usecols or names}
+    try:
+        df = pd.read_csv(
+            path,
+            header=None,
+            skiprows=1,
+            names=names,
+            usecols=usecols,
+            index_col=False,
+            dtype=dtype,
+            keep_default_na=False,
+            na_filter=False,
+            skip_blank_lines=False,
+            encoding=encoding,
+            **options,
+        )
+    except pd.errors.ParserError:
+        return None  # (eg a single row with fewer cells than names)
+    if not usecols and (df.pop(len(labels)) != "").any():
+        return None
+    df.columns = [labels[i] for i in df.columns]
+    return df
+
+
+def resource_to_frame(
+    resource, categorical_columns=None, chunksize=10000, columns=None, max_workers=None
+):
+    """
+    reads a frictionless resource into a pandas DataFrame (as with
+    `resource.to_petl().todf()`). Columns in categorical_columns are read
+    into pandas Categoricals (factorized every chunksize rows) so the full
+    column of repeated values is never held in memory.
+
+    If columns is given, only the columns (in file order) with a name in
+    columns are read (eg the columns of a wide source file referenced by a
+    schema). If none of the columns are in the resource, all columns are read.
+
+    Local csv files are read with the pandas C parser (see `_read_csv_frame`),
+    local SPSS/Stata files in chunks (with value labels applied -- see
+    `read_stat_file`, optionally across max_workers processes), local
+    Parquet/Arrow files with pyarrow (typed by their schema -- see
+    `read_columnar_file`) and any other resource with frictionless (petl).
+    """
+    if not resource.memory and not resource.remote:
+        if is_stat_file(resource.fullpath):
+            return read_stat_file(
+                resource.fullpath,
+                columns=columns,
+                categorical_columns=categorical_columns,
+                max_workers=max_workers,
+            )
+        if is_columnar_file(resource.fullpath):
+            return read_columnar_file(
+                resource.fullpath, columns=columns, categorical_columns=categorical_columns
+            )
+        df = _read_csv_frame(resource, categorical_columns, columns)
+        if df is not None:
+            return df
+
+    table = resource.to_petl()
+    positions = _projection(table.header(), columns)
+    if positions:
+        table = table.cut(*positions)
+    if not categorical_columns:
+        return table.todf()
+
+    rows = iter(table)
+    header = list(next(rows, []))
+    positions = [i for i, name in enumerate(header) if name in categorical_columns]
+    other_positions = [i for i in range(len(header)) if i not in positions]
+    get_other = operator.itemgetter(*other_positions) if other_positions else None
+
+    codes = {i: [] for i in positions}
+    categories = {i: {} for i in positions}  # value -> code
+    other_rows = []
+    while True:
+        chunk = list(itertools.islice(rows, chunksize))
+        if not chunk:
+            break
+        values = np.array([list(row) for row in chunk], dtype=object)
+        for i in positions:
+            chunk_codes, uniques = pd.factorize(values[:, i])
+            # (missing values have a code of -1 so take the -1 appended to the end)
+            to_codes = np.array(
+                [categories[i].setdefault(value, len(categories[i])) for value in uniques]
+                + [-1],
+                dtype=np.int64,
+            )
+            codes[i].append(to_codes.take(chunk_codes))
+        if get_other and len(other_positions) == 1:
+            other_rows.extend((get_other(row),) for row in chunk)
+        elif get_other:
+            other_rows.extend(map(get_other, chunk))
+
+    # the other columns are converted from the rows as with petl's todf
+    other = pd.DataFrame.from_records(
+        other_rows, columns=[header[i] for i in other_positions]
+    )
+    columns = [other.iloc[:, j] for j in range(len(other_positions))]
+    for i in positions:
+        column = pd.Categorical.from_codes(
+            np.concatenate(codes[i]) if codes[i] else np.array([], dtype=np.int64),
+            categories=pd.Index(list(categories[i]), dtype=object),
+        )
+        columns.insert(i, pd.Series(column, name=header[i]))
+    return pd.concat(columns, axis=1) if columns else other
+
+
+def _columnar_copies(package):
+    """
+    resource name -> path of its Parquet/Arrow copy in a package (see `read_package`
+    -- the first format in `columnar.formats` with a copy whose file exists)
+    """
+    copies = {}
+    for resource in package.resources:
+        paths = resource.get(columnar_key) or {}
+        for columnar_format in columnar_formats:
+            path = paths.get(columnar_format)
+            if path is None:
+                continue
+            path = Path(resource.basepath or ".") / path
+            if is_columnar_file(path) and path.is_file():
+                copies[resource.name] = str(path)
+                break
+    return copies
+
+
+def read_package(
+    filepath, categorical_columns=None, columns=None, max_workers=None, typed=False
+):
+    """
+    reads in file path which can either be a directory containing
+    a data package descriptor or resources (ie data files). This can
+    also include glob regular expressions (compatible with frictionless Package)
+    and converts all resource data to pandas dataframes
+
+    categorical_columns: resource name -> columns to read in as pandas
+    Categoricals (see `resource_to_frame`)
+    columns: resource name -> columns to read (see `resource_to_frame`
+    -- all columns of resources not in columns are read)
+    max_workers: processes reading each SPSS/Stata file (see `read_stat_file`)
+    typed: if True, columns are read as the types in each resource's schema
+    (eg nullable integers and datetimes with missing values as NA) rather than
+    as strings. Resources with a Parquet/Arrow copy (see `CoreMeasures(columnar_format=...)`)
+    are read from the copy and any others are typed after reading (needs pyarrow
+    -- see `columnar`).
+    """
+
+    # SPSS/Stata frictionless plugins in case package contains .sav/.dta files
+    register_plugins()
+    if typed:
+        import_pyarrow()
+
+    pwd = os.getcwd()
+    package = _open_package(filepath)
 
     print(os.getcwd())
 
+    copies = _columnar_copies(package) if typed else {}
+
     # has data package
     # has a baseline and timepoints resource
     package_pandas = Package()
     for resource in package.resources:
         try:
             name = resource.name
-            data = resource.to_petl().todf()
+            resource_categorical = (categorical_columns or {}).get(name)
+            resource_columns = (columns or {}).get(name)
+            if name in copies:
+                data = read_columnar_file(copies[name], resource_columns, resource_categorical)
+            else:
+                data = resource_to_frame(
+                    resource,
+                    None if typed else resource_categorical,
+                    columns=resource_columns,
+                    max_workers=max_workers,
+                )
+                if typed:
+                    data = typed_frame(data, resource.schema.to_dict(), resource_categorical)
             resource_pandas = Resource(data, name=name)
             package_pandas.add_resource(resource_pandas)
         except:
@@ -79,6 +360,119 @@ def read_package(filepath):
     return package_pandas
 
 
+# frictionless field type -> strftime format of its default format
+default_formats = {"date": "%Y-%m-%d", "datetime": "%Y-%m-%dT%H:%M:%S", "time": "%H:%M:%S"}
+
+
+def _strftime_format(field):
+    """strftime format of a date, datetime or time field (None for any other field)"""
+    if field.get("type") not in default_formats:
+        return None
+    field_format = field.get("format", "default")
+    return field_format if field_format.startswith("%") else default_formats[field["type"]]
+
+
+_str_types = (str, bool, int, float, np.bool_, np.integer, np.floating)
+
+
+def _csv_cells(values, field=None):
+    """
+    csv cells (an object ndarray of strings) of a column of values formatted by
+    the type of its field (a dict): dates and times of date, datetime and time
+    fields in the field's format and integer valued floats of integer and year
+    fields as integers. Missing values are written as "" and all other values as str.
+    """
+    field = field or {}
+    missing = values.isna().to_numpy()
+    date_format = _strftime_format(field)
+    if date_format and values.dtype.kind == "M":
+        cells = values.dt.strftime(date_format).to_numpy(dtype=object)
+    elif field.get("type") in ["integer", "year"] and values.dtype.kind == "f":
+        numbers = values.to_numpy()
+        cells = values.astype(str).to_numpy(dtype=object)
+        integral = ~missing & (numbers % 1 == 0)
+        cells[integral] = numbers[integral].astype(np.int64).astype(str)
+    else:
+        if values.dtype.kind in "mM":
+            # (as Timestamps and Timedeltas)
+            values = values.astype(object)
+        if date_format and values.dtype == object:
+            values = values.map(
+                lambda value: value.strftime(date_format)
+                if isinstance(value, (datetime.date, datetime.time))
+                else value,
+                na_action="ignore",
+            )
+        if values.dtype != object or all(issubclass(kind, _str_types) for kind in set(map(type, values))):
+            cells = values.astype(str).to_numpy(dtype=object)
+        else:
+            # (astype(str) formats some values, eg Timedeltas, other than str)
+            cells = np.array(list(map(str, values)) + [None], dtype=object)[:-1]
+    cells[missing] = ""
+    return cells
+
+
+def _csv_chunks(df, schema=None, chunksize=100_000):
+    """columns (object ndarrays) of the csv cells of each chunk of rows (see `csv_rows`)"""
+    fields = {field["name"]: field for field in (schema or {}).get("fields", [])}
+    columns = [fields.get(label) for label in df.columns]
+    for start in range(0, len(df), chunksize):
+        chunk = df.iloc[start : start + chunksize]
+        yield [_csv_cells(chunk.iloc[:, index], field) for index, field in enumerate(columns)]
+
+
+def _with_index(df):
+    """df with its named index levels as its first columns (as read as primary key fields)"""
+    if all(name is None for name in df.index.names):
+        return df
+    return df.reset_index()
+
+
+def csv_rows(df, schema=None, chunksize=100_000):
+    """
+    header and rows of a DataFrame as lists of csv cells (strings), with each
+    column formatted by the type of its field in the frictionless schema (a dict
+    -- see `_csv_cells`)
+
+    The rows are serialized a column at a time from chunks of rows rather than
+    row by row in python.
+    """
+    df = _with_index(df)
+    yield list(df.columns)
+    for columns in _csv_chunks(df, schema, chunksize):
+        yield from zip(*columns)
+
+
+def csv_columns(df, schema=None, chunksize=100_000):
+    """header and columns (object ndarrays) of the csv cells of a DataFrame (see `csv_rows`)"""
+    df = _with_index(df)
+    chunks = list(_csv_chunks(df, schema, chunksize))
+    columns = [
+        np.concatenate([chunk[index] for chunk in chunks]) if chunks else np.array([], dtype=object)
+        for index in range(len(df.columns))
+    ]
+    return list(df.columns), columns
+
+
+def write_csv_frame(df, path, schema=None):
+    """
+    writes a DataFrame to a utf-8 csv file with each column formatted by the
+    type of its field in the frictionless schema (see `csv_rows`)
+    """
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        csv.writer(file).writerows(csv_rows(df, schema))
+
+
+def write_columnar_frame(df, schema, path):
+    """
+    writes the csv cells of a DataFrame (see `csv_columns`) typed by its
+    frictionless schema (with the schema) to a Parquet (.parquet) or Arrow
+    IPC (.arrow) file (see `columnar`)
+    """
+    labels, columns = csv_columns(df, schema)
+    write_columnar_file(labels, columns, schema, path)
+
+
 def zip_package(pkg_path, zip_path):
     """
     takes a valid package and outputs
@@ -0,0 +1,154 @@
+"""
+Reading SPSS (.sav/.zsav) and Stata (.dta) files in chunks
+
+The file metadata (column names, number of rows and value labels) is read
+once and the data is read in row ranges of chunksize rows (optionally across
+a process pool) with the value labels applied to each chunk, so only one
+chunk of raw values per process is held in memory at a time and columns read
+as pandas Categoricals are never held as columns of repeated labels.
+
+NOTE: pyreadstat is only imported when a file is read (`pip install pyreadstat`)
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+# file suffix -> pyreadstat reader
+readers = {
+    ".sav": "read_sav",
+    ".zsav": "read_sav",
+    ".dta": "read_dta",
+}
+
+
+def import_pyreadstat():
+    try:
+        import pyreadstat
+    except ImportError as e:
+        raise Exception(
+            "pyreadstat package failed to import. Try installing with `pip install pyreadstat`"
+        ) from e
+    return pyreadstat
+
+
+def _reader(path):
+    """pyreadstat reader of a file (by its suffix)"""
+    return getattr(import_pyreadstat(), readers[Path(path).suffix.lower()])
+
+
+def is_stat_file(path):
+    return Path(path).suffix.lower() in readers
+
+
+def _apply_value_labels(df, value_labels, categorical_columns=()):
+    """
+    replaces values with their value labels (values without a label are kept
+    as with pyreadstat's apply_value_formats) and converts columns in
+    categorical_columns to pandas Categoricals
+    """
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if column in value_labels:
+            labeled = values.map(value_labels[column])
+            values = labeled.where(labeled.notna(), values)
+        if column in categorical_columns:
+            values = values.astype("category")
+        columns[column] = values
+    return pd.DataFrame(columns, index=df.index)
+
+
+def _read_rows(path, row_offset, row_limit, usecols, value_labels, categorical_columns):
+    """reads row_limit rows after row_offset (see `read_stat_file`)"""
+    read = _reader(path)
+    df, _ = read(
+        path,
+        row_offset=row_offset,
+        row_limit=row_limit,
+        usecols=usecols,
+        dates_as_pandas_datetime=True,
+    )
+    return _apply_value_labels(df, value_labels, categorical_columns)
+
+
+def _concat(chunks, categorical_columns):
+    """
+    concatenates the chunks (with the categories of each categorical column
+    unioned so the column isn't converted to object)
+    """
+    chunks = list(chunks)
+    for column in categorical_columns:
+        categories = pd.Index([])
+        for chunk in chunks:
+            categories = categories.append(
+                chunk[column].cat.categories.difference(categories, sort=False)
+            )
+        for chunk in chunks:
+            chunk[column] = chunk[column].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def read_stat_file(
+    path, columns=None, categorical_columns=None, chunksize=100000, max_workers=None
+):
+    """
+    reads an SPSS or Stata file into a DataFrame with value labels applied
+
+    Parameters
+    ----------
+    path: str
+        Path to a .sav, .zsav or .dta file
+    columns: Optional[set]
+        Only the columns (in file order) in columns are read (if none of the
+        columns are in the file, all columns are read)
+    categorical_columns: Optional[set]
+        Columns read into pandas Categoricals
+    chunksize: int
+        Number of rows read at a time
+    max_workers: Optional[int]
+        If more than 1, chunks are read in a process pool of max_workers processes
+    """
+    path = str(path)
+    read = _reader(path)
+    _, meta = read(path, metadataonly=True)
+
+    usecols = None
+    if columns is not None:
+        usecols = [name for name in meta.column_names if name in columns] or None
+    names = usecols or meta.column_names
+    value_labels = {
+        name: meta.value_labels[label_name]
+        for name, label_name in meta.variable_to_label.items()
+        if name in names and label_name in meta.value_labels
+    }
+    categorical_columns = [name for name in names if name in (categorical_columns or [])]
+    params = (usecols, value_labels, categorical_columns)
+
+    number_rows = meta.number_rows
+    if number_rows is None or number_rows < 0:  # (not stored in some files)
+        chunks = []
+        while not chunks or len(chunks[-1]) == chunksize:
+            chunks.append(_read_rows(path, len(chunks) * chunksize, chunksize, *params))
+    elif max_workers and max_workers > 1:
+        offsets = range(0, number_rows, chunksize)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            chunks = list(
+                executor.map(
+                    _read_rows,
+                    *zip(*[(path, offset, chunksize, *params) for offset in offsets]),
+                )
+            )
+    else:
+        chunks = [
+            _read_rows(path, offset, chunksize, *params)
+            for offset in range(0, number_rows, chunksize)
+        ]
+
+    if not chunks:  # (no rows)
+        return _apply_value_labels(
+            read(path, usecols=usecols, metadataonly=True)[0],
+            value_labels,
+            categorical_columns,
+        )
+    return _concat(chunks, categorical_columns)
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+from jdc_utils.core_measures import cache
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def requests_log(tmp_path, monkeypatch):
+    monkeypatch.setenv("JDC_UTILS_CACHE_DIR", str(tmp_path))
+    monkeypatch.delenv("JDC_UTILS_OFFLINE", raising=False)
+    log = []
+
+    def get(url, headers=None, timeout=None):
+        log.append((url, headers))
+        if headers.get("If-None-Match") == '"v1"':
+            return FakeResponse(304)
+        return FakeResponse(200, json.dumps({"fields": []}).encode(), {"ETag": '"v1"'})
+
+    monkeypatch.setattr(cache.requests, "get", get)
+    return log
+
+
+def test_fetch_serves_from_cache(requests_log):
+    path = "schemas/table-schema-baseline.json"
+    assert cache.load_json(path, ref="main") == {"fields": []}
+    assert cache.load_json(path, ref="main") == {"fields": []}
+    assert len(requests_log) == 1
+
+    # refs are cached separately
+    cache.load_json(path, ref="abc1234")
+    assert requests_log[-1][0].endswith("/abc1234/" + path)
+
+
+def test_fetch_revalidates_when_asked(requests_log):
+    path = "encodings/encodings.yaml"
+    cache.fetch(path, ref="main")
+    assert cache.fetch(path, ref="main", revalidate=True) == b'{"fields": []}'
+    assert requests_log[-1][1] == {"If-None-Match": '"v1"'}
+
+
+def test_fetch_offline(requests_log, monkeypatch):
+    path = "schemas/table-schema-baseline.json"
+    cache.fetch(path, ref="main")
+    monkeypatch.setenv("JDC_UTILS_OFFLINE", "1")
+    cache.fetch(path, ref="main", revalidate=True)
+    assert len(requests_log) == 1
+    with pytest.raises(FileNotFoundError):
+        cache.fetch("schemas/table-schema-time-points.json", ref="main")
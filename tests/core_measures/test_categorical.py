@@ -0,0 +1,51 @@
+import pandas as pd
+from frictionless import Resource
+from jdc_utils.core_measures.core_measures import _categorical_columns, _to_categorical
+from jdc_utils.core_measures.schema_index import SchemaIndex
+from jdc_utils.utils.packaging import resource_to_frame
+
+descriptor = {
+    "fields": [
+        {"name": "jdc_person_id", "type": "string"},
+        {
+            "name": "visit_type",
+            "type": "string",
+            "constraints": {"enum": ["Baseline", "Follow-up"]},
+            "custom": {"jcoin:original_name": "vtype"},
+        },
+    ],
+    "missingValues": ["", "Refused"],
+}
+
+
+def test_to_categorical():
+    schema_index = SchemaIndex.from_schema(descriptor)
+    assert _categorical_columns(schema_index) == {"visit_type", "vtype"}
+
+    df = pd.DataFrame(
+        {"jdc_person_id": ["a", "b", "c"], "visit_type": ["Follow-up", None, "bogus"]}
+    )
+    newdf = _to_categorical(df, schema_index)
+    assert newdf["jdc_person_id"].dtype == object
+    assert newdf["visit_type"].cat.categories.tolist() == [
+        "Baseline",
+        "Follow-up",
+        "Refused",
+        "Missing",
+        "bogus",
+    ]
+    newdf.fillna("Missing", inplace=True)
+    assert newdf["visit_type"].tolist() == ["Follow-up", "Missing", "bogus"]
+
+
+def test_resource_to_frame(tmp_path):
+    path = tmp_path / "baseline.csv"
+    pd.DataFrame(
+        {"id": range(25), "vtype": ["Baseline", "Follow-up", ""] * 8 + ["x"]}
+    ).to_csv(path, index=False)
+
+    expected = Resource(path=str(path)).to_petl().todf()
+    df = resource_to_frame(Resource(path=str(path)), {"vtype"}, chunksize=10)
+    assert df.columns.tolist() == ["id", "vtype"]
+    assert df["vtype"].dtype == "category"
+    pd.testing.assert_frame_equal(df.astype({"vtype": object}), expected)
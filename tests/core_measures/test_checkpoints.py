@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+from jdc_utils.core_measures.checkpoints import Checkpoints, digest, frame_digest
+from jdc_utils.utils.columnar import has_pyarrow
+
+
+def _df():
+    return pd.DataFrame(
+        {
+            "jdc_person_id": ["1", "2"],
+            "visit_type": pd.Categorical(["Baseline", "Missing"]),
+            "age": pd.array([30, None], dtype="Int64"),
+        }
+    )
+
+
+pytestmark = pytest.mark.skipif(not has_pyarrow(), reason="needs pyarrow")
+
+
+def test_digests():
+    assert digest("csv", {"a": 1, "b": 2}) == digest("csv", {"b": 2, "a": 1})
+    assert digest("csv", {"a": 1}) != digest("export", {"a": 1})
+
+    df = _df()
+    assert frame_digest(df) == frame_digest(_df())
+    assert frame_digest(df) != frame_digest(df.astype({"age": "float"}))
+    assert frame_digest(df) != frame_digest(df.rename(columns={"age": "age2"}))
+    df.loc[0, "jdc_person_id"] = "3"
+    assert frame_digest(df) != frame_digest(_df())
+
+
+def test_checkpoints(tmp_path):
+    checkpoints = Checkpoints(tmp_path / "checkpoints")
+    output = tmp_path / "baseline.csv"
+    output.write_text("a\n1\n")
+
+    assert checkpoints.load("deidentify", "key") is None
+    checkpoints.save("deidentify", "key", frames={"baseline": _df()}, files=[output])
+
+    record = checkpoints.load("deidentify", "key")
+    frames = checkpoints.load_frames("deidentify", record)
+    pd.testing.assert_frame_equal(frames["baseline"], _df())
+
+    # a new key, a changed output file or not resuming reruns the stage
+    assert checkpoints.load("deidentify", "key2") is None
+    assert Checkpoints(tmp_path / "checkpoints", resume=False).load("deidentify", "key") is None
+    output.write_text("a\n2\n")
+    assert checkpoints.load("deidentify", "key") is None
+    output.unlink()
+    assert checkpoints.load("deidentify", "key") is None
+
+    # other stages are checkpointed separately
+    checkpoints.save("csv", "key")
+    assert checkpoints.load("csv", "key") == {"key": "key", "frames": {}, "files": {}}
+
+
+def test_checkpoints_rerun_unstored_frames(tmp_path):
+    checkpoints = Checkpoints(tmp_path / "checkpoints")
+
+    # (an object column of numbers and strings can't be stored as Parquet)
+    mixed = _df().assign(age=pd.Series([30.0, "Missing"], dtype=object))
+    checkpoints.save("deidentify", "key", frames={"baseline": mixed})
+    assert checkpoints.load("deidentify", "key") is None
+
+    # a frame that doesn't read back as saved isn't loaded
+    checkpoints.save("deidentify", "key", frames={"baseline": _df()})
+    _df().astype({"age": "float"}).to_parquet(tmp_path / "checkpoints/deidentify/baseline.parquet")
+    record = checkpoints.load("deidentify", "key")
+    assert checkpoints.load_frames("deidentify", record) is None
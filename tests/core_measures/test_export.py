@@ -0,0 +1,132 @@
+import pickle
+
+import pandas as pd
+import pyreadstat
+import pytest
+from frictionless import Resource
+from jdc_utils import register_plugins
+from jdc_utils.core_measures.export import (
+    code_table,
+    encode_frame,
+    export_schema,
+    export_tasks,
+    run_in_turn,
+    write_exports,
+)
+
+encodings = {"visit_type": {1: "Baseline", 2: "Follow-up"}}
+reserve = {"spss": {-99: "Missing", -98: "Refused"}, "stata": {".a": "Missing", ".b": "Refused"}}
+schema = {
+    "fields": [
+        {"name": "jdc_person_id", "type": "string"},
+        {
+            "name": "visit_type",
+            "type": "string",
+            "constraints": {"enum": ["Baseline", "Follow-up"]},
+        },
+        {"name": "age", "type": "integer"},
+    ],
+    "missingValues": ["", "Missing", "Refused"],
+}
+
+
+def _df():
+    return pd.DataFrame(
+        {
+            "jdc_person_id": ["1", "2", "3", "4"],
+            "visit_type": pd.Categorical(["Baseline", "Missing", "Follow-up", None]),
+            "age": ["30", "Missing", "41", "Refused"],
+        }
+    )
+
+
+def test_encode_frame():
+    df = _df()
+    table = code_table(df, schema)
+    assert list(table) == ["jdc_person_id", "visit_type", "age"]
+
+    spss = encode_frame(df, table, schema, encodings, reserve["spss"])
+    stata = encode_frame(df, table, schema, encodings, reserve["stata"])
+    assert spss["visit_type"].tolist() == [1, -99, 2, None]
+    assert stata["visit_type"].tolist() == [1, ".a", 2, None]
+    assert spss["age"].tolist() == [30, -99, 41, -98]
+    assert stata["age"].tolist() == [30, ".a", 41, ".b"]
+    assert spss["jdc_person_id"].tolist() == df["jdc_person_id"].tolist()
+
+    fields = export_schema(schema, encodings, reserve["stata"])["fields"]
+    assert fields[1] == {
+        "name": "visit_type",
+        "type": "any",
+        "encoding": {1: "Baseline", 2: "Follow-up", ".a": "Missing", ".b": "Refused"},
+    }
+    assert fields[2] == {
+        "name": "age",
+        "type": "any",
+        "encoding": {".a": "Missing", ".b": "Refused"},
+    }
+    fields = export_schema(schema, encodings, reserve["spss"])["fields"]
+    assert [field["type"] for field in fields] == ["string", "integer", "integer"]
+    assert schema["fields"][1]["type"] == "string"
+
+
+def test_encode_frame_invalid_values():
+    df = pd.DataFrame(
+        {"jdc_person_id": ["1", "2"], "visit_type": ["Baseline", "Other"], "age": ["3.5", "41"]}
+    )
+    spss = encode_frame(df, code_table(df, schema), schema, encodings, reserve["spss"])
+    # (values with no code or not of the field's type are missing)
+    assert spss["visit_type"].tolist() == [1, None]
+    assert spss["age"].tolist() == [None, 41]
+
+
+def test_export_tasks_share_frame():
+    df = pd.concat([_df()] * 1000, ignore_index=True)
+    resource = Resource(data=df, schema=schema, format="pandas")
+    tasks = export_tasks(resource, {"sav": "baseline.sav", "dta": "baseline.dta"}, encodings, reserve)
+    assert [args[3] for _, *args in tasks] == ["baseline.sav", "baseline.dta"]
+    assert tasks[0][1] is tasks[1][1]
+    # (as one task of a process pool, the frame and code table are pickled once for both files)
+    assert len(pickle.dumps((run_in_turn, tasks))) < 1.1 * len(pickle.dumps(tasks[0]))
+
+
+def test_write_exports(tmp_path):
+    register_plugins()
+    path = str(tmp_path / "baseline.dta")
+    write_exports(Resource(data=_df(), schema=schema, format="pandas"), {"dta": path}, encodings, reserve)
+
+    df, meta = pyreadstat.read_dta(path, user_missing=True)
+    assert df["visit_type"].tolist()[:3] == [1, "a", 2]
+    assert pd.api.types.is_numeric_dtype(pd.to_numeric(df["age"][[0, 2]]))
+    assert df["age"].tolist() == [30, "a", 41, "b"]
+    assert meta.readstat_variable_types["age"] != "string"
+    assert meta.variable_value_labels["visit_type"] == {
+        1: "Baseline",
+        2: "Follow-up",
+        "a": "Missing",
+        "b": "Refused",
+    }
+
+
+@pytest.mark.parametrize("file_format", ["sav", "dta"])
+def test_write_exports_match_encode_table(tmp_path, file_format):
+    """exports match those read back from the csv and encoded with encode_table"""
+    register_plugins()
+    from dataforge.frictionless import encode_table
+
+    reservecodes = reserve[{"sav": "spss", "dta": "stata"}[file_format]]
+    csvpath = tmp_path / "baseline.csv"
+    _df().to_csv(csvpath, index=False)
+    previous = Resource(path=str(csvpath), schema=schema).transform(
+        steps=[encode_table(encodings=encodings, reservecodes=reservecodes)]
+    )
+    previous.infer()
+    previous.write(str(tmp_path / f"previous.{file_format}"))
+
+    path = str(tmp_path / f"baseline.{file_format}")
+    write_exports(Resource(data=_df(), schema=schema, format="pandas"), {file_format: path}, encodings, reserve)
+
+    read = {"sav": pyreadstat.read_sav, "dta": pyreadstat.read_dta}[file_format]
+    expected, expected_meta = read(str(tmp_path / f"previous.{file_format}"))
+    df, meta = read(path)
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+    assert meta.variable_value_labels["visit_type"] == expected_meta.variable_value_labels["visit_type"]
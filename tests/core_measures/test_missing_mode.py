@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+from jdc_utils.core_measures.core_measures import (
+    _fill_missing_by_type,
+    _fill_native_missing,
+)
+from jdc_utils.core_measures.schema_index import SchemaIndex
+
+descriptor = {
+    "fields": [
+        {"name": "jdc_person_id", "type": "string"},
+        {"name": "age", "type": "integer"},
+        {"name": "visit_date", "type": "date", "format": "%Y%m%d"},
+    ],
+    "missingValues": ["", "Missing"],
+}
+
+
+def test_missing_values_filled_at_serialization():
+    schema_index = SchemaIndex.from_schema(descriptor)
+    df = pd.DataFrame(
+        {
+            "jdc_person_id": ["a", None],
+            "age": [30.0, np.nan],
+            "visit_date": pd.to_datetime(["2020-01-02", None]),
+        }
+    )
+
+    df = _fill_missing_by_type(df, schema_index)
+    assert df["jdc_person_id"].tolist() == ["a", "Missing"]
+    assert df["age"].dtype == "Int64"
+    assert df["visit_date"].dtype == "datetime64[ns]"
+
+    df = _fill_native_missing(df, schema_index)
+    assert df.to_dict("list") == {
+        "jdc_person_id": ["a", "Missing"],
+        "age": [30, "Missing"],
+        "visit_date": ["20200102", "Missing"],
+    }
@@ -0,0 +1,61 @@
+import pandas as pd
+from jdc_utils.core_measures import CoreMeasures
+from jdc_utils.core_measures.core_measures import _source_columns
+from jdc_utils.core_measures.schema_index import SchemaIndex
+
+descriptor = {
+    "fields": [
+        {"name": "jdc_person_id", "type": "string"},
+        {
+            "name": "visit_type",
+            "type": "string",
+            "custom": {"jcoin:original_name": "vtype"},
+        },
+        {"name": "age", "type": "string"},
+    ],
+}
+
+
+def test_source_columns():
+    schema_index = SchemaIndex.from_schema(descriptor)
+    assert _source_columns(schema_index, "record_id", "visit_date") == {
+        "jdc_person_id",
+        "visit_type",
+        "vtype",
+        "age",
+        "record_id",
+        "visit_date",
+    }
+
+
+def test_generate_resource_reads_source_columns(tmp_path):
+    path = tmp_path / "baseline.csv"
+    df = pd.DataFrame(
+        {
+            "redcap_event": ["a", "b"],
+            "vtype": ["Baseline", "Follow-up"],
+            "jdc_person_id": ["1", "2"],
+            "other": ["x", "y"],
+        }
+    )
+    df.to_csv(path, index=False)
+
+    steps = ["add_new_names", "add_missing_fields"]
+    core_measures = CoreMeasures()
+    schema_index = SchemaIndex.from_schema(descriptor)
+    assert core_measures._columns_to_read(schema_index, steps) == {
+        "jdc_person_id",
+        "visit_type",
+        "vtype",
+        "age",
+    }
+    assert core_measures._columns_to_read(schema_index, ["add_new_names"]) is None
+
+    resource = core_measures._generate_resource(
+        str(path), "baseline", descriptor, steps, schema_index=schema_index
+    )
+    expected = core_measures._generate_resource(
+        df.astype(str), "baseline", descriptor, steps, schema_index=schema_index
+    )
+    pd.testing.assert_frame_equal(resource.data, expected.data)
+    assert resource.data.columns.tolist() == ["jdc_person_id", "visit_type", "age"]
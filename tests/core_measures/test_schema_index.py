@@ -0,0 +1,48 @@
+import json
+
+from jdc_utils.core_measures import cache
+from jdc_utils.core_measures.schema_index import SchemaIndex, load_index
+
+descriptor = {
+    "fields": [
+        {"name": "jdc_person_id", "type": "string"},
+        {
+            "name": "visit_type",
+            "type": "string",
+            "constraints": {"enum": ["Baseline", "Follow-up"]},
+            "custom": {"jcoin:original_name": "vtype"},
+        },
+        {"name": "shifted_visit_date", "type": "date", "format": "%Y%m%d"},
+    ],
+    "missingValues": ["Missing", "Refused"],
+    "primaryKey": "jdc_person_id",
+}
+
+
+def test_schema_index():
+    schema_index = SchemaIndex.from_schema(descriptor)
+    assert schema_index.field_names == ["jdc_person_id", "visit_type", "shifted_visit_date"]
+    assert schema_index.original_names == {"vtype": "visit_type"}
+    assert schema_index.enum_sets == {"visit_type": {"Baseline", "Follow-up"}}
+    assert schema_index.formats == {"shifted_visit_date": "%Y%m%d"}
+    assert schema_index.missing_values == ["Missing", "Refused"]
+    assert schema_index.primary_key == ["jdc_person_id"]
+    assert schema_index.fields_of_type("date") == ["shifted_visit_date"]
+    assert schema_index.categorical_fields() == ["visit_type"]
+    assert schema_index.categories("visit_type") == ["Baseline", "Follow-up", "Missing", "Refused"]
+
+    roundtrip = SchemaIndex.from_dict(json.loads(json.dumps(schema_index.to_dict())))
+    assert roundtrip.to_dict() == schema_index.to_dict()
+
+
+def test_load_index_from_disk(tmp_path, monkeypatch):
+    monkeypatch.setenv("JDC_UTILS_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(cache, "load_json", lambda path, ref=None: descriptor)
+    monkeypatch.setattr(cache, "get_digest", lambda path, ref=None: "abc")
+
+    assert load_index("schemas/test.json").field_names[0] == "jdc_person_id"
+    assert list(tmp_path.glob("indexes/abc-*.json"))
+
+    # served from disk without loading the schema
+    monkeypatch.setattr(cache, "load_json", None)
+    assert load_index("schemas/test.json").original_names == {"vtype": "visit_type"}
@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+from jdc_utils.core_measures import CoreMeasures
+from jdc_utils.core_measures.core_measures import _write_csv
+
+schema = {
+    "fields": [
+        {"name": "jdc_person_id", "type": "string"},
+        {"name": "visit_type", "type": "string"},
+    ],
+    "missingValues": ["", "Missing"],
+}
+
+
+def _tasks(tmp_path, n=4):
+    tasks = []
+    for i in range(n):
+        df = pd.DataFrame({"jdc_person_id": [f"{i}-1", f"{i}-2"], "visit_type": ["Baseline", "Missing"]})
+        tasks.append((_write_csv, df, schema, tmp_path / f"{i}.csv", tmp_path / f"{i}.json"))
+    return tasks
+
+
+@pytest.mark.parametrize("write_executor", ["thread", "process"])
+def test_run_tasks(tmp_path, write_executor):
+    (tmp_path / "serial").mkdir()
+    (tmp_path / "pool").mkdir()
+    CoreMeasures()._run_tasks(_tasks(tmp_path / "serial"))
+    core_measures = CoreMeasures(write_workers=2, write_executor=write_executor)
+    core_measures._run_tasks(_tasks(tmp_path / "pool"))
+
+    for path in (tmp_path / "serial").iterdir():
+        assert (tmp_path / "pool" / path.name).read_bytes() == path.read_bytes()
+    assert (tmp_path / "pool" / "0.csv").read_text().splitlines()[1] == "0-1,Baseline"
+
+    # the first exception is raised once all tasks are done
+    tasks = [(int, "not a number")] + _tasks(tmp_path / "pool")
+    with pytest.raises(Exception):
+        core_measures._run_tasks(tasks)
+
+
+def test_write_executor():
+    with pytest.raises(Exception):
+        CoreMeasures(write_executor="cluster")
+
+
+def test_columnar_format():
+    with pytest.raises(Exception):
+        CoreMeasures(columnar_format="feather")
@@ -0,0 +1,44 @@
+"""
+Regression tests for the import time of jdc_utils (see the lazy loading in jdc_utils/__init__.py)
+
+Budgets (in milliseconds) can be changed with the JDC_UTILS_IMPORT_BUDGET_MS
+and JDC_UTILS_CLI_IMPORT_BUDGET_MS environment variables (eg on slow CI machines).
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+heavy_modules = ["pandas", "frictionless", "dataforge", "git", "petl", "gen3"]
+
+
+def import_times(module):
+    """cumulative import times (in ms) from `python -X importtime`"""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    times = {}
+    for line in output.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+@pytest.mark.parametrize(
+    "module,budget_var,default_budget",
+    [
+        ("jdc_utils", "JDC_UTILS_IMPORT_BUDGET_MS", 50),
+        ("jdc_utils.cli", "JDC_UTILS_CLI_IMPORT_BUDGET_MS", 250),
+    ],
+)
+def test_import_time(module, budget_var, default_budget):
+    budget = float(os.environ.get(budget_var, default_budget))
+    times = import_times(module)
+    assert times[module] < budget, f"import {module} took {times[module]}ms"
+    assert not [name for name in heavy_modules if name in times]
@@ -0,0 +1,94 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from jdc_utils.transforms.batch import read_manifest, target_path, transform_files
+
+transformfile_text = """
+rename_columns:
+  from_name_to_name:
+    a: id
+replace_all_values:
+  from_value_to_value:
+    "Yes": "Y"
+"""
+
+
+def _write_files(tmp_path, n=4):
+    transformfile = tmp_path / "transforms.yaml"
+    transformfile.write_text(transformfile_text)
+    file_paths = []
+    for i in range(n):
+        path = tmp_path / f"site{i}.csv"
+        pd.DataFrame({"a": [i, i + 1], "b": ["Yes", "No"]}).to_csv(path, index=False)
+        file_paths.append(str(path))
+    return transformfile, file_paths
+
+
+@pytest.mark.parametrize("jobs", [None, 2])
+def test_transform_files(tmp_path, jobs):
+    transformfile, file_paths = _write_files(tmp_path)
+    outdir = tmp_path / "out"
+    results = list(transform_files(transformfile, file_paths, outdir=outdir, jobs=jobs))
+
+    assert sorted(file_path for file_path, _, _ in results) == file_paths
+    for file_path, targetpath, error in results:
+        assert error is None
+        assert targetpath == target_path(file_path, outdir)
+        df = pd.read_csv(targetpath)
+        assert df.columns.tolist() == ["id", "b"]
+        assert df["b"].tolist() == ["Y", "No"]
+    assert not list(outdir.glob("*.partial"))
+
+
+@pytest.mark.parametrize("jobs", [None, 2])
+def test_transform_files_errors(tmp_path, jobs):
+    transformfile, file_paths = _write_files(tmp_path, n=2)
+    missing = str(tmp_path / "missing.csv")
+    outdir = tmp_path / "out"
+
+    # the other files are still transformed
+    results = list(
+        transform_files(transformfile, [missing] + file_paths, outdir=outdir, jobs=jobs)
+    )
+    targets = {file_path: targetpath for file_path, targetpath, _ in results}
+    errors = {file_path: error for file_path, _, error in results}
+    assert errors[missing] is not None
+    assert targets[missing] is None
+    assert [errors[file_path] for file_path in file_paths] == [None, None]
+    assert [targets[file_path] for file_path in file_paths] == [
+        target_path(file_path, outdir) for file_path in file_paths
+    ]
+
+
+def test_transform_files_skips_unchanged(tmp_path):
+    transformfile, file_paths = _write_files(tmp_path, n=3)
+    outdir = tmp_path / "out"
+    list(transform_files(transformfile, file_paths, outdir=outdir))
+
+    def transformed(**kwargs):
+        results = transform_files(transformfile, file_paths, outdir=outdir, **kwargs)
+        return sorted(file_path for file_path, _, _ in results)
+
+    assert transformed() == []
+    assert transformed(force=True) == file_paths
+
+    pd.DataFrame({"a": [9], "b": ["Yes"]}).to_csv(file_paths[0], index=False)
+    target_path(file_paths[1], outdir).unlink()
+    assert transformed() == file_paths[:2]
+
+    transformfile.write_text(transformfile_text + "to_lowercase_names: null\n")
+    assert transformed(jobs=2) == file_paths
+
+
+def test_manifest_survives_failures(tmp_path):
+    transformfile, file_paths = _write_files(tmp_path, n=2)
+    outdir = tmp_path / "out"
+    results = list(
+        transform_files(transformfile, file_paths + ["missing.csv"], outdir=outdir)
+    )
+    assert [error is None for _, _, error in results] == [True, True, False]
+    assert sorted(read_manifest(outdir)) == [
+        str(Path(file_path).resolve()) for file_path in file_paths
+    ]
+    assert list(transform_files(transformfile, file_paths, outdir=outdir)) == []
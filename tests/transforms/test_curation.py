@@ -0,0 +1,89 @@
+import pandas as pd
+from jdc_utils.transforms import (
+    add_missing_fields,
+    collapse_checkall,
+    collapse_checkall_groups,
+    rename_and_change_values,
+)
+
+race = {
+    "columns_to_labels": {"race_white": "White", "race_black": "Black"},
+    "checked": "Yes",
+    "multi_checked": "Multiracial",
+    "none_checked": "None",
+    "fillna": "Missing",
+}
+services = {"columns": ["moud", "housing"], "checked": True}
+
+
+def _df():
+    return pd.DataFrame(
+        {
+            "race_white": ["Yes", "Yes", "No", None, None],
+            "race_black": ["No", "Yes", "No", "Yes", pd.NA],
+            "moud": [True, False, None, True, False],
+            "housing": [True, False, False, False, False],
+        }
+    )
+
+
+def test_collapse_checkall():
+    assert collapse_checkall(_df(), "race", **race, inplace=False).tolist() == [
+        "White",
+        "Multiracial",
+        "None",
+        "Missing",
+        "Missing",
+    ]
+    assert collapse_checkall(_df(), "services", **services, inplace=False).tolist() == [
+        "Multiple checked",
+        "None checked",
+        None,
+        "moud",
+        "None checked",
+    ]
+    assert collapse_checkall(_df(), "other", columns=["not_a_field"]) is None
+
+
+def test_collapse_checkall_groups():
+    df = _df()
+    collapse_checkall_groups(df, {"race": race, "services": services, "other": {"columns": ["x"]}})
+    assert "other" not in df
+    for name, params in {"race": race, "services": services}.items():
+        expected = collapse_checkall(_df(), name, **params, inplace=False)
+        pd.testing.assert_series_equal(df[name], expected, check_names=False)
+
+
+def test_add_missing_fields():
+    df = _df().set_index(pd.Index([5, 6, 7, 8, 9]))
+    targetdf = add_missing_fields(df, ["housing", "new_field", "race_white"])
+    assert targetdf.columns.tolist() == ["housing", "new_field", "race_white"]
+    assert targetdf.index.tolist() == [0, 1, 2, 3, 4]
+    assert targetdf["new_field"].tolist() == ["Missing"] * 5
+    assert targetdf["housing"].dtype == bool
+    assert targetdf["race_white"].tolist() == df["race_white"].tolist()
+
+
+def test_rename_and_change_values():
+    df = _df()
+    rename_and_change_values(
+        df,
+        {
+            "race_white": {"fillna": "Missing", "values": {"Yes": 1, "No": 0}, "name": "white"},
+            "white": {"values": {"Missing": -9}},  # refers to the new name
+            "race_black": {"values": {"Yes": "Y"}, "name": "black"},
+            "not_a_field": {"name": "x"},
+        },
+    )
+    assert df.columns.tolist() == ["white", "black", "moud", "housing"]
+    assert df["white"].tolist() == [1, 1, 0, -9, -9]
+    assert df["white"].dtype == "int64"
+    assert df["black"].tolist()[:4] == ["No", "Y", "No", "Y"]
+
+    # renames resulting in duplicate names are still applied one by one
+    df = _df()
+    rename_and_change_values(
+        df, {"moud": {"name": "housing"}, "race_white": {"values": {"Yes": "Y"}}}
+    )
+    assert df.columns.tolist() == ["race_white", "race_black", "housing", "housing"]
+    assert df["race_white"].tolist()[:2] == ["Y", "Y"]
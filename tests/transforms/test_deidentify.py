@@ -1,9 +1,13 @@
+import importlib
 import os
 from pathlib import Path
 
 import git
 import pandas as pd
-from jdc_utils.transforms import deidentify
+import pytest
+
+# (the module -- jdc_utils.transforms exports the deidentify function under the same name)
+deidentify = importlib.import_module("jdc_utils.transforms.deidentify")
 
 os.chdir(Path(__file__).parents[1])
 
@@ -73,6 +77,125 @@ def test_shift_dates():
         assert len(list(r.iter_commits())) == 1
 
 
+def test_shift_dates_mixed_formats():
+    df = pd.DataFrame(
+        {
+            "record_id": [1, 2, 1],
+            "visit_dt": ["1/13/2023", "2/1/2023", "2023-02-01"],
+            "dob": ["2000-05-01", "1999-12-31", None],
+        }
+    )
+    offsets = pd.Series([1, -1], index=[1, 2])
+    dfnew = deidentify._shift_dates_by_offsets(df, offsets, "record_id", ["visit_dt", "dob"])
+    assert dfnew["shifted_visit_dt"].tolist() == ["20230114", "20230131", "20230202"]
+    assert dfnew["shifted_dob"].tolist()[:2] == ["20000502", "19991230"]
+    assert pd.isna(dfnew["shifted_dob"][2])
+
+
+def test_chunked_shift_dates_mixed_formats(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    session_history_path = (tmp_path / "test_mappings").as_posix()
+    deidentify.init_version_history_all(session_history_path)
+    pd.DataFrame(
+        {
+            "record_id": [1, 2, 3, 1, 2, 3],
+            "visit_dt": ["2023-02-01", "1/13/2023", "2/1/2023", "1/13/2023", "2023-03-04", None],
+            "dob": ["1999-12-31", "2000-05-01", "5/1/2000", None, "12/31/1999", "2000-05-01"],
+        }
+    ).to_csv("timepoints.csv", index=False)
+
+    # (read as `core_measures._read_chunks` reads csv files for `deidentify_to_csv`)
+    def read(chunksize=None):
+        return pd.read_csv(
+            "timepoints.csv", chunksize=chunksize, dtype=str, keep_default_na=False, na_values=[""]
+        )
+
+    def shift(dfs):
+        with deidentify.DeidentificationSession(session_history_path) as session:
+            return pd.concat(
+                [session.shift_dates(df, "record_id", ["visit_dt", "dob"]) for df in dfs],
+                ignore_index=True,
+            )
+
+    whole = shift([read()])
+    for chunksize in [1, 2, 4]:
+        chunked = shift(read(chunksize))
+        pd.testing.assert_frame_equal(chunked, whole)
+    assert whole[["shifted_visit_dt", "shifted_dob"]].notna().sum().tolist() == [5, 5]
+
+
+def test_deidentification_session(tmp_path, monkeypatch):
+    id_file = Path("data/test_ids.txt").resolve().as_posix()
+    monkeypatch.chdir(tmp_path)
+    session_history_path = (tmp_path / "test_mappings").as_posix()
+    deidentify.init_version_history_all(session_history_path)
+
+    with deidentify.DeidentificationSession(session_history_path, id_file) as session:
+        dfnew = session.deidentify(df.copy(), "record_id", "date_var")
+        dfnew2 = session.deidentify(
+            pd.DataFrame({"record_id": [4, 1], "date_var": ["1/1/2023", "1/1/2023"]}),
+            "record_id",
+            "date_var",
+        )
+
+    assert dfnew2["jdc_person_id"].tolist() == ["C14-433", "C14-153"]
+    # (all dates are 1/1/2023 shifted by the pushed offset of each jdc id)
+    offsets = pd.read_csv(
+        "tmp/git/days_for_shift_date/days_for_shift_date.csv", index_col="jdc_person_id"
+    )["days_for_shift_date"]
+    for shifted in [dfnew, dfnew2]:
+        expected = [
+            (pd.Timestamp("2023-01-01") + pd.Timedelta(days=offsets[jdc_id])).strftime("%Y%m%d")
+            for jdc_id in shifted["jdc_person_id"]
+        ]
+        assert shifted["shifted_date_var"].tolist() == expected
+    assert dfnew2["shifted_date_var"][1] == dfnew["shifted_date_var"][0]
+    combinedmappings = pd.read_csv(tmp_path / "test_mappings.csv")
+    assert combinedmappings["jdc_person_id"].tolist() == [
+        "C14-153",
+        "C14-273",
+        "C14-363",
+        "C14-433",
+    ]
+
+    # all resources committed and pushed at once
+    for name in ["jdc_person_id", "days_for_shift_date"]:
+        with git.Repo(Path(session_history_path) / f"{name}.git") as r:
+            assert len(list(r.iter_commits())) == 1
+
+
+@pytest.mark.parametrize("id_lines", ["", "jdc_person_id\n", "jdc_person_id\nC14-1\n"])
+def test_deidentification_session_too_few_ids(tmp_path, monkeypatch, id_lines):
+    id_file = tmp_path / "ids.txt"
+    id_file.write_text(id_lines)
+    monkeypatch.chdir(tmp_path)
+    session_history_path = (tmp_path / "test_mappings").as_posix()
+    deidentify.init_version_history_all(session_history_path)
+
+    with pytest.raises(Exception, match="is empty|Too few new IDs"):
+        with deidentify.DeidentificationSession(session_history_path, id_file.as_posix()) as session:
+            session.deidentify(df.copy(), "record_id", "date_var")
+
+
+def test_deidentification_session_ids_not_in_id_file(tmp_path, monkeypatch):
+    id_file = Path("data/test_ids.txt").resolve().as_posix()
+    empty_id_file = tmp_path / "ids.txt"
+    empty_id_file.write_text("jdc_person_id\n")
+    monkeypatch.chdir(tmp_path)
+    session_history_path = (tmp_path / "test_mappings").as_posix()
+    deidentify.init_version_history_all(session_history_path)
+
+    with deidentify.DeidentificationSession(session_history_path, id_file) as session:
+        dfnew = session.deidentify(df.copy(), "record_id", "date_var")
+    # (only already mapped ids so none are needed from the now empty id file)
+    with deidentify.DeidentificationSession(
+        session_history_path, empty_id_file.as_posix()
+    ) as session:
+        dfnew2 = session.deidentify(df.copy(), "record_id", "date_var")
+
+    assert dfnew2["jdc_person_id"].tolist() == dfnew["jdc_person_id"].tolist()
+
+
 if __name__ == "__main__":
     try:
         os.chdir(Path(__file__).parents[1])
@@ -0,0 +1,113 @@
+from pathlib import Path
+
+import git
+import pandas as pd
+import pytest
+from jdc_utils.transforms.deidentify import (
+    DeidentificationSession,
+    history_heads,
+    init_version_history_all,
+    versioned_filenames,
+)
+from jdc_utils.transforms.mapping_backends import SqliteMappingBackend
+
+id_file = (Path(__file__).parents[1] / "data/test_ids.txt").resolve().as_posix()
+
+
+def _deidentify(history_path, record_ids, backend):
+    df = pd.DataFrame({"record_id": record_ids, "date_var": "1/1/2023"})
+    with DeidentificationSession(history_path, id_file, backend=backend) as session:
+        return session.deidentify(df, "record_id", "date_var")
+
+
+def test_backends_assign_same_mappings(tmp_path, monkeypatch):
+    dfs = {}
+    for backend in ["git", "sqlite"]:
+        monkeypatch.chdir(tmp_path)
+        Path(backend).mkdir()
+        monkeypatch.chdir(backend)
+        history_path = Path("history").resolve().as_posix()
+        init_version_history_all(history_path)
+        dfs[backend] = [
+            _deidentify(history_path, [1, 2, 2], backend),
+            _deidentify(history_path, [3, 1], backend),
+        ]
+
+    # (date offsets are random so only ids are compared)
+    for df_git, df_sqlite in zip(dfs["git"], dfs["sqlite"]):
+        assert df_git["jdc_person_id"].tolist() == df_sqlite["jdc_person_id"].tolist()
+    # same id gets the same offset across sessions
+    assert dfs["sqlite"][1]["shifted_date_var"][1] == dfs["sqlite"][0]["shifted_date_var"][0]
+    assert dfs["sqlite"][1]["jdc_person_id"].tolist() == ["C14-363", "C14-153"]
+
+
+def test_sqlite_backend_pushes_every_commit(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    history_path = Path("history").resolve().as_posix()
+    init_version_history_all(history_path)
+
+    def n_commits():
+        repo = git.Repo(Path(history_path) / "jdc_person_id.git")
+        return len(list(repo.iter_commits())) if repo.references else 0
+
+    for record_ids, expected_commits in [([1, 2], 1), ([2, 3], 2)]:
+        backend = SqliteMappingBackend(history_path, versioned_filenames)
+        df = _deidentify(history_path, record_ids, backend)
+        assert n_commits() == expected_commits
+    assert df["jdc_person_id"].tolist() == ["C14-273", "C14-363"]
+
+    # the local store is rebuilt from the history repos
+    git.rmtree("tmp")
+    backend = SqliteMappingBackend(history_path, versioned_filenames)
+    df = _deidentify(history_path, [3, 4], backend)
+    assert df["jdc_person_id"].tolist() == ["C14-363", "C14-433"]
+
+
+def test_offsets_pushed_before_ids(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    history_path = Path("history").resolve().as_posix()
+    init_version_history_all(history_path)
+
+    # (the ids history rejects pushes)
+    hook = Path(history_path) / "jdc_person_id.git" / "hooks" / "pre-receive"
+    hook.write_text("#!/bin/sh\nexit 1\n")
+    hook.chmod(0o755)
+    with pytest.raises(Exception):
+        _deidentify(history_path, [1, 2], "git")
+
+    def commits(name, path=history_path):
+        repo = git.Repo(Path(path) / name)
+        return list(repo.iter_commits()) if repo.references else []
+
+    assert len(commits("days_for_shift_date.git")) == 1
+    assert not commits("jdc_person_id.git")
+    assert not commits("jdc_person_id", "tmp/git")
+    offsets = pd.read_csv("tmp/git/days_for_shift_date/days_for_shift_date.csv")
+
+    # the ids get the pushed offsets once assigned
+    hook.unlink()
+    df = _deidentify(history_path, [1, 2], "git")
+    assert len(commits("days_for_shift_date.git")) == 1
+    assert len(commits("jdc_person_id.git")) == 1
+    assert df["jdc_person_id"].tolist() == offsets["jdc_person_id"].tolist()
+    expected = [
+        (pd.Timestamp("2023-01-01") + pd.Timedelta(days=days)).strftime("%Y%m%d")
+        for days in offsets["days_for_shift_date"]
+    ]
+    assert df["shifted_date_var"].tolist() == expected
+
+
+def test_history_heads(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    history_path = Path("history").resolve().as_posix()
+    init_version_history_all(history_path)
+    assert history_heads(history_path) == {name: None for name in versioned_filenames.values()}
+
+    _deidentify(history_path, [1, 2], "git")
+    heads = history_heads(history_path)
+    assert all(heads.values())
+    # unchanged by a run adding no mappings but changed by new mappings
+    _deidentify(history_path, [1, 2], "git")
+    assert history_heads(history_path) == heads
+    _deidentify(history_path, [3], "git")
+    assert history_heads(history_path)["jdc_person_id.csv"] != heads["jdc_person_id.csv"]
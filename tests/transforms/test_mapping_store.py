@@ -0,0 +1,66 @@
+import pandas as pd
+from jdc_utils.transforms.mapping_store import MappingStore
+
+
+def test_mapping_store(tmp_path):
+    ids_file = tmp_path / "git/jdc_person_id/jdc_person_id.csv"
+    offsets_file = tmp_path / "git/days_for_shift_date/days_for_shift_date.csv"
+    ids_file.parent.mkdir(parents=True)
+    offsets_file.parent.mkdir(parents=True)
+    ids_file.write_text("record_id,jdc_person_id\n1,C14-153\n2,C14-273\n")
+    offsets_file.write_text("jdc_person_id,days_for_shift_date\nC14-153,124\n")
+
+    with MappingStore(tmp_path / "mappings.sqlite", tmp_path / "git") as store:
+        store.update()
+        assert store.names == ["days_for_shift_date", "jdc_person_id"]
+
+        # appended rows are added
+        with open(ids_file, "a") as f:
+            f.write("3,C14-363\n")
+        with open(offsets_file, "a") as f:
+            f.write("C14-273,-87\n")
+        store.update()
+        assert store.to_frame("jdc_person_id")["jdc_person_id"].tolist() == [
+            "C14-153",
+            "C14-273",
+            "C14-363",
+        ]
+
+        store.export_csv(tmp_path / "mappings.csv")
+
+    combined = pd.read_csv(tmp_path / "mappings.csv", dtype=str, keep_default_na=False)
+    assert combined.sort_values("record_id").to_dict(orient="records") == [
+        {"record_id": "1", "jdc_person_id": "C14-153", "days_for_shift_date": "124"},
+        {"record_id": "2", "jdc_person_id": "C14-273", "days_for_shift_date": "-87"},
+        {"record_id": "3", "jdc_person_id": "C14-363", "days_for_shift_date": ""},
+    ]
+
+
+def test_mapping_store_rewritten_file(tmp_path):
+    ids_file = tmp_path / "git/jdc_person_id/jdc_person_id.csv"
+    ids_file.parent.mkdir(parents=True)
+    ids_file.write_text("record_id,jdc_person_id\n1,C14-153\n2,C14-273\n")
+
+    with MappingStore(tmp_path / "mappings.sqlite", tmp_path / "git") as store:
+        store.update()
+        # eg history rolled back
+        ids_file.write_text("record_id,jdc_person_id\n1,C14-153\n")
+        store.update()
+        assert len(store.to_frame("jdc_person_id")) == 1
+
+
+def test_mapping_store_rewritten_file_grown_past_ingested(tmp_path):
+    ids_file = tmp_path / "git/jdc_person_id/jdc_person_id.csv"
+    ids_file.parent.mkdir(parents=True)
+    ids_file.write_text("record_id,jdc_person_id\n1,C14-153\n2,C14-273\n")
+
+    with MappingStore(tmp_path / "mappings.sqlite", tmp_path / "git") as store:
+        store.update()
+        # eg history rolled back and then new mappings appended
+        ids_file.write_text("record_id,jdc_person_id\n1,C14-153\n3,C14-363\n4,C14-433\n")
+        store.update()
+        assert store.to_frame("jdc_person_id").to_dict(orient="records") == [
+            {"record_id": "1", "jdc_person_id": "C14-153"},
+            {"record_id": "3", "jdc_person_id": "C14-363"},
+            {"record_id": "4", "jdc_person_id": "C14-433"},
+        ]
@@ -0,0 +1,93 @@
+import pandas as pd
+import pandas_flavor as pf
+import pytest
+from jdc_utils.transforms import compile_transformfile
+from jdc_utils.transforms.plans import FusedStep, TransformPlan
+
+transform_mappings = {
+    "rename_columns": {"from_name_to_name": {"a": "id"}},
+    "replace_all_values": {"from_value_to_value": {"Yes": "Y", "No": "N"}},
+    "replace_column_values": {"within_column_from_value_to_value": {"b": {"Y": "yes"}}},
+    "rename_and_change_values": {
+        "name_and_values": {
+            "b": {"fillna": "Missing", "values": {"N": "no"}, "name": "flag"},
+            "c": {"values": {1: 2}},
+        }
+    },
+    "to_lowercase_names": None,
+}
+
+
+def _df():
+    return pd.DataFrame(
+        {"a": [1, 2, 3], "b": ["Yes", "No", None], "c": [1, 2, 1], "d": ["No", "x", "Yes"]}
+    )
+
+
+def test_fused_steps_match_sequential_steps():
+    plan = TransformPlan(transform_mappings)
+    assert isinstance(plan.steps[0], FusedStep)
+    assert len(plan.steps) == 2
+
+    expected = _df()
+    for step in plan.steps[0].steps:
+        step.run(expected)
+
+    df = plan.run(_df())
+    pd.testing.assert_frame_equal(df, expected)
+    assert df.columns.tolist() == ["id", "flag", "c", "d"]
+    assert df["flag"].tolist() == ["yes", "no", "Missing"]
+    assert df["d"].tolist() == ["N", "x", "Y"]
+
+
+def test_fused_steps_resolve_renames():
+    steps = {
+        "rename_columns": {"from_name_to_name": {"a": "b", "b": "a"}},
+        "rename_and_change_values": {
+            "name_and_values": {"a": {"name": "x", "values": {"Yes": "Y"}}, "x": {"values": {"Y": "y"}}}
+        },
+    }
+    step = TransformPlan(steps).steps[0]
+    ops, renames = step.resolve(_df().columns)
+    assert renames == {"a": "b", "b": "x"}
+    assert ops == {"b": [("replace", {"Yes": "y", "Y": "y"})]}
+
+    # (duplicate names and nested mappings are run step by step)
+    steps["rename_columns"] = {"from_name_to_name": {"a": "c"}}
+    assert TransformPlan(steps).steps[0].resolve(_df().columns) is None
+    steps["rename_columns"] = {"from_name_to_name": {}}
+    steps["rename_and_change_values"]["name_and_values"]["a"]["values"] = {"b": {"Yes": "Y"}}
+    assert TransformPlan(steps).steps[0].resolve(_df().columns) is None
+
+
+def test_steps_validated_up_front():
+    with pytest.raises(Exception, match="Invalid parameters for rename_columns"):
+        TransformPlan({"rename_columns": {"wrong_name": {}}})
+    with pytest.raises(Exception, match="need to be a mapping"):
+        TransformPlan({"rename_columns": ["a"]})
+
+
+def test_other_steps_looked_up_on_dataframe():
+    @pf.register_dataframe_method
+    def _test_plans_add_column(df, name, value):
+        df[name] = value
+
+    plan = TransformPlan(
+        {"_test_plans_add_column": {"name": "e", "value": 1}, "to_lowercase_names": None}
+    )
+    df = plan.run(_df())
+    assert df["e"].tolist() == [1, 1, 1]
+
+    plan = TransformPlan({"rename_columns": {"from_name_to_name": {}}, "bogus": {}})
+    with pytest.raises(Exception, match="bogus in transform file is not a jdc_utils transform"):
+        plan.run(_df())
+
+
+def test_plan_cached_by_file_hash(tmp_path):
+    transformfile = tmp_path / "transforms.yaml"
+    transformfile.write_text("rename_columns:\n  from_name_to_name:\n    a: id\n")
+    plan = compile_transformfile(transformfile)
+    assert compile_transformfile(transformfile) is plan
+
+    transformfile.write_text("rename_columns:\n  from_name_to_name:\n    a: b\n")
+    assert compile_transformfile(transformfile) is not plan
@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from frictionless import Package, Resource, validate
+from jdc_utils.utils.columnar import (
+    has_pyarrow,
+    read_columnar_file,
+    read_columnar_schema,
+    typed_frame,
+)
+from jdc_utils.utils.packaging import read_package, resource_to_frame, write_columnar_frame, write_csv_frame
+
+pytestmark = pytest.mark.skipif(not has_pyarrow(), reason="needs pyarrow")
+
+schema = {
+    "fields": [
+        {"name": "jdc_person_id", "type": "string"},
+        {"name": "visit_type", "type": "string", "constraints": {"enum": ["Baseline", "Follow-up"]}},
+        {"name": "score", "type": "number"},
+    ],
+    "missingValues": ["", "Missing"],
+}
+
+
+def _df():
+    return pd.DataFrame(
+        {
+            "jdc_person_id": [f"p{i}" for i in range(6)],
+            "visit_type": pd.Categorical(["Follow-up", "Baseline", "Missing"] * 2),
+            "score": [1.5, np.nan, 0.1] * 2,
+        }
+    )
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".arrow"])
+def test_read_columnar_file(tmp_path, suffix):
+    write_csv_frame(_df(), tmp_path / "baseline.csv")
+    write_columnar_frame(_df(), schema, tmp_path / f"baseline{suffix}")
+    assert read_columnar_schema(tmp_path / f"baseline{suffix}") == schema
+
+    df = read_columnar_file(tmp_path / f"baseline{suffix}")
+    assert df["score"].dtype == "float64"
+    assert df["score"].isna().tolist() == [False, True, False] * 2
+    assert df["visit_type"].tolist() == ["Follow-up", "Baseline", None] * 2
+
+    # (the same DataFrames as the csv typed by its schema)
+    csv = Resource(path=str(tmp_path / "baseline.csv"))
+    for categorical_columns, columns in [(None, None), (["visit_type"], None), (None, ["score", "x"])]:
+        df = read_columnar_file(tmp_path / f"baseline{suffix}", columns, categorical_columns)
+        expected = typed_frame(resource_to_frame(csv, columns=columns), schema, categorical_columns)
+        pd.testing.assert_frame_equal(df, expected)
+
+
+def test_typed_frame():
+    typed_schema = {
+        "fields": [
+            {"name": "age", "type": "integer"},
+            {"name": "visit_date", "type": "date", "format": "%Y%m%d"},
+            {"name": "consent", "type": "boolean"},
+            {"name": "weight", "type": "integer"},
+        ],
+        "missingValues": ["", "Missing"],
+    }
+    df = typed_frame(
+        pd.DataFrame(
+            {
+                "age": ["30", "Missing"],
+                "visit_date": ["20210102", ""],
+                "consent": ["true", "false"],
+                # (invalid values are kept as strings)
+                "weight": ["70", "heavy"],
+            }
+        ),
+        typed_schema,
+    )
+    assert df.dtypes.astype(str).tolist() == ["Int64", "datetime64[ns]", "boolean", "object"]
+    assert df["age"].tolist() == [30, pd.NA]
+    assert df["visit_date"].tolist()[0] == pd.Timestamp("2021-01-02")
+    assert df["weight"].tolist() == ["70", "heavy"]
+
+
+def test_read_package_columnar_copy(tmp_path):
+    basedir = os.getcwd()
+    try:
+        os.chdir(tmp_path)
+        os.mkdir("data")
+        write_csv_frame(_df(), "data/baseline.csv")
+        write_columnar_frame(_df(), schema, "data/baseline.parquet")
+        package = Package()
+        package.add_resource(Resource(name="baseline", path="data/baseline.csv", schema=schema))
+        package.get_resource("baseline")["columnarCopies"] = {"parquet": "data/baseline.parquet"}
+        package.to_json("data-package.json")
+        expected = read_columnar_file("data/baseline.parquet", None, ["visit_type"])
+        strings = resource_to_frame(Resource(path="data/baseline.csv"), ["visit_type"])
+
+        # (the copy isn't a resource so the package is valid)
+        assert validate("data-package.json")["valid"]
+        # (typed reads are from the copy -- the csv is changed after the copy was written)
+        with open("data/baseline.csv", "a") as file:
+            file.write("p6,Baseline,2.0\r\n")
+        package = read_package(str(tmp_path), categorical_columns={"baseline": ["visit_type"]}, typed=True)
+        csv_package = read_package(str(tmp_path), categorical_columns={"baseline": ["visit_type"]})
+    finally:
+        os.chdir(basedir)
+    assert package.resource_names == ["baseline"]
+    pd.testing.assert_frame_equal(package.get_resource("baseline").data, expected)
+    assert len(csv_package.get_resource("baseline").data) == len(strings) + 1
@@ -0,0 +1,118 @@
+import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from frictionless import Resource
+from jdc_utils.utils.packaging import _read_csv_frame, resource_to_frame, write_csv_frame
+
+data_dir = Path(__file__).parents[1] / "data"
+
+
+def _petl_frame(path):
+    return Resource(path=str(path)).to_petl().todf()
+
+
+def test_read_csv_frame(tmp_path):
+    path = tmp_path / "timepoints.csv"
+    path.write_text('a,b,a,\n1,"x, ""y""",,4\n"5\n6", z,7,\n')
+    df = _read_csv_frame(Resource(path=str(path)))
+    assert df.columns.tolist() == ["a", "b", "a", ""]
+    pd.testing.assert_frame_equal(df, _petl_frame(path))
+
+    # delimiter and encoding detected by frictionless
+    path = tmp_path / "semicolon.csv"
+    path.write_bytes('\ufeffid;name\n1;"ä;b"\n2;c\n'.encode("utf-8"))
+    df = _read_csv_frame(Resource(path=str(path)))
+    pd.testing.assert_frame_equal(df, _petl_frame(path))
+
+
+def test_read_csv_frame_fallback(tmp_path):
+    path = tmp_path / "long.csv"
+    path.write_text("a,b\n1,2\n3,4,5\n")
+    assert _read_csv_frame(Resource(path=str(path))) is None
+    with pytest.raises(Exception):
+        resource_to_frame(Resource(path=str(path)))
+
+    path = tmp_path / "data.tsv"
+    path.write_text("a\tb\n1\t2\n")
+    assert _read_csv_frame(Resource(path=str(path))) is None
+    df = resource_to_frame(Resource(path=str(path)))
+    pd.testing.assert_frame_equal(df, _petl_frame(path))
+
+
+def test_resource_to_frame_categorical(tmp_path):
+    path = tmp_path / "baseline.csv"
+    pd.DataFrame(
+        {"id": range(7), "vtype": ["Baseline", "Follow-up", ""] * 2 + ["x"]}
+    ).to_csv(path, index=False)
+    expected = _petl_frame(path)
+    rows = [list(expected.columns)] + expected.values.tolist()
+    for resource in [Resource(path=str(path)), Resource(data=rows)]:  # (pandas, petl)
+        df = resource_to_frame(resource, {"vtype"}, chunksize=2)
+        assert df["vtype"].dtype == "category"
+        pd.testing.assert_frame_equal(df.astype({"vtype": object}), expected)
+
+
+def test_resource_to_frame_columns(tmp_path):
+    path = tmp_path / "baseline.csv"
+    path.write_text("a,b,a,c\n1,2,3,4\n5,6,7,8\n")
+    expected = _petl_frame(path).iloc[:, [0, 2, 3]]
+    rows = [list("abac"), list("1234"), list("5678")]
+    for resource in [Resource(path=str(path)), Resource(data=rows)]:
+        df = resource_to_frame(resource, columns={"a", "c", "not_in_file"})
+        pd.testing.assert_frame_equal(df, expected)
+
+    df = resource_to_frame(Resource(path=str(path)), columns={"not_in_file"})
+    assert df.columns.tolist() == list("abac")
+
+
+def test_write_csv_frame(tmp_path):
+    df = pd.DataFrame(
+        {
+            "jdc_person_id": [f"p{i}" for i in range(8)],
+            "visit_type": pd.Categorical(["Baseline", "Follow-up", "Missing", "Follow-up"] * 2),
+            "age": [30, 41, 52, 63] * 2,
+            "score": [1.5, np.nan, 1e-7, 0.1] * 2,
+            "note": ["plain", "with, comma", 'a "quote"', "new\nline", "é", None, "", "x"],
+        }
+    )
+    # (without a schema or missing strings, the same csv as the frictionless pandas parser)
+    for index, frame in enumerate([df, df.head(0)]):
+        expected, path = tmp_path / f"expected{index}.csv", tmp_path / f"frame{index}.csv"
+        Resource(data=frame, format="pandas").to_petl().tocsv(str(expected), encoding="utf-8")
+        write_csv_frame(frame, path)
+        assert path.read_bytes() == expected.read_bytes()
+
+
+def test_write_csv_frame_schema(tmp_path):
+    df = pd.DataFrame(
+        {
+            "jdc_person_id": [f"p{i}" for i in range(4)],
+            "visit_type": pd.Categorical(["Baseline", None, "Missing", "Follow-up"]),
+            "age": [30, np.nan, 52, 63.5],
+            "score": [1.5, np.nan, 1e-7, 0.1],
+            "note": ["with, comma", 'a "quote"', "new\nline", np.nan],
+            "visit_date": pd.to_datetime(["2021-01-02", None, "2021-03-04 10:30", "2021-05-06"]),
+            "visit_dt": pd.Series(
+                [pd.Timestamp("2021-01-02"), "2021-03-04", None, datetime.date(2021, 5, 6)],
+                dtype=object,
+            ),
+            "visit_time": pd.to_datetime(["2021-01-02 10:30", None, None, "2021-01-02 23:59:59"]),
+        }
+    )
+    schema = {
+        "fields": [
+            {"name": "jdc_person_id", "type": "string"},
+            {"name": "visit_type", "type": "string"},
+            {"name": "age", "type": "integer"},
+            {"name": "score", "type": "number"},
+            {"name": "visit_date", "type": "date"},
+            {"name": "visit_dt", "type": "date", "format": "%m/%d/%Y"},
+            {"name": "visit_time", "type": "datetime"},
+        ]
+    }
+    path = tmp_path / "timepoints.csv"
+    write_csv_frame(df, path, schema)
+    assert path.read_bytes() == (data_dir / "write-csv-frame-schema.csv").read_bytes()
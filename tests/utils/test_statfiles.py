@@ -0,0 +1,64 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyreadstat
+import pytest
+from frictionless import Resource
+from jdc_utils.utils.packaging import resource_to_frame
+from jdc_utils.utils.statfiles import read_stat_file
+
+value_labels = {"visit_type": {1: "Baseline", 2: "Follow-up"}}
+
+
+def _df(nrows=25):
+    return pd.DataFrame(
+        {
+            "record_id": [f"p{i}" for i in range(nrows)],
+            "visit_type": np.resize([1.0, 2.0, 3.0, np.nan], nrows),
+            "visit_date": pd.to_datetime("2021-01-01")
+            + pd.to_timedelta(np.arange(nrows), "D"),
+        }
+    )
+
+
+@pytest.mark.parametrize("suffix", [".sav", ".dta"])
+def test_read_stat_file(tmp_path, suffix):
+    path = str(tmp_path / f"baseline{suffix}")
+    write = pyreadstat.write_sav if suffix == ".sav" else pyreadstat.write_dta
+    write(_df(), path, variable_value_labels=value_labels)
+    read = pyreadstat.read_sav if suffix == ".sav" else pyreadstat.read_dta
+    expected, _ = read(
+        path,
+        apply_value_formats=True,
+        formats_as_category=False,
+        dates_as_pandas_datetime=True,
+    )
+    assert expected["visit_type"].tolist()[:3] == ["Baseline", "Follow-up", 3.0]
+
+    pd.testing.assert_frame_equal(read_stat_file(path, chunksize=10), expected)
+    df = read_stat_file(path, chunksize=10, max_workers=2)
+    pd.testing.assert_frame_equal(df, expected)
+
+    df = resource_to_frame(
+        Resource(path=path), {"visit_type"}, columns={"visit_type", "record_id"}
+    )
+    assert df.columns.tolist() == ["record_id", "visit_type"]
+    assert df["visit_type"].dtype == "category"
+    pd.testing.assert_series_equal(
+        df["visit_type"].astype(object), expected["visit_type"]
+    )
+
+
+def test_pyreadstat_imported_lazily():
+    # (packaging imports statfiles, so pyreadstat is only needed to read SPSS/Stata files)
+    output = subprocess.run(
+        [sys.executable, "-c", "import sys, jdc_utils.utils.packaging; print('pyreadstat' in sys.modules)"],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=Path(__file__).parents[2],
+    ).stdout
+    assert output.strip() == "False"